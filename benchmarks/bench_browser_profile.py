@@ -0,0 +1,119 @@
+"""
+浏览器资源占用基准测试
+分别以普通模式和轻量模式（无头、屏蔽视频流/图片/字体、缩小视口）打开同一个直播间，
+采样Chrome进程树的CPU和内存占用，并统计期间抓取到的评论数以确认评论抓取正常
+
+用法:
+    python benchmarks/bench_browser_profile.py https://live.douyin.com/直播间ID [--seconds 60]
+
+需要额外安装psutil: pip install psutil
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from getusercomment import CommentMonitor
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+def chrome_processes(monitor):
+    """返回ChromeDriver启动的所有Chrome进程"""
+    driver = monitor._driver
+    if not driver:
+        return []
+    try:
+        service_process = psutil.Process(driver.service.process.pid)
+        return service_process.children(recursive=True)
+    except (psutil.Error, AttributeError):
+        return []
+
+def sample_usage(monitor, seconds, interval=1.0):
+    """
+    采样Chrome进程树的资源占用
+    
+    Returns:
+        tuple: (平均CPU占用百分比, 平均RSS MB, 最大RSS MB)
+    """
+    cpu_samples = []
+    rss_samples = []
+    processes = {}
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        # 进程可能随时创建或退出，每次重新获取
+        for process in chrome_processes(monitor):
+            if process.pid not in processes:
+                processes[process.pid] = process
+                try:
+                    process.cpu_percent(None)
+                except psutil.Error:
+                    pass
+        time.sleep(interval)
+        
+        cpu = 0.0
+        rss = 0
+        for pid, process in list(processes.items()):
+            try:
+                cpu += process.cpu_percent(None)
+                rss += process.memory_info().rss
+            except psutil.Error:
+                del processes[pid]
+        cpu_samples.append(cpu)
+        rss_samples.append(rss / 1024 / 1024)
+    
+    if not cpu_samples:
+        return 0.0, 0.0, 0.0
+    return sum(cpu_samples) / len(cpu_samples), sum(rss_samples) / len(rss_samples), max(rss_samples)
+
+def run_profile(live_url, lightweight, seconds):
+    """以指定模式运行一次监控并返回结果"""
+    comments = []
+    monitor = CommentMonitor(lightweight=lightweight)
+    monitor.add_room(live_url, lambda event: comments.append(event.text))
+    if not monitor.start():
+        return None
+    try:
+        # 先等待页面稳定，再开始采样
+        time.sleep(5)
+        cpu, rss_avg, rss_max = sample_usage(monitor, seconds)
+    finally:
+        monitor.stop()
+    return {
+        "cpu": cpu,
+        "rss_avg": rss_avg,
+        "rss_max": rss_max,
+        "comments": len(comments),
+        "cold_start": monitor.cold_start_seconds,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="浏览器资源占用基准测试")
+    parser.add_argument('live_url', help="抖音直播间URL")
+    parser.add_argument('--seconds', type=float, default=60, help="每种模式的采样时长（秒）")
+    args = parser.parse_args()
+    
+    if psutil is None:
+        print("需要安装psutil: pip install psutil")
+        return
+    
+    results = {}
+    for name, lightweight in (("普通模式", False), ("轻量模式", True)):
+        print(f"\n===== {name} =====")
+        results[name] = run_profile(args.live_url, lightweight, args.seconds)
+    
+    print("\n===== 对比结果 =====")
+    print(f"{'模式':<8}{'CPU均值%':>10}{'RSS均值MB':>12}{'RSS峰值MB':>12}{'评论数':>8}{'冷启动s':>10}")
+    for name, result in results.items():
+        if not result:
+            print(f"{name:<8}启动失败")
+            continue
+        print(f"{name:<8}{result['cpu']:>10.1f}{result['rss_avg']:>12.0f}{result['rss_max']:>12.0f}"
+              f"{result['comments']:>8}{result['cold_start']:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+评论解析基准测试
+对比旧版parse_comment+parse_gift两次解析与classify_comment单次解析的逐行耗时
+
+用法:
+    python benchmarks/bench_comment_parser.py [语料文件 ...]
+
+语料文件可以是纯文本（每行一条页面上抓取到的原始消息），
+也可以是comment_recorder录制的JSONL文件（读取raw字段）；未指定时使用内置示例语料
+"""
+
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from getusercomment import classify_comment
+
+# 内置示例语料，仅在未提供录制语料时使用
+SAMPLE_LINES = [
+    "小明来了",
+    "路人甲：主播好",
+    "路人乙:这首歌叫什么名字",
+    "阿花送出了小心心",
+    "老王赠送了玫瑰×3",
+    "用户123送出了抖音1号",
+    "想听晴天",
+    "666",
+    "系统用户 进入直播间",
+    "张三：主播几岁了？",
+    "李四:哈哈哈哈哈",
+    "王五赠送墨镜",
+]
+
+def _legacy_parse_comment(comment):
+    """旧版评论解析逻辑，仅用于对比"""
+    comment = comment.strip()
+    if '\n' in comment:
+        comment = comment.split('\n')[0].strip()
+    if '来了' in comment:
+        username = comment.replace('来了', '').strip()
+        if username:
+            return username, "来了"
+    for sep in [':', '：']:
+        if sep in comment:
+            parts = comment.split(sep, 1)
+            if len(parts) == 2:
+                username = parts[0].strip()
+                content = parts[1].strip()
+                if username and content:
+                    return username, content
+    match = re.match(r'^([^:：]+)[:：](.+)$', comment)
+    if match:
+        username = match.group(1).strip()
+        content = match.group(2).strip()
+        if username and content:
+            return username, content
+    if '来了' in comment or '进入直播间' in comment:
+        return None, None
+    return '匿名用户', comment
+
+def _legacy_parse_gift(comment):
+    """旧版礼物解析逻辑，仅用于对比"""
+    comment = comment.strip()
+    if '\n' in comment:
+        comment = comment.split('\n')[0].strip()
+    patterns = [
+        r'^(.+)送出了(.+)$',
+        r'^(.+)赠送(.+)$',
+        r'^(.+)送出(.+)$',
+        r'^(.+)赠送了(.+)$',
+        r'^(.+)送出了(.+)$'
+    ]
+    for pattern in patterns:
+        match = re.match(pattern, comment)
+        if match:
+            username = match.group(1).strip()
+            gift_name = match.group(2).strip()
+            if username and gift_name:
+                return username, gift_name
+    return None, None
+
+def _legacy_classify(comment):
+    """旧版监控循环中对每行依次调用两个解析函数"""
+    _legacy_parse_comment(comment)
+    _legacy_parse_gift(comment)
+
+def load_corpus(paths):
+    """加载语料文件，返回消息列表"""
+    lines = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.rstrip('\n')
+                if not line.strip():
+                    continue
+                if path.endswith('.jsonl'):
+                    raw = json.loads(line).get('raw')
+                    if raw:
+                        lines.append(raw)
+                else:
+                    lines.append(line)
+    return lines
+
+def benchmark(func, lines, repeat):
+    """返回每行平均耗时（纳秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for line in lines:
+            func(line)
+    elapsed = time.perf_counter() - start
+    return elapsed / (repeat * len(lines)) * 1e9
+
+def main():
+    paths = sys.argv[1:]
+    if paths:
+        lines = load_corpus(paths)
+        print(f"使用录制语料: {len(lines)} 行")
+    else:
+        lines = SAMPLE_LINES
+        print(f"未指定语料文件，使用内置示例语料: {len(lines)} 行")
+    
+    if not lines:
+        print("语料为空")
+        return
+    
+    # 保证总解析次数大致相同
+    repeat = max(1, 200000 // len(lines))
+    
+    legacy_ns = benchmark(_legacy_classify, lines, repeat)
+    single_ns = benchmark(classify_comment, lines, repeat)
+    
+    print(f"旧版两次解析: {legacy_ns:8.0f} ns/行")
+    print(f"单次解析:     {single_ns:8.0f} ns/行")
+    print(f"加速比:       {legacy_ns / single_ns:8.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+评论采集延迟基准测试
+对比在主进程线程中采集评论和在独立子进程中采集评论（comment_ingest）两种方式：
+主进程运行一个模拟音频播放的asyncio任务（每10ms唤醒一次并做少量纯Python计算），
+采集端每次轮询模拟抓取页面评论并解析的CPU开销，按设定速率产生新评论。
+统计评论从出现到在事件循环中被处理的延迟，以及音频任务的唤醒延迟
+
+用法:
+    python benchmarks/bench_ingest_latency.py [--seconds 10] [--rate 20] [--history 300]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chat_event import ChatEvent
+from comment_ingest import CommentIngestProcess
+
+AUDIO_TICK = 0.01  # 模拟音频回调间隔（秒）
+
+def percentile(values, p):
+    """简单百分位数"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[index]
+
+def parse_line(line):
+    """模拟评论解析：与classify_comment相同的分隔符查找和字符串切分"""
+    for separator in ('：', ':'):
+        if separator in line:
+            user, text = line.split(separator, 1)
+            return user.strip(), text.strip()
+    return None
+
+def synthetic_worker(live_url, channel, seconds=10.0, rate=20.0, history=300, poll_interval=0.1):
+    """
+    合成的采集函数：每次轮询解析最近history条评论文本（模拟全量扫描页面），
+    并按rate条/秒产生新评论。可在线程中运行，也可作为comment_ingest的子进程采集函数
+    """
+    channel.ready(True)
+    # (评论文本, 出现时间)，历史评论没有出现时间
+    lines = [(f"观众{i}：这是第{i}条历史评论，主播唱得真好", None) for i in range(history)]
+    seen = {line for line, _ in lines}
+    start = time.monotonic()
+    emitted = 0
+    while not channel.stop_event.is_set():
+        now = time.monotonic()
+        if now - start >= seconds:
+            break
+        # 到目前为止应该出现的评论
+        due = int((now - start) * rate)
+        while emitted < due:
+            # 用评论出现的时间作为抓取时间，延迟中包含轮询间隔
+            lines.append((f"观众{emitted % 500}：新评论{emitted}", start + emitted / rate))
+            emitted += 1
+        lines = lines[-history:]
+        for line, appeared in lines:
+            parsed = parse_line(line)
+            if parsed and line not in seen:
+                seen.add(line)
+                channel.emit(ChatEvent(parsed[0], parsed[1], captured=appeared))
+        channel.stop_event.wait(poll_interval)
+
+class ThreadChannel:
+    """在主进程线程中运行采集函数时使用的通道，直接调用回调"""
+    
+    def __init__(self, callback):
+        self._callback = callback
+        self.stop_event = threading.Event()
+    
+    def ready(self, running):
+        pass
+    
+    def emit(self, event):
+        self._callback(event)
+
+async def measure(mode, args):
+    """运行一轮测量，返回(评论延迟列表, 音频唤醒延迟列表)"""
+    loop = asyncio.get_running_loop()
+    comment_latencies = []
+    tick_lateness = []
+    
+    def on_arrival(event):
+        comment_latencies.append(time.monotonic() - event.captured)
+    
+    options = dict(seconds=args.seconds, rate=args.rate, history=args.history)
+    if mode == "thread":
+        channel = ThreadChannel(lambda event: loop.call_soon_threadsafe(on_arrival, event))
+        worker = threading.Thread(target=synthetic_worker, args=(None, channel), kwargs=options, daemon=True)
+        worker.start()
+        stop = channel.stop_event.set
+    else:
+        # 子进程发来的抓取时间已由ChatEvent.from_dict换算为本进程的单调时钟
+        ingest = CommentIngestProcess(
+            None,
+            lambda event: loop.call_soon_threadsafe(on_arrival, event),
+            worker=synthetic_worker, **options
+        )
+        if not ingest.start():
+            return [], []
+        stop = ingest.stop
+    
+    # 模拟音频播放：固定间隔唤醒并做少量计算
+    end = time.monotonic() + args.seconds
+    expected = time.monotonic() + AUDIO_TICK
+    while time.monotonic() < end:
+        await asyncio.sleep(max(0.0, expected - time.monotonic()))
+        tick_lateness.append(max(0.0, time.monotonic() - expected))
+        expected += AUDIO_TICK
+        total = 0
+        for i in range(args.audio_work):
+            total += i * i
+    
+    await asyncio.sleep(0.2)
+    stop()
+    return comment_latencies, tick_lateness
+
+def report(mode, comment_latencies, tick_lateness):
+    label = "线程内采集" if mode == "thread" else "子进程采集"
+    print(f"\n===== {label} =====")
+    print(f"收到评论:               {len(comment_latencies)}")
+    if comment_latencies:
+        print(f"评论延迟 p50/p95/p99/max: {percentile(comment_latencies, 50) * 1000:.1f} / "
+              f"{percentile(comment_latencies, 95) * 1000:.1f} / {percentile(comment_latencies, 99) * 1000:.1f} / "
+              f"{max(comment_latencies) * 1000:.1f} ms")
+    if tick_lateness:
+        late = sum(1 for v in tick_lateness if v > AUDIO_TICK / 2)
+        print(f"音频唤醒延迟 p50/p99/max: {percentile(tick_lateness, 50) * 1000:.2f} / "
+              f"{percentile(tick_lateness, 99) * 1000:.2f} / {max(tick_lateness) * 1000:.2f} ms")
+        print(f"唤醒延迟超过{AUDIO_TICK / 2 * 1000:.0f}ms的次数:  {late} / {len(tick_lateness)}")
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="评论采集延迟基准测试")
+    parser.add_argument('--seconds', type=float, default=10, help="每种方式的测量时长（秒）")
+    parser.add_argument('--rate', type=float, default=20, help="新评论速率（条/秒）")
+    parser.add_argument('--history', type=int, default=300, help="每次轮询解析的历史评论条数")
+    parser.add_argument('--audio-work', type=int, default=20000, help="模拟音频任务每次唤醒的计算量")
+    parser.add_argument('--mode', choices=['thread', 'process', 'both'], default='both')
+    args = parser.parse_args()
+    
+    modes = ['thread', 'process'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        comment_latencies, tick_lateness = asyncio.run(measure(mode, args))
+        report(mode, comment_latencies, tick_lateness)
+
+if __name__ == "__main__":
+    main_cli()
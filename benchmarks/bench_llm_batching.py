@@ -0,0 +1,102 @@
+"""
+批量生成回复基准测试
+评论按突发方式到达（每隔interval秒到达burst条），对比两种生成方式:
+    single: 每条评论单独请求（async_request_reply，受QWEN_MAX_CONCURRENCY限制）
+    batch:  每batch-size条评论打包成一次请求（async_process_comment_batch）
+请求发送到本地的OpenAI兼容桩服务（openai_stub.py），统计每条评论从到达到拿到回复的延迟、
+总耗时、吞吐以及请求数和token数
+
+用法:
+    python benchmarks/bench_llm_batching.py [--bursts 10] [--burst 6] [--interval 2] [--batch-size 6]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from openai import AsyncOpenAI
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 离线运行时没有千问的API Key，导入时创建客户端需要一个非空的值
+os.environ.setdefault('DASHSCOPE_API_KEY', "stub")
+import getResponseFromQianwen
+from getResponseFromQianwen import async_request_reply, async_process_comment_batch
+from openai_stub import OpenAIStubServer
+
+COMMENTS = ["主播几岁了", "这首歌叫什么名字", "主播是哪里人", "今天播多久", "晚上好呀", "主播唱得真好听",
+            "有什么推荐的歌吗", "第一次来直播间"]
+
+def percentile(values, p):
+    """简单百分位数"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[index]
+
+async def run_burst(mode, comments, batch_size, latencies):
+    """生成一批同时到达的评论的回复，记录每条评论的延迟"""
+    arrived = time.monotonic()
+    if mode == "single":
+        async def one(comment):
+            await async_request_reply(comment)
+            latencies.append(time.monotonic() - arrived)
+        await asyncio.gather(*(one(comment) for comment in comments))
+    else:
+        async def chunk(part):
+            await async_process_comment_batch(part)
+            latencies.extend([time.monotonic() - arrived] * len(part))
+        await asyncio.gather(*(chunk(comments[i:i + batch_size]) for i in range(0, len(comments), batch_size)))
+
+async def measure(mode, args, stub):
+    """运行一轮测量，返回(延迟列表, 总耗时)"""
+    latencies = []
+    bursts = []
+    start = time.monotonic()
+    for index in range(args.bursts):
+        comments = [f"观众{index * args.burst + i}: {COMMENTS[(index + i) % len(COMMENTS)]}" for i in range(args.burst)]
+        bursts.append(asyncio.create_task(run_burst(mode, comments, args.batch_size, latencies)))
+        await asyncio.sleep(args.interval)
+    await asyncio.gather(*bursts)
+    return latencies, time.monotonic() - start
+
+def report(mode, latencies, elapsed, counters):
+    label = "逐条请求" if mode == "single" else "批量请求"
+    print(f"\n===== {label} =====")
+    print(f"生成回复:             {len(latencies)}")
+    print(f"总耗时:               {elapsed:.1f} s")
+    print(f"吞吐:                 {len(latencies) / elapsed:.2f} 条/秒")
+    print(f"回复延迟 p50/p95/max: {percentile(latencies, 50):.2f} / {percentile(latencies, 95):.2f} / "
+          f"{max(latencies):.2f} s")
+    print(f"请求数:               {counters['requests']}")
+    print(f"提示词/生成 tokens:   {counters['prompt_tokens']} / {counters['completion_tokens']}")
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="批量生成回复基准测试")
+    parser.add_argument('--bursts', type=int, default=10, help="突发次数")
+    parser.add_argument('--burst', type=int, default=6, help="每次突发到达的评论数")
+    parser.add_argument('--interval', type=float, default=2.0, help="突发间隔（秒）")
+    parser.add_argument('--batch-size', type=int, default=6, help="每次批量请求的评论数")
+    parser.add_argument('--ttft', type=float, default=0.4, help="桩服务首字延迟（秒）")
+    parser.add_argument('--per-token', type=float, default=0.02, help="桩服务每token耗时（秒）")
+    parser.add_argument('--capacity', type=int, default=2, help="桩服务同时处理的请求数上限")
+    parser.add_argument('--mode', choices=['single', 'batch', 'both'], default='both')
+    args = parser.parse_args()
+    
+    modes = ['single', 'batch'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        stub = OpenAIStubServer(ttft=args.ttft, per_token=args.per_token, capacity=args.capacity).start()
+        # 让共享的异步客户端指向桩服务
+        getResponseFromQianwen._async_client = AsyncOpenAI(api_key="stub", base_url=stub.url, max_retries=0)
+        getResponseFromQianwen._generation_semaphore = None
+        try:
+            latencies, elapsed = asyncio.run(measure(mode, args, stub))
+            report(mode, latencies, elapsed, stub.counters)
+        finally:
+            getResponseFromQianwen._async_client = None
+            stub.stop()
+
+if __name__ == "__main__":
+    main_cli()
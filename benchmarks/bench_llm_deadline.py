@@ -0,0 +1,113 @@
+"""
+限时生成回复基准测试
+本地的OpenAI兼容桩服务（openai_stub.py）按一定比例让请求变得很慢或返回500错误，
+qwen-turbo的首字延迟比qwen-plus短，评论每隔interval秒到达一条，对比两种生成方式:
+    plain:    async_request_reply，单次请求超时QWEN_TIMEOUT秒，出错时按指数退避重试
+    deadline: REPLY_GENERATOR.generate，截止时间+对冲请求+兜底回复（reply_deadline.py）
+统计每条评论的回复延迟直方图（p50/p95/p99）、失败数以及各来源的回复数
+
+用法:
+    python benchmarks/bench_llm_deadline.py [--count 100] [--slow-rate 0.1] [--error-rate 0.05] [--deadline 4] [--hedge-after 1]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from openai import AsyncOpenAI
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 离线运行时没有千问的API Key，导入时创建客户端需要一个非空的值
+os.environ.setdefault('DASHSCOPE_API_KEY', "stub")
+import getResponseFromQianwen
+from getResponseFromQianwen import async_request_reply, build_messages, REPLY_GENERATOR
+from openai_stub import OpenAIStubServer
+from reply_deadline import LatencyHistogram
+
+COMMENTS = ["主播几岁了", "这首歌叫什么名字", "主播是哪里人", "今天播多久", "晚上好呀", "主播唱得真好听",
+            "有什么推荐的歌吗", "第一次来直播间"]
+
+async def measure(mode, args):
+    """运行一轮测量，返回(延迟直方图, 失败数)"""
+    histogram = LatencyHistogram()
+    failures = 0
+    
+    async def one(comment):
+        nonlocal failures
+        start = time.monotonic()
+        if mode == "plain":
+            try:
+                await async_request_reply(comment)
+            except Exception:
+                failures += 1
+        else:
+            await REPLY_GENERATOR.generate(build_messages(comment))
+        histogram.record(time.monotonic() - start)
+    
+    tasks = []
+    for index in range(args.count):
+        comment = f"观众{index}: {COMMENTS[index % len(COMMENTS)]}"
+        tasks.append(asyncio.create_task(one(comment)))
+        await asyncio.sleep(args.interval)
+    await asyncio.gather(*tasks)
+    return histogram, failures
+
+def report(mode, histogram, failures, stub):
+    label = "单次请求+重试" if mode == "plain" else "截止时间+对冲请求+兜底回复"
+    print(f"\n===== {label} =====")
+    print(f"回复延迟:     {histogram.format_summary()}，最大{histogram.max:.2f}s")
+    print(f"延迟分布:     " + "，".join(f"≤{bound:.2f}s:{count}" for bound, count in histogram.buckets()))
+    if mode == "plain":
+        print(f"失败（原本会念出错误信息）: {failures}")
+    else:
+        stats = REPLY_GENERATOR.stats()
+        print(f"回复来源:     主模型{stats.get('primary', 0)}，对冲{stats.get('hedge', 0)}，兜底{stats.get('fallback', 0)}；"
+              f"发出对冲请求{stats.get('hedged', 0)}次，超时{stats.get('timeouts', 0)}次")
+        for source, summary in stats["latency"].items():
+            print(f"  {source:<9} p50={summary['p50']:.2f}s p95={summary['p95']:.2f}s p99={summary['p99']:.2f}s"
+                  f"（{summary['count']}次）")
+    counters = stub.counters
+    models = "，".join(f"{key[6:]}:{value}" for key, value in sorted(counters.items()) if key.startswith("model:"))
+    print(f"桩服务:       请求{models}，变慢{counters['slow']}次，500错误{counters['errors']}次")
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="限时生成回复基准测试")
+    parser.add_argument('--count', type=int, default=100, help="评论数")
+    parser.add_argument('--interval', type=float, default=0.5, help="评论到达间隔（秒）")
+    parser.add_argument('--ttft', type=float, default=0.6, help="qwen-plus首字延迟（秒）")
+    parser.add_argument('--turbo-ttft', type=float, default=0.25, help="qwen-turbo首字延迟（秒）")
+    parser.add_argument('--per-token', type=float, default=0.02, help="每token耗时（秒）")
+    parser.add_argument('--jitter', type=float, default=0.3, help="首字延迟的随机抖动比例")
+    parser.add_argument('--slow-rate', type=float, default=0.1, help="请求变慢的比例")
+    parser.add_argument('--slow-ttft', type=float, default=10.0, help="变慢的请求的首字延迟（秒）")
+    parser.add_argument('--error-rate', type=float, default=0.05, help="返回500错误的请求比例")
+    parser.add_argument('--deadline', type=float, default=4.0, help="回复截止时间（秒）")
+    parser.add_argument('--hedge-after', type=float, default=1.0, help="多久没有第一个字时发出对冲请求（秒）")
+    parser.add_argument('--seed', type=int, default=None, help="随机种子")
+    parser.add_argument('--mode', choices=['plain', 'deadline', 'both'], default='both')
+    args = parser.parse_args()
+    
+    if args.seed is not None:
+        import random
+        random.seed(args.seed)
+    REPLY_GENERATOR.deadline = args.deadline
+    REPLY_GENERATOR.hedge_after = args.hedge_after
+    modes = ['plain', 'deadline'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        stub = OpenAIStubServer(ttft=args.ttft, per_token=args.per_token, jitter=args.jitter,
+                                model_ttft={"qwen-turbo": args.turbo_ttft}, slow_rate=args.slow_rate,
+                                slow_ttft=args.slow_ttft, error_rate=args.error_rate).start()
+        # 让共享的异步客户端指向桩服务
+        getResponseFromQianwen._async_client = AsyncOpenAI(api_key="stub", base_url=stub.url, max_retries=0)
+        getResponseFromQianwen._generation_semaphore = None
+        try:
+            histogram, failures = asyncio.run(measure(mode, args))
+            report(mode, histogram, failures, stub)
+        finally:
+            getResponseFromQianwen._async_client = None
+            stub.stop()
+
+if __name__ == "__main__":
+    main_cli()
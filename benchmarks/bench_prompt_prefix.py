@@ -0,0 +1,122 @@
+"""
+提示词前缀复用基准测试
+模拟一场直播中多位观众的评论、提问、点歌和礼物，按main.py的方式维护观众索引和对话上下文，
+逐条请求本地的OpenAI兼容桩服务（openai_stub.py，开启上下文缓存和预填充耗时模拟），对比两种提示词布局:
+    system: 旧的方式，互动类型、观众情况和对话摘要拼接在系统提示词后面，每次请求的系统提示词都不一样，
+            对话历史每轮都折叠最旧的一轮
+    prefix: 系统提示词是固定前缀，这些内容作为后缀放在评论后面（prompt_templates.py），对话历史超出轮数时
+            一次折叠到只剩1轮，已有对话历史时不再重复上次的回复，请求开头（固定前缀 + 观众的历史问答）可以命中上下文缓存
+统计首字延迟、每条回复的提示词token数、命中缓存的比例，以及按评论速率折算的每小时提示词token数
+
+用法:
+    python benchmarks/bench_prompt_prefix.py [--count 200] [--viewers 15] [--prefill-per-token 0.002] [--rate 600]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+from openai import AsyncOpenAI
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 离线运行时没有千问的API Key，导入时创建客户端需要一个非空的值
+os.environ.setdefault('DASHSCOPE_API_KEY', "stub")
+import getResponseFromQianwen
+from getResponseFromQianwen import build_messages, REPLY_PROMPTS, QWEN_MODEL
+from chat_event import ChatEvent, KIND_COMMENT, KIND_GIFT
+from openai_stub import OpenAIStubServer
+from prompt_templates import PromptTokenMeter, prompt_types
+from reply_deadline import LatencyHistogram
+from viewer_context import ViewerContextManager
+from viewer_index import ViewerIndex
+
+MESSAGES = [
+    (KIND_COMMENT, "主播唱得真好听"), (KIND_COMMENT, "今天的歌都好好听"), (KIND_COMMENT, "哈哈哈哈"),
+    (KIND_COMMENT, "主播几岁了"), (KIND_COMMENT, "这首歌叫什么名字"), (KIND_COMMENT, "主播是哪里人"),
+    (KIND_COMMENT, "今天播多久"), (KIND_COMMENT, "晚上好"), (KIND_COMMENT, "想听周杰伦的晴天"),
+    (KIND_COMMENT, "点歌：后来"), (KIND_GIFT, "小心心"), (KIND_GIFT, "玫瑰"),
+]
+
+def build_request(layout, event, viewers, contexts):
+    """按main.StoryPlayer._reply_prompt的方式生成消息列表"""
+    summary, history = contexts.build(event.user)
+    if layout == "system":
+        suffix = REPLY_PROMPTS.suffix(prompt_types(event), viewers.describe(event.user) + summary)
+        return build_messages(event.prompt_text(), REPLY_PROMPTS.system_prompt() + suffix, history)
+    notes = viewers.describe(event.user, last_reply=not history) + summary
+    suffix = REPLY_PROMPTS.suffix(prompt_types(event), notes)
+    return build_messages(event.prompt_text(), REPLY_PROMPTS.system_prompt(), history, suffix)
+
+async def measure(layout, args):
+    """运行一轮测量，返回首字延迟直方图"""
+    rng = random.Random(args.seed)
+    viewers = ViewerIndex()
+    contexts = ViewerContextManager() if layout == "system" else ViewerContextManager(fold_to=1)
+    ttft = LatencyHistogram()
+    # 少数观众发言特别多，与直播间的实际情况类似
+    names = [f"观众{i}" for i in range(args.viewers)]
+    weights = [1.0 / (i + 1) for i in range(args.viewers)]
+    for _ in range(args.count):
+        user = rng.choices(names, weights)[0]
+        kind, text = rng.choice(MESSAGES)
+        event = ChatEvent(user, text, kind=kind)
+        if kind == KIND_GIFT:
+            viewers.record_gift(user)
+        else:
+            viewers.record_comment(user)
+        messages = build_request(layout, event, viewers, contexts)
+        
+        start = time.monotonic()
+        first_token = []
+        reply = await getResponseFromQianwen._stream_completion(
+            QWEN_MODEL, messages, lambda: first_token.append(time.monotonic()), 30.0)
+        ttft.record(first_token[0] - start)
+        viewers.record_reply(user, reply)
+        contexts.record_turn(user, text, reply)
+    return ttft
+
+def report(layout, ttft, args):
+    label = "说明拼接在系统提示词" if layout == "system" else "固定前缀 + 评论后缀"
+    stats = getResponseFromQianwen.PROMPT_TOKENS.stats()
+    requests = stats.get('requests', 0)
+    per_reply = stats.get('prompt_tokens', 0) / requests if requests else 0.0
+    uncached = (stats.get('prompt_tokens', 0) - stats.get('cached_tokens', 0)) / requests if requests else 0.0
+    print(f"\n===== {label} =====")
+    print(f"首字延迟:             {ttft.format_summary()}")
+    print(f"每条回复提示词tokens: {per_reply:.0f}（未命中缓存{uncached:.0f}），命中缓存{stats['cache_ratio']:.0%}")
+    print(f"每小时提示词tokens:   {per_reply * args.rate:.0f}（未命中缓存{uncached * args.rate:.0f}，"
+          f"按每小时{args.rate}条回复折算）")
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="提示词前缀复用基准测试")
+    parser.add_argument('--count', type=int, default=200, help="回复的评论数")
+    parser.add_argument('--viewers', type=int, default=15, help="观众数")
+    parser.add_argument('--ttft', type=float, default=0.2, help="桩服务除预填充外的首字延迟（秒）")
+    parser.add_argument('--per-token', type=float, default=0.005, help="每生成一个token的耗时（秒）")
+    parser.add_argument('--prefill-per-token', type=float, default=0.002, help="每个未命中缓存的提示词token的预填充耗时（秒）")
+    parser.add_argument('--cache-min-tokens', type=int, default=0, help="相同前缀至少这么多token才命中缓存")
+    parser.add_argument('--rate', type=int, default=600, help="每小时回复的评论数，用于折算每小时的token数")
+    parser.add_argument('--seed', type=int, default=1, help="随机种子，两种布局使用同样的评论序列")
+    parser.add_argument('--layout', choices=['system', 'prefix', 'both'], default='both')
+    args = parser.parse_args()
+    
+    print(f"固定前缀: {REPLY_PROMPTS.prefix_tokens} tokens")
+    layouts = ['system', 'prefix'] if args.layout == 'both' else [args.layout]
+    for layout in layouts:
+        stub = OpenAIStubServer(ttft=args.ttft, per_token=args.per_token, prefill_per_token=args.prefill_per_token,
+                                prefix_cache=True, cache_min_tokens=args.cache_min_tokens).start()
+        # 让共享的异步客户端指向桩服务，每种布局单独统计提示词token数
+        getResponseFromQianwen._async_client = AsyncOpenAI(api_key="stub", base_url=stub.url, max_retries=0)
+        getResponseFromQianwen._generation_semaphore = None
+        getResponseFromQianwen.PROMPT_TOKENS = PromptTokenMeter()
+        try:
+            report(layout, asyncio.run(measure(layout, args)), args)
+        finally:
+            getResponseFromQianwen._async_client = None
+            stub.stop()
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,190 @@
+"""
+互动流程回放压测
+用chat_replay回放录制的评论，配合本地假的千问和假的语音合成，
+测量comment_handler -> process_comment_cache -> process_interaction流程的积压和回复延迟
+
+用法:
+    python benchmarks/bench_replay_pipeline.py --recording 录制文件.jsonl --speed 4
+    python benchmarks/bench_replay_pipeline.py --synthetic 300 --duration 120 --speed 10
+
+所有耗时参数均按原速设置，加速回放时假服务的耗时会同比缩短，报告中的时间已换算回原速
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import chat_replay
+import main
+
+SAMPLE_RATE = 24000
+BYTES_PER_SECOND = SAMPLE_RATE * 2
+
+SYNTHETIC_COMMENTS = ["来了", "主播好", "666", "这首歌叫什么名字", "主播几岁了", "哈哈哈", "晚上好"]
+SYNTHETIC_GIFTS = ["小心心", "玫瑰", "抖音1号"]
+
+def write_synthetic_recording(path, per_minute, duration):
+    """生成泊松到达的合成录制文件"""
+    rate = per_minute / 60.0
+    t = 0.0
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        while True:
+            t += random.expovariate(rate)
+            if t > duration:
+                break
+            user = f"观众{random.randint(1, 500)}"
+            if random.random() < 0.1:
+                record = {"t": round(t, 3), "user": user, "text": random.choice(SYNTHETIC_GIFTS), "kind": "礼物"}
+            else:
+                record = {"t": round(t, 3), "user": user, "text": random.choice(SYNTHETIC_COMMENTS), "kind": "评论"}
+            f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n")
+            count += 1
+    return count
+
+def percentile(values, p):
+    """简单百分位数"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[index]
+
+class PipelineBench:
+    """安装假服务并收集指标"""
+    
+    def __init__(self, speed, llm_latency, tts_latency, seconds_per_char):
+        self.speed = speed
+        self.llm_latency = llm_latency
+        self.tts_latency = tts_latency
+        self.seconds_per_char = seconds_per_char
+        self.latencies = []
+        self.received = 0
+        self.llm_calls = 0
+        self.tts_calls = 0
+        self.backlog_samples = []
+    
+    async def fake_llm(self, comment, system_prompt=None, cache_key=None, viewer=None, history=None, suffix=None):
+        """假的千问调用，等待固定时间后返回固定回复，与async_process_live_comment一样写入回复缓存"""
+        self.llm_calls += 1
+        await asyncio.sleep(self.llm_latency / self.speed)
+        reply = f"谢谢你的评论，{comment.split(': ', 1)[-1][:10]}"
+        if cache_key:
+            main.cache_reply(cache_key, reply, viewer=viewer)
+        return reply
+    
+    def fake_tts(self, token, texts, **kwargs):
+        """假的语音合成，返回与文本长度成比例的静音PCM"""
+        self.tts_calls += 1
+        time.sleep(self.tts_latency / self.speed)
+        seconds = max(1, len(texts[0])) * self.seconds_per_char
+        return bytes(int(seconds * BYTES_PER_SECOND) & ~1)
+    
+    def install(self, player):
+        """替换main模块中的外部服务和播放器的音频输出"""
+        main.async_process_live_comment = self.fake_llm
+        main.process_tts = self.fake_tts
+        main.get_token = lambda: "fake-token"
+        player.global_token = "fake-token"
+        if player.speculative:
+            player.speculative.max_idle_wait /= self.speed
+        
+        async def fake_play_audio(audio_data):
+            await asyncio.sleep(len(audio_data) / BYTES_PER_SECOND / self.speed)
+        player.play_audio = fake_play_audio
+    
+    def wrap_callback(self, callback):
+        """统计进入流程的评论数"""
+        def counting_callback(event):
+            self.received += 1
+            callback(event)
+        return counting_callback
+    
+    def report(self, elapsed, player):
+        # 回复延迟取自ChatEvent上记录的各阶段时间戳，合并回复时每条被合并的评论都会计入
+        tracker = player.stage_latency
+        replied = tracker.count
+        self.latencies = [seconds * self.speed for seconds in tracker.samples("total")]
+        print("\n===== 回放压测结果 =====")
+        print(f"回放时长(原速):   {elapsed * self.speed:.1f} s")
+        print(f"收到评论:         {self.received}")
+        print(f"已回复:           {replied}")
+        print(f"未回复(丢弃/积压): {self.received - replied}")
+        print(f"LLM调用次数:      {self.llm_calls}")
+        print(f"TTS调用次数:      {self.tts_calls}")
+        cache = main.REPLY_CACHE.stats()
+        print(f"回复缓存命中:     精确{cache.get('exact_hits', 0)}次，相似{cache.get('similar_hits', 0)}次，"
+              f"未命中{cache.get('misses', 0)}次")
+        if self.backlog_samples:
+            print(f"积压队列 平均/最大: {sum(self.backlog_samples) / len(self.backlog_samples):.1f} / {max(self.backlog_samples)}")
+        if self.latencies:
+            print(f"回复延迟 p50/p95/max: {percentile(self.latencies, 50):.2f} / "
+                  f"{percentile(self.latencies, 95):.2f} / {max(self.latencies):.2f} s")
+        for stage in ("ingest", "queue", "reply"):
+            values = [seconds * self.speed for seconds in tracker.samples(stage)]
+            if values:
+                print(f"  {stage:<6} p50/p95/max: {percentile(values, 50):.2f} / "
+                      f"{percentile(values, 95):.2f} / {max(values):.2f} s")
+
+async def run_bench(args, recording):
+    player = main.StoryPlayer(offline=True)
+    player.loop = asyncio.get_running_loop()
+    bench = PipelineBench(args.speed, args.llm_latency, args.tts_latency, args.seconds_per_char)
+    bench.install(player)
+    
+    if not chat_replay.start_comment_monitoring(recording, bench.wrap_callback(player.comment_handler), speed=args.speed):
+        return
+    
+    start = time.monotonic()
+    tick = 1.0 / args.speed
+    # 与play_spotify_music的等待循环一致：每秒检查一次评论缓存
+    while chat_replay.is_replaying() or player.comment_cache or len(player.gift_aggregator) or player.is_processing_interaction:
+        await asyncio.sleep(tick)
+        bench.backlog_samples.append(len(player.comment_cache))
+        if player.comment_cache:
+            asyncio.create_task(player.process_comment_cache())
+        if not chat_replay.is_replaying() and time.monotonic() - start > args.drain_timeout / args.speed + args.duration / args.speed:
+            break
+    
+    chat_replay.stop_comment_monitoring()
+    bench.report(time.monotonic() - start, player)
+    print(f"调度器计数:       {player.comment_cache.stats()}")
+    print(f"合并计数:         {dict(player.coalescer.counters)}")
+    print(f"礼物聚合计数:     {player.gift_aggregator.stats()}")
+    if player.speculative:
+        print(f"预合成语音计数:   {player.speculative.stats()}")
+        player.speculative.close()
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="互动流程回放压测")
+    parser.add_argument('--recording', help="JSONL录制文件")
+    parser.add_argument('--synthetic', type=float, default=300, help="未指定录制文件时，合成评论的速率（条/分钟）")
+    parser.add_argument('--duration', type=float, default=120, help="合成录制的时长（秒）")
+    parser.add_argument('--speed', type=float, default=1.0, help="回放倍速")
+    parser.add_argument('--llm-latency', type=float, default=1.5, help="假千问的响应耗时（秒）")
+    parser.add_argument('--tts-latency', type=float, default=0.8, help="假语音合成的耗时（秒）")
+    parser.add_argument('--seconds-per-char', type=float, default=0.25, help="合成音频每个字的时长（秒）")
+    parser.add_argument('--drain-timeout', type=float, default=60, help="回放结束后等待积压清空的最长时间（秒）")
+    args = parser.parse_args()
+    
+    recording = args.recording
+    if not recording:
+        fd, recording = tempfile.mkstemp(suffix='.jsonl')
+        os.close(fd)
+        count = write_synthetic_recording(recording, args.synthetic, args.duration)
+        print(f"生成合成录制: {count}条事件，{args.synthetic}条/分钟，时长{args.duration}s")
+    
+    try:
+        asyncio.run(run_bench(args, recording))
+    finally:
+        if not args.recording:
+            os.remove(recording)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,110 @@
+"""
+回复延迟基准测试（离线）
+启动本地的千问桩服务（openai_stub.py）和语音合成桩服务（nls_stub.py），通过
+DASHSCOPE_BASE_URL、ALIYUN_NLS_URL和ALIYUN_NLS_TOKEN把程序指向桩服务，
+对同一组评论分别测量两种回复方式从请求开始到可以出声的时间:
+    blocking:  get_response_from_qianwen 拿到完整回复后再调用 process_tts 合成整段语音
+    streaming: streaming_reply.stream_reply 逐句生成逐句合成，收到第一帧音频即可出声
+
+用法:
+    python benchmarks/bench_reply_latency.py [--count 20] [--ttft 0.4] [--per-token 0.02] [--tts-ttfb 0.15] [--tts-speed 4]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from nls_stub import NlsStubServer
+from openai_stub import OpenAIStubServer
+
+COMMENTS = ["主播几岁了", "这首歌叫什么名字", "主播是哪里人", "今天播多久", "晚上好呀", "主播唱得真好听",
+            "有什么推荐的歌吗", "第一次来直播间"]
+
+def percentile(values, p):
+    """简单百分位数"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[index]
+
+def measure_blocking(comments, token):
+    """完整回复+整段合成，返回每条评论到拿到语音的耗时（秒）"""
+    from cosyVoiceTTS import process_tts
+    from getResponseFromQianwen import get_response_from_qianwen
+    
+    latencies = []
+    for comment in comments:
+        start = time.monotonic()
+        reply = get_response_from_qianwen(comment)
+        audio = process_tts(token, [reply])
+        if audio:
+            latencies.append(time.monotonic() - start)
+    return latencies
+
+def measure_streaming(comments, token):
+    """流式回复，返回每条评论到收到第一帧音频的耗时（秒）和阶段耗时统计"""
+    from streaming_reply import ReplyLatencyStats, ReplyTimings, stream_reply
+    
+    latencies = []
+    stats = ReplyLatencyStats()
+    for comment in comments:
+        timings = ReplyTimings()
+        
+        def on_audio(data, timings=timings):
+            if timings.first_audio is None:
+                timings.first_audio = time.monotonic()
+        
+        stream_reply(token, comment, None, on_audio, timings)
+        if timings.first_audio is not None:
+            latencies.append(timings.first_audio - timings.request_start)
+            stats.record(timings)
+    return latencies, stats
+
+def report(label, latencies):
+    print(f"\n===== {label} =====")
+    print(f"完成回复:           {len(latencies)}")
+    if latencies:
+        print(f"出声延迟 p50/p95/max: {percentile(latencies, 50) * 1000:.0f} / {percentile(latencies, 95) * 1000:.0f} / "
+              f"{max(latencies) * 1000:.0f} ms")
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="回复延迟基准测试（离线）")
+    parser.add_argument('--count', type=int, default=20, help="每种方式回复的评论数")
+    parser.add_argument('--ttft', type=float, default=0.4, help="千问桩服务首字延迟（秒）")
+    parser.add_argument('--per-token', type=float, default=0.02, help="千问桩服务每token耗时（秒）")
+    parser.add_argument('--jitter', type=float, default=0.0, help="千问首字延迟的随机抖动比例")
+    parser.add_argument('--tts-ttfb', type=float, default=0.15, help="语音合成桩服务每段文本的首包延迟（秒）")
+    parser.add_argument('--tts-speed', type=float, default=4.0, help="语音合成桩服务相对实时的倍速")
+    parser.add_argument('--mode', choices=['blocking', 'streaming', 'both'], default='both')
+    args = parser.parse_args()
+    
+    llm_stub = OpenAIStubServer(ttft=args.ttft, per_token=args.per_token, jitter=args.jitter).start()
+    tts_stub = NlsStubServer(ttfb=args.tts_ttfb, speed=args.tts_speed).start()
+    # 必须在导入程序模块之前设置，客户端和合成地址在导入时读取
+    os.environ['DASHSCOPE_BASE_URL'] = llm_stub.url
+    os.environ['DASHSCOPE_API_KEY'] = "stub"
+    os.environ['ALIYUN_NLS_URL'] = tts_stub.url
+    os.environ['ALIYUN_NLS_TOKEN'] = "stub"
+    os.environ.setdefault('ALIYUN_APPKEY', "stub")
+    from cosyVoiceTTS import get_token
+    
+    token = get_token()
+    comments = [f"观众{i}: {COMMENTS[i % len(COMMENTS)]}" for i in range(args.count)]
+    try:
+        if args.mode in ('blocking', 'both'):
+            report("完整回复后整段合成", measure_blocking(comments, token))
+        if args.mode in ('streaming', 'both'):
+            latencies, stats = measure_streaming(comments, token)
+            report("流式回复", latencies)
+            print(f"阶段耗时:           {stats.format_summary()}")
+        print(f"\n千问桩服务: {dict(llm_stub.counters)}")
+        print(f"合成桩服务: {dict(tts_stub.counters)}")
+    finally:
+        llm_stub.stop()
+        tts_stub.stop()
+
+if __name__ == "__main__":
+    main_cli()
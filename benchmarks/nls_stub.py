@@ -0,0 +1,320 @@
+"""
+本地阿里云NLS流式语音合成桩服务
+在本地实现一个WebSocket服务，使用FlowingSpeechSynthesizer协议（与stream_input_tts.py相同）:
+    客户端发送 StartSynthesis -> 服务端回复 SynthesisStarted
+    客户端发送 RunSynthesis（每段文本） -> 服务端回复 SentenceBegin、若干二进制音频帧、SentenceEnd
+    客户端发送 StopSynthesis -> 服务端合成完剩余文本后回复 SynthesisCompleted
+音频为合成的正弦波PCM（16位单声道），时长按每字固定秒数计算，并按配置的倍速发送，
+用于在不消耗语音合成额度的情况下测量首包延迟和合成耗时。只依赖标准库
+
+用法:
+    python benchmarks/nls_stub.py --port 8002 --ttfb 0.15 --speed 4
+    然后设置环境变量 ALIYUN_NLS_URL=ws://127.0.0.1:8002/ws/v1 和 ALIYUN_NLS_TOKEN=stub 再启动程序或基准测试
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import math
+import queue
+import socketserver
+import struct
+import threading
+import time
+import uuid
+from array import array
+from collections import Counter
+
+_WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+_OPCODE_TEXT = 0x1
+_OPCODE_BINARY = 0x2
+_OPCODE_CLOSE = 0x8
+_OPCODE_PING = 0x9
+_OPCODE_PONG = 0xA
+
+_NAMESPACE = "FlowingSpeechSynthesizer"
+
+# 合成队列中表示StopSynthesis的标记
+_STOP = object()
+
+def wav_header(sample_rate, channels=1, bits_per_sample=16):
+    """流式WAV文件头，总长度未知，长度字段填0xFFFFFFFF"""
+    block_align = channels * bits_per_sample // 8
+    return (b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, sample_rate * block_align,
+                                    block_align, bits_per_sample)
+            + b"data" + struct.pack("<I", 0xFFFFFFFF))
+
+class _ToneGenerator:
+    """连续的正弦波PCM，跨音频帧保持相位"""
+    
+    def __init__(self, sample_rate, frequency=220.0, amplitude=3000):
+        self.sample_rate = sample_rate
+        self.step = 2 * math.pi * frequency / sample_rate
+        self.amplitude = amplitude
+        self.phase = 0.0
+    
+    def read(self, samples):
+        pcm = array("h", (int(self.amplitude * math.sin(self.phase + i * self.step)) for i in range(samples)))
+        self.phase = (self.phase + samples * self.step) % (2 * math.pi)
+        return pcm.tobytes()
+
+class NlsStubServer:
+    """在后台线程中运行的语音合成桩服务"""
+    
+    def __init__(self, host="127.0.0.1", port=0, ttfb=0.15, speed=4.0, seconds_per_char=0.22,
+                 chunk_ms=40, start_delay=0.03):
+        """
+        Args:
+            host (str): 监听地址
+            port (int): 监听端口，0表示自动分配
+            ttfb (float): 每段文本从收到到发出第一帧音频的延迟（秒）
+            speed (float): 音频发送速度相对实时播放的倍数，0表示不限速
+            seconds_per_char (float): 每个字对应的音频时长（秒）
+            chunk_ms (int): 每个二进制音频帧的时长（毫秒）
+            start_delay (float): 收到StartSynthesis后回复SynthesisStarted的延迟（秒）
+        """
+        self.ttfb = ttfb
+        self.speed = speed
+        self.seconds_per_char = seconds_per_char
+        self.chunk_ms = chunk_ms
+        self.start_delay = start_delay
+        self._lock = threading.Lock()
+        # 计数器: connections/sessions/sentences/characters/audio_bytes
+        self.counters = Counter()
+        self._server = socketserver.ThreadingTCPServer((host, port), self._handler_class(), bind_and_activate=False)
+        self._server.daemon_threads = True
+        self._server.allow_reuse_address = True
+        self._server.server_bind()
+        self._server.server_activate()
+        self._thread = None
+    
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"ws://{host}:{port}/ws/v1"
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="nls-stub", daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def _count(self, **values):
+        with self._lock:
+            self.counters.update(values)
+    
+    def _handler_class(self):
+        stub = self
+        
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                if not self._handshake():
+                    return
+                stub._count(connections=1)
+                self._send_lock = threading.Lock()
+                self._tasks = queue.Queue()
+                self._session = None
+                worker = threading.Thread(target=self._synthesize, daemon=True)
+                worker.start()
+                try:
+                    self._serve()
+                except (ConnectionError, OSError):
+                    pass
+                finally:
+                    self._tasks.put(None)
+            
+            def _handshake(self):
+                """处理WebSocket握手，成功时返回True"""
+                request_line = self.rfile.readline(65537)
+                headers = {}
+                while True:
+                    line = self.rfile.readline(65537)
+                    if not line or line in (b"\r\n", b"\n"):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    # NLS SDK会发送两个Sec-WebSocket-Key，并按第一个校验握手结果，重复的请求头保留第一个
+                    headers.setdefault(name.strip().lower(), value.strip())
+                key = headers.get("sec-websocket-key")
+                if not request_line.startswith(b"GET ") or not key:
+                    self.wfile.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+                    return False
+                if not headers.get("x-nls-token"):
+                    self.wfile.write(b"HTTP/1.1 403 Forbidden\r\nContent-Length: 0\r\n\r\n")
+                    return False
+                accept = base64.b64encode(hashlib.sha1((key + _WEBSOCKET_GUID).encode()).digest()).decode()
+                self.wfile.write(("HTTP/1.1 101 Switching Protocols\r\n"
+                                  "Upgrade: websocket\r\n"
+                                  "Connection: Upgrade\r\n"
+                                  f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+                self.wfile.flush()
+                return True
+            
+            def _read_exact(self, size):
+                data = self.rfile.read(size)
+                if len(data) < size:
+                    raise ConnectionError("连接已关闭")
+                return data
+            
+            def _read_frame(self):
+                """
+                读取一帧，客户端发来的帧都带掩码
+                
+                Returns:
+                    tuple: (opcode, fin, payload)
+                """
+                first, second = self._read_exact(2)
+                length = second & 0x7F
+                if length == 126:
+                    length = struct.unpack(">H", self._read_exact(2))[0]
+                elif length == 127:
+                    length = struct.unpack(">Q", self._read_exact(8))[0]
+                mask = self._read_exact(4) if second & 0x80 else None
+                payload = self._read_exact(length)
+                if mask:
+                    payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+                return first & 0x0F, bool(first & 0x80), payload
+            
+            def _send_frame(self, opcode, payload):
+                """发送一帧，服务端发出的帧不带掩码"""
+                length = len(payload)
+                if length < 126:
+                    header = struct.pack(">BB", 0x80 | opcode, length)
+                elif length < 65536:
+                    header = struct.pack(">BBH", 0x80 | opcode, 126, length)
+                else:
+                    header = struct.pack(">BBQ", 0x80 | opcode, 127, length)
+                with self._send_lock:
+                    self.wfile.write(header + payload)
+                    self.wfile.flush()
+            
+            def _send_event(self, name, task_id, payload=None):
+                message = {
+                    "header": {
+                        "message_id": uuid.uuid4().hex,
+                        "task_id": task_id,
+                        "namespace": _NAMESPACE,
+                        "name": name,
+                        "status": 20000000,
+                        "status_message": "GATEWAY|SUCCESS|Success."
+                    },
+                    "payload": payload or {}
+                }
+                self._send_frame(_OPCODE_TEXT, json.dumps(message, ensure_ascii=False).encode("utf-8"))
+            
+            def _serve(self):
+                """读取客户端消息，文本合成交给合成线程按顺序处理"""
+                fragments = []
+                while True:
+                    opcode, fin, payload = self._read_frame()
+                    if opcode == _OPCODE_CLOSE:
+                        self._send_frame(_OPCODE_CLOSE, payload[:2])
+                        return
+                    if opcode == _OPCODE_PING:
+                        self._send_frame(_OPCODE_PONG, payload)
+                        continue
+                    if opcode in (_OPCODE_TEXT, 0x0):
+                        fragments.append(payload)
+                        if not fin:
+                            continue
+                        message = b"".join(fragments)
+                        fragments = []
+                        self._dispatch(json.loads(message.decode("utf-8")))
+            
+            def _dispatch(self, message):
+                header = message.get("header", {})
+                name = header.get("name")
+                task_id = header.get("task_id", "")
+                if name == "StartSynthesis":
+                    payload = message.get("payload", {})
+                    self._session = {
+                        "task_id": task_id,
+                        "format": payload.get("format", "pcm"),
+                        "sample_rate": int(payload.get("sample_rate", 24000)),
+                        "sentences": 0
+                    }
+                    stub._count(sessions=1)
+                    time.sleep(stub.start_delay)
+                    self._send_event("SynthesisStarted", task_id, {"session_id": payload.get("session_id", ""),
+                                                                   "index": 1})
+                elif name == "RunSynthesis" and self._session:
+                    self._tasks.put(message.get("payload", {}).get("text", ""))
+                elif name == "StopSynthesis" and self._session:
+                    self._tasks.put(_STOP)
+                else:
+                    self._send_frame(_OPCODE_TEXT, json.dumps({
+                        "header": {"task_id": task_id, "namespace": _NAMESPACE, "name": "TaskFailed",
+                                   "status": 40000000, "status_message": f"unexpected message {name}"},
+                        "payload": {}
+                    }).encode("utf-8"))
+            
+            def _synthesize(self):
+                """合成线程：按收到的顺序把每段文本转换为音频帧"""
+                tone = None
+                try:
+                    while True:
+                        text = self._tasks.get()
+                        if text is None:
+                            return
+                        session = self._session
+                        if text is _STOP:
+                            self._send_event("SynthesisCompleted", session["task_id"])
+                            return
+                        if tone is None:
+                            tone = _ToneGenerator(session["sample_rate"])
+                        self._speak(session, tone, text)
+                except (ConnectionError, OSError):
+                    pass
+            
+            def _speak(self, session, tone, text):
+                """合成一段文本，按倍速发送音频帧"""
+                session["sentences"] += 1
+                index = session["sentences"]
+                self._send_event("SentenceBegin", session["task_id"], {"index": index})
+                time.sleep(stub.ttfb)
+                if index == 1 and session["format"] == "wav":
+                    self._send_frame(_OPCODE_BINARY, wav_header(session["sample_rate"]))
+                chars = len(text.strip())
+                total = int(session["sample_rate"] * stub.seconds_per_char * chars)
+                per_chunk = max(1, session["sample_rate"] * stub.chunk_ms // 1000)
+                sent = 0
+                started = time.monotonic()
+                while sent < total:
+                    samples = min(per_chunk, total - sent)
+                    self._send_frame(_OPCODE_BINARY, tone.read(samples))
+                    sent += samples
+                    if stub.speed:
+                        # 按倍速对齐到音频时间线，避免累积误差
+                        delay = started + sent / session["sample_rate"] / stub.speed - time.monotonic()
+                        if delay > 0:
+                            time.sleep(delay)
+                stub._count(sentences=1, characters=chars, audio_bytes=total * 2)
+                self._send_event("SentenceEnd", session["task_id"], {"index": index})
+        
+        return Handler
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="本地NLS流式语音合成桩服务")
+    parser.add_argument('--port', type=int, default=8002)
+    parser.add_argument('--ttfb', type=float, default=0.15, help="每段文本的首包延迟（秒）")
+    parser.add_argument('--speed', type=float, default=4.0, help="音频发送速度相对实时的倍数，0表示不限速")
+    parser.add_argument('--seconds-per-char', type=float, default=0.22, help="每个字的音频时长（秒）")
+    args = parser.parse_args()
+    
+    server = NlsStubServer(port=args.port, ttfb=args.ttfb, speed=args.speed,
+                           seconds_per_char=args.seconds_per_char)
+    print(f"桩服务已启动: {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    main_cli()
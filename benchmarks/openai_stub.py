@@ -0,0 +1,345 @@
+"""
+本地OpenAI兼容接口桩服务
+实现 POST /v1/chat/completions，按首字延迟和每token耗时模拟千问，
+用于在不消耗API额度的情况下测量延迟和吞吐。可以限制同时处理的请求数来模拟服务端并发上限，
+首字延迟可以加随机抖动；请求中stream为true时以SSE逐token返回（chat.completion.chunk），
+与千问兼容模式的流式接口一致。还可以为不同模型设置不同的首字延迟，按一定比例让请求变得很慢
+（长尾延迟）或返回500错误，用于测量限时生成和对冲请求的效果
+
+可以按提示词token数模拟预填充耗时，并模拟服务端的上下文缓存：与之前某个请求开头相同的部分
+（按固定字数分块比较）视为命中缓存，不计预填充耗时，命中的token数在usage.prompt_tokens_details.cached_tokens中返回
+
+批量回复请求（系统提示词要求输出JSON数组）会按评论编号逐条生成回复并返回JSON数组
+
+用法:
+    python benchmarks/openai_stub.py --port 8001 --ttft 0.4 --per-token 0.02
+    然后设置环境变量 DASHSCOPE_BASE_URL=http://127.0.0.1:8001/v1 再启动程序或基准测试
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from viewer_context import estimate_tokens
+
+# 上下文缓存比较前缀的分块大小（字符数）和最多记住的前缀数
+PREFIX_BLOCK_CHARS = 16
+MAX_CACHED_PREFIXES = 200000
+
+# 批量回复中的评论编号，如"3. 小明: 主播几岁"
+_NUMBERED_LINE = re.compile(r'^\s*(\d+)\.\s*(.+)$')
+
+def stub_reply(comment):
+    """根据评论生成固定格式的回复，忽略评论后面括号里的补充说明"""
+    text = comment.split(": ", 1)[-1].split("（", 1)[0]
+    return f"谢谢你的评论，{text[:12]}，主播看到啦"
+
+def split_tokens(text):
+    """把回复切成模拟的token：中日韩文字每字一个，其他字符每4个一个"""
+    pieces = []
+    narrow = ""
+    for char in text:
+        if ord(char) >= 0x2E80:
+            if narrow:
+                pieces.append(narrow)
+                narrow = ""
+            pieces.append(char)
+        else:
+            narrow += char
+            if len(narrow) >= 4:
+                pieces.append(narrow)
+                narrow = ""
+    if narrow:
+        pieces.append(narrow)
+    return pieces
+
+class OpenAIStubServer:
+    """在后台线程中运行的桩服务"""
+    
+    def __init__(self, host="127.0.0.1", port=0, ttft=0.4, per_token=0.02, capacity=None, jitter=0.0,
+                 model_ttft=None, slow_rate=0.0, slow_ttft=10.0, error_rate=0.0, prefill_per_token=0.0,
+                 prefix_cache=False, cache_min_tokens=0):
+        """
+        Args:
+            host (str): 监听地址
+            port (int): 监听端口，0表示自动分配
+            ttft (float): 每个请求的首字延迟（秒），包含排队和预填充
+            per_token (float): 每生成一个token的耗时（秒）
+            capacity (int, optional): 同时处理的请求数上限，超出的请求排队，None表示不限制
+            jitter (float): 首字延迟的随机抖动比例，0.5表示在ttft的0.5~1.5倍之间均匀分布
+            model_ttft (dict, optional): 按模型名指定首字延迟，如{"qwen-turbo": 0.2}，其他模型使用ttft
+            slow_rate (float): 请求变慢的比例，变慢的请求首字延迟为slow_ttft
+            slow_ttft (float): 变慢的请求的首字延迟（秒）
+            error_rate (float): 直接返回500错误的请求比例
+            prefill_per_token (float): 每个未命中缓存的提示词token增加的首字延迟（秒）
+            prefix_cache (bool): 是否模拟上下文缓存
+            cache_min_tokens (int): 相同前缀至少这么多token才视为命中缓存
+        """
+        self.ttft = ttft
+        self.per_token = per_token
+        self.jitter = jitter
+        self.model_ttft = model_ttft or {}
+        self.slow_rate = slow_rate
+        self.slow_ttft = slow_ttft
+        self.error_rate = error_rate
+        self.prefill_per_token = prefill_per_token
+        self.prefix_cache = prefix_cache
+        self.cache_min_tokens = cache_min_tokens
+        self._prefixes = OrderedDict()  # 前缀的哈希值，按最近使用排序
+        self._slots = threading.Semaphore(capacity) if capacity else None
+        self._lock = threading.Lock()
+        # 计数器: requests/prompt_tokens/cached_tokens/completion_tokens/slow/errors，以及每个模型的请求数（model:模型名）
+        self.counters = Counter()
+        self._stream_ids = itertools.count(1)
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+    
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="openai-stub", daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def _render(self, body):
+        """
+        根据请求生成回复内容并计算token数
+        
+        Returns:
+            tuple: (回复内容, 提示词token数, 生成token数)
+        """
+        messages = body.get("messages", [])
+        system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        user = messages[-1]["content"] if messages else ""
+        if "JSON" in system:
+            lines = [m.group(2) for m in map(_NUMBERED_LINE.match, user.splitlines()) if m]
+            content = json.dumps([stub_reply(line) for line in lines], ensure_ascii=False)
+        else:
+            content = stub_reply(user)
+        prompt_tokens = sum(estimate_tokens(m.get("content", "")) for m in messages)
+        return content, prompt_tokens, estimate_tokens(content)
+    
+    def _cached_tokens(self, body, prompt_tokens):
+        """返回本次请求命中上下文缓存的token数，并记住本次请求的所有前缀"""
+        if not self.prefix_cache:
+            return 0
+        text = "".join(f"\x00{m.get('role')}\x01{m.get('content') or ''}" for m in body.get("messages", []))
+        matched = 0
+        with self._lock:
+            hit = True
+            for end in range(PREFIX_BLOCK_CHARS, len(text) + 1, PREFIX_BLOCK_CHARS):
+                key = hash(text[:end])
+                if hit and key in self._prefixes:
+                    matched = end
+                    self._prefixes.move_to_end(key)
+                else:
+                    hit = False
+                    self._prefixes[key] = True
+            while len(self._prefixes) > MAX_CACHED_PREFIXES:
+                self._prefixes.popitem(last=False)
+        cached = min(prompt_tokens, estimate_tokens(text[:matched]))
+        return cached if cached >= self.cache_min_tokens else 0
+    
+    def _usage(self, prompt_tokens, completion_tokens, cached_tokens):
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+    
+    def _first_token_delay(self, model=None):
+        if self.slow_rate and random.random() < self.slow_rate:
+            with self._lock:
+                self.counters["slow"] += 1
+            return self.slow_ttft
+        ttft = self.model_ttft.get(model, self.ttft)
+        if not self.jitter:
+            return ttft
+        return max(0.0, ttft * random.uniform(1 - self.jitter, 1 + self.jitter))
+    
+    def should_fail(self, body):
+        """按error_rate决定这个请求是否返回500错误"""
+        with self._lock:
+            self.counters[f"model:{body.get('model', 'stub')}"] += 1
+            if self.error_rate and random.random() < self.error_rate:
+                self.counters["errors"] += 1
+                return True
+            return False
+    
+    def _count(self, prompt_tokens, completion_tokens, cached_tokens=0):
+        with self._lock:
+            self.counters["requests"] += 1
+            self.counters["prompt_tokens"] += prompt_tokens
+            self.counters["cached_tokens"] += cached_tokens
+            self.counters["completion_tokens"] += completion_tokens
+            return self.counters["requests"]
+    
+    def complete(self, body):
+        """
+        生成一次补全，阻塞模拟的生成耗时
+        
+        Returns:
+            dict: OpenAI格式的响应
+        """
+        content, prompt_tokens, completion_tokens = self._render(body)
+        
+        if self._slots:
+            self._slots.acquire()
+        try:
+            cached_tokens = self._cached_tokens(body, prompt_tokens)
+            prefill = self.prefill_per_token * (prompt_tokens - cached_tokens)
+            time.sleep(self._first_token_delay(body.get("model")) + prefill + self.per_token * completion_tokens)
+        finally:
+            if self._slots:
+                self._slots.release()
+        
+        number = self._count(prompt_tokens, completion_tokens, cached_tokens)
+        return {
+            "id": f"stub-{number}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": self._usage(prompt_tokens, completion_tokens, cached_tokens)
+        }
+    
+    def stream(self, body):
+        """
+        以流式方式生成一次补全，在首字延迟后逐token产出，每个token间隔per_token秒
+        
+        Yields:
+            dict: OpenAI格式的chat.completion.chunk
+        """
+        content, prompt_tokens, completion_tokens = self._render(body)
+        created = int(time.time())
+        model = body.get("model", "stub")
+        chunk_id = f"stub-stream-{next(self._stream_ids)}"
+        
+        def chunk(delta, finish_reason=None):
+            return {"id": chunk_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+        
+        if self._slots:
+            self._slots.acquire()
+        try:
+            cached_tokens = self._cached_tokens(body, prompt_tokens)
+            time.sleep(self._first_token_delay(model) + self.prefill_per_token * (prompt_tokens - cached_tokens))
+            yield chunk({"role": "assistant", "content": ""})
+            for index, piece in enumerate(split_tokens(content)):
+                if index:
+                    time.sleep(self.per_token)
+                yield chunk({"content": piece})
+            yield chunk({}, "stop")
+        finally:
+            if self._slots:
+                self._slots.release()
+        
+        self._count(prompt_tokens, completion_tokens, cached_tokens)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield {"id": chunk_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                   "choices": [], "usage": self._usage(prompt_tokens, completion_tokens, cached_tokens)}
+    
+    def _handler_class(self):
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send(404, {"error": {"message": "not found"}})
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._send(400, {"error": {"message": "invalid json"}})
+                    return
+                if stub.should_fail(body):
+                    self._send(500, {"error": {"message": "stub internal error"}})
+                elif body.get("stream"):
+                    self._send_stream(stub.stream(body))
+                else:
+                    self._send(200, stub.complete(body))
+            
+            def _send(self, status, payload):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def _send_stream(self, chunks):
+                """以SSE发送流式响应，使用分块传输编码"""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                events = (f"data: {json.dumps(c, ensure_ascii=False)}\n\n" for c in chunks)
+                try:
+                    for event in itertools.chain(events, ["data: [DONE]\n\n"]):
+                        data = event.encode("utf-8")
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    # 客户端取消了请求（如对冲请求中落后的一方）
+                    self.close_connection = True
+                finally:
+                    chunks.close()
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="本地OpenAI兼容接口桩服务")
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--ttft', type=float, default=0.4, help="首字延迟（秒）")
+    parser.add_argument('--per-token', type=float, default=0.02, help="每token耗时（秒）")
+    parser.add_argument('--capacity', type=int, default=None, help="同时处理的请求数上限")
+    parser.add_argument('--jitter', type=float, default=0.0, help="首字延迟的随机抖动比例")
+    parser.add_argument('--turbo-ttft', type=float, default=None, help="qwen-turbo的首字延迟（秒），默认与--ttft相同")
+    parser.add_argument('--slow-rate', type=float, default=0.0, help="请求变慢的比例")
+    parser.add_argument('--slow-ttft', type=float, default=10.0, help="变慢的请求的首字延迟（秒）")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="返回500错误的请求比例")
+    parser.add_argument('--prefill-per-token', type=float, default=0.0, help="每个未命中缓存的提示词token的预填充耗时（秒）")
+    parser.add_argument('--prefix-cache', action='store_true', help="模拟上下文缓存")
+    parser.add_argument('--cache-min-tokens', type=int, default=0, help="相同前缀至少这么多token才命中缓存")
+    args = parser.parse_args()
+    
+    server = OpenAIStubServer(port=args.port, ttft=args.ttft, per_token=args.per_token, capacity=args.capacity,
+                              jitter=args.jitter,
+                              model_ttft={"qwen-turbo": args.turbo_ttft} if args.turbo_ttft is not None else None,
+                              slow_rate=args.slow_rate, slow_ttft=args.slow_ttft, error_rate=args.error_rate,
+                              prefill_per_token=args.prefill_per_token, prefix_cache=args.prefix_cache,
+                              cache_min_tokens=args.cache_min_tokens)
+    print(f"桩服务已启动: {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,136 @@
+"""
+直播间互动事件
+评论和礼物从抓取到回复的全过程都使用ChatEvent传递，事件上记录各阶段的单调时钟时间戳，
+用于按阶段统计延迟；使用__slots__，每个排队中的事件只占用固定的少量内存
+
+阶段划分:
+    ingest: 抓取到评论 -> 进入互动队列（包含解析、回调线程池和礼物聚合等待）
+    queue:  进入互动队列 -> 开始处理
+    reply:  开始处理 -> 回复播放完毕（千问、语音合成和播放）
+    total:  抓取到评论 -> 回复播放完毕
+"""
+
+import threading
+import time
+from collections import deque
+
+KIND_COMMENT = "评论"
+KIND_GIFT = "礼物"
+
+class ChatEvent:
+    """一条评论或礼物"""
+    
+    __slots__ = ("room", "user", "kind", "text", "gift_count", "category",
+                 "captured", "enqueued", "handled", "completed")
+    
+    def __init__(self, user, text, kind=KIND_COMMENT, room=None, gift_count=1, captured=None):
+        """
+        Args:
+            user (str): 用户名
+            text (str): 评论内容或礼物名称
+            kind (str): 消息类型（"评论"或"礼物"）
+            room (str, optional): 直播间房间号
+            gift_count (int): 礼物数量，评论为1
+            captured (float, optional): 抓取时间（time.monotonic()），默认为当前时间
+        """
+        self.room = room
+        self.user = user
+        self.kind = kind
+        self.text = text
+        self.gift_count = gift_count
+        self.category = None  # 互动类型，由调度器入队时设置
+        self.captured = time.monotonic() if captured is None else captured
+        self.enqueued = None  # 进入互动队列的时间
+        self.handled = None  # 开始处理的时间
+        self.completed = None  # 回复播放完毕的时间
+    
+    def __repr__(self):
+        return f"ChatEvent({self.kind} [{self.room}] {self.user}: {self.text})"
+    
+    def prompt_text(self):
+        """发送给千问的文本"""
+        return f"{self.user}: {self.text}"
+    
+    def stage_latencies(self):
+        """
+        各阶段耗时（秒），尚未到达的阶段不包含在结果中
+        
+        Returns:
+            dict: {"ingest": ..., "queue": ..., "reply": ..., "total": ...}
+        """
+        latencies = {}
+        if self.enqueued is not None:
+            latencies["ingest"] = self.enqueued - self.captured
+            if self.handled is not None:
+                latencies["queue"] = self.handled - self.enqueued
+        if self.handled is not None and self.completed is not None:
+            latencies["reply"] = self.completed - self.handled
+        if self.completed is not None:
+            latencies["total"] = self.completed - self.captured
+        return latencies
+    
+    def to_dict(self):
+        """转换为可JSON序列化的字典，抓取时间换算为time.time()时间戳"""
+        data = {"t": time.time() - (time.monotonic() - self.captured),
+                "user": self.user, "text": self.text, "kind": self.kind}
+        if self.room is not None:
+            data["room"] = self.room
+        if self.gift_count != 1:
+            data["gift_count"] = self.gift_count
+        return data
+    
+    @classmethod
+    def from_dict(cls, data):
+        """从to_dict的结果还原事件，抓取时间换算回本进程的单调时钟"""
+        captured = None
+        if "t" in data:
+            captured = time.monotonic() - max(0.0, time.time() - data["t"])
+        return cls(data["user"], data["text"], data.get("kind", KIND_COMMENT),
+                   room=data.get("room"), gift_count=data.get("gift_count", 1), captured=captured)
+
+STAGES = ("ingest", "queue", "reply", "total")
+
+class StageLatencyTracker:
+    """线程安全的分阶段延迟统计，只保留最近的样本"""
+    
+    def __init__(self, max_samples=2000):
+        self._samples = {stage: deque(maxlen=max_samples) for stage in STAGES}
+        self._lock = threading.Lock()
+        self.count = 0  # 已完成的事件数
+    
+    def record(self, event):
+        """记录一个已完成事件的各阶段耗时"""
+        latencies = event.stage_latencies()
+        with self._lock:
+            self.count += 1
+            for stage, seconds in latencies.items():
+                self._samples[stage].append(seconds)
+    
+    def samples(self, stage):
+        """返回某个阶段的样本列表"""
+        with self._lock:
+            return list(self._samples[stage])
+    
+    def summary(self):
+        """
+        返回各阶段的p50/p95/最大值（秒）
+        
+        Returns:
+            dict: {stage: (p50, p95, max)}，没有样本的阶段不包含在结果中
+        """
+        summary = {}
+        for stage in STAGES:
+            values = sorted(self.samples(stage))
+            if values:
+                p50 = values[int(0.50 * (len(values) - 1))]
+                p95 = values[int(0.95 * (len(values) - 1))]
+                summary[stage] = (p50, p95, values[-1])
+        return summary
+    
+    def format_summary(self):
+        """格式化为一行文本，用于打印"""
+        return "，".join(f"{stage} p50={p50:.2f}s p95={p95:.2f}s"
+                        for stage, (p50, p95, _) in self.summary().items())
+
+if __name__ == "__main__":
+    print("此模块不应直接运行，请通过main.py启动程序")
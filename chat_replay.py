@@ -0,0 +1,139 @@
+"""
+直播间评论回放模块
+按时间戳回放录制好的评论和礼物，接口与getusercomment的评论监控一致，
+用于在没有真实直播间和Chrome的情况下压测互动流程
+
+录制文件为JSONL格式，每行一个事件:
+    {"t": 12.5, "user": "小明", "text": "主播好", "kind": "评论"}
+t为事件时间（秒，可以是绝对时间戳，回放时按与第一条事件的差值计算）；
+如果缺少user/kind但有raw字段，会用classify_comment重新解析原始文本
+"""
+
+import json
+import threading
+import time
+
+from chat_event import ChatEvent
+
+# 全局变量，用于控制回放线程
+_replay_thread = None
+_stop_replay = threading.Event()
+_comment_callback = None
+
+def load_recording(path):
+    """
+    加载录制文件
+    
+    Args:
+        path (str): JSONL录制文件路径
+        
+    Returns:
+        list: 按时间排序的事件列表 [(t, user, text, kind), ...]
+    """
+    events = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"跳过无法解析的第{line_number}行")
+                continue
+            
+            user = record.get('user')
+            text = record.get('text')
+            kind = record.get('kind')
+            if (not user or not kind) and record.get('raw'):
+                # 只有原始文本时重新解析
+                from getusercomment import classify_comment
+                kind, user, text = classify_comment(record['raw'])
+            if not kind or not user or not text:
+                continue
+            events.append((float(record.get('t', 0)), user, text, kind))
+    
+    events.sort(key=lambda e: e[0])
+    return events
+
+def _replay_events(events, speed, loop):
+    """回放线程函数"""
+    while True:
+        base_time = events[0][0] if events else 0
+        start = time.monotonic()
+        for t, user, text, kind in events:
+            # 按目标时间等待，避免累计误差
+            target = start + (t - base_time) / speed
+            delay = target - time.monotonic()
+            if delay > 0 and _stop_replay.wait(delay):
+                return
+            if _stop_replay.is_set():
+                return
+            try:
+                _comment_callback(ChatEvent(user, text, kind))
+            except Exception as e:
+                print(f"回放回调出错: {str(e)}")
+        if not loop:
+            break
+    print("评论回放结束")
+
+def start_comment_monitoring(live_url, callback_function, speed=1.0, loop=False):
+    """
+    启动评论回放线程
+    
+    Args:
+        live_url (str): 录制文件路径，与真实监控的直播间URL参数位置一致
+        callback_function (callable): 回调函数 callback(event)，event为ChatEvent
+        speed (float): 回放倍速，1.0为原速
+        loop (bool): 回放结束后是否从头循环
+        
+    Returns:
+        bool: 是否成功启动
+    """
+    global _replay_thread, _comment_callback
+    
+    if speed <= 0:
+        print(f"回放倍速必须大于0: {speed}")
+        return False
+    
+    # 如果已经有回放线程在运行，先停止它
+    if _replay_thread and _replay_thread.is_alive():
+        stop_comment_monitoring()
+    
+    try:
+        events = load_recording(live_url)
+    except Exception as e:
+        print(f"加载录制文件失败: {str(e)}")
+        return False
+    
+    print(f"加载录制文件成功: {live_url}，共{len(events)}条事件，倍速{speed}x")
+    
+    _comment_callback = callback_function
+    _stop_replay.clear()
+    _replay_thread = threading.Thread(
+        target=_replay_events,
+        args=(events, speed, loop),
+        daemon=True
+    )
+    _replay_thread.start()
+    return True
+
+def stop_comment_monitoring():
+    """停止评论回放线程"""
+    global _replay_thread
+    
+    if not _replay_thread or not _replay_thread.is_alive():
+        return False
+    
+    _stop_replay.set()
+    _replay_thread.join(timeout=2)
+    _replay_thread = None
+    print("评论回放已停止")
+    return True
+
+def is_replaying():
+    """回放线程是否仍在运行"""
+    return bool(_replay_thread and _replay_thread.is_alive())
+
+if __name__ == "__main__":
+    print("此模块不应直接运行，请通过main.py或benchmarks中的压测脚本使用")
@@ -0,0 +1,142 @@
+"""
+相似评论合并模块
+直播间热闹时大量观众会发送几乎相同的评论（"来了"、"666"、同一个问题），
+逐条回复会浪费千问调用和语音合成。本模块按归一化文本或字符n-gram的MinHash
+相似度把短时间内的相似评论合并成一次回复
+"""
+
+import re
+import zlib
+from collections import Counter, OrderedDict
+
+# 归一化时移除的字符：空白、标点和常见符号
+_STRIP_PATTERN = re.compile(r'[\s\W_]+', re.UNICODE)
+# 连续重复的字符（如"666666"、"哈哈哈哈"）压缩为两个
+_REPEAT_PATTERN = re.compile(r'(.)\1{2,}')
+
+def normalize_text(text):
+    """归一化评论文本：小写、去标点空白、压缩重复字符"""
+    text = _STRIP_PATTERN.sub('', text.lower())
+    return _REPEAT_PATTERN.sub(r'\1\1', text)
+
+class MinHasher:
+    """基于字符n-gram的MinHash签名"""
+    
+    def __init__(self, num_perm=32, ngram=2, seed=1):
+        self.num_perm = num_perm
+        self.ngram = ngram
+        # 每个排列用 (a * h + b) mod p 模拟
+        self._prime = (1 << 61) - 1
+        rng = zlib.crc32(str(seed).encode())
+        self._params = []
+        for _ in range(num_perm):
+            rng = (rng * 6364136223846793005 + 1442695040888963407) & ((1 << 64) - 1)
+            a = (rng >> 3) % self._prime or 1
+            rng = (rng * 6364136223846793005 + 1442695040888963407) & ((1 << 64) - 1)
+            b = (rng >> 3) % self._prime
+            self._params.append((a, b))
+    
+    def shingles(self, text):
+        """返回文本的字符n-gram集合，文本短于n时返回整个文本"""
+        if len(text) <= self.ngram:
+            return {text}
+        return {text[i:i + self.ngram] for i in range(len(text) - self.ngram + 1)}
+    
+    def signature(self, text):
+        """计算MinHash签名"""
+        hashes = [zlib.crc32(s.encode('utf-8')) for s in self.shingles(text)]
+        prime = self._prime
+        return tuple(min((a * h + b) % prime for h in hashes) for a, b in self._params)
+    
+    @staticmethod
+    def similarity(sig1, sig2):
+        """估计两个签名对应集合的Jaccard相似度"""
+        same = sum(1 for x, y in zip(sig1, sig2) if x == y)
+        return same / len(sig1)
+
+class CommentCoalescer:
+    """判断评论是否可以合并，并统计节省的调用次数"""
+    
+    def __init__(self, window=10.0, threshold=0.8, max_group=20, cache_size=1024):
+        """
+        Args:
+            window (float): 只合并入队时间在该窗口内的评论（秒）
+            threshold (float): MinHash估计的相似度阈值，只有基准评论的原文会发给千问，
+                               阈值过低会把意思相反的评论（如"唱得真好"和"唱得真难听"）合并
+            max_group (int): 一次最多合并的评论数
+            cache_size (int): 缓存的签名数量
+        """
+        self.window = window
+        self.threshold = threshold
+        self.max_group = max_group
+        self.hasher = MinHasher()
+        self._signatures = OrderedDict()
+        self._cache_size = cache_size
+        # 计数器: groups/merged/llm_calls_saved/tts_calls_saved
+        self.counters = Counter()
+    
+    def _signature(self, normalized):
+        """带LRU缓存的签名计算"""
+        signature = self._signatures.get(normalized)
+        if signature is None:
+            signature = self.hasher.signature(normalized)
+            self._signatures[normalized] = signature
+            if len(self._signatures) > self._cache_size:
+                self._signatures.popitem(last=False)
+        else:
+            self._signatures.move_to_end(normalized)
+        return signature
+    
+    def matcher(self, event):
+        """
+        返回判断其他评论能否与该评论合并的函数
+        
+        Args:
+            event (ChatEvent): 作为合并基准的评论，礼物不参与合并，只与同一互动类型（提问、欢迎等）的评论合并
+            
+        Returns:
+            callable: predicate(event)，不可合并时返回None
+        """
+        kind = event.kind
+        category = event.category
+        if kind == "礼物":
+            return None
+        
+        base = normalize_text(event.text)
+        if not base:
+            return None
+        base_signature = None
+        
+        def predicate(other_event):
+            nonlocal base_signature
+            if other_event.kind != kind or other_event.category != category:
+                return False
+            other = normalize_text(other_event.text)
+            if other == base:
+                return True
+            if not other:
+                return False
+            if base_signature is None:
+                base_signature = self._signature(base)
+            return MinHasher.similarity(base_signature, self._signature(other)) >= self.threshold
+        
+        return predicate
+    
+    def record_group(self, content, group_size):
+        """记录一次合并，group_size包含作为基准的那条评论"""
+        if group_size <= 1:
+            return
+        saved = group_size - 1
+        self.counters["groups"] += 1
+        self.counters["merged"] += saved
+        # "来了"只需要语音合成欢迎词，其他评论同时节省千问调用和语音合成
+        if content != "来了":
+            self.counters["llm_calls_saved"] += saved
+        self.counters["tts_calls_saved"] += saved
+
+def format_usernames(usernames, limit=5):
+    """将多个用户名拼接为"A、B、C等N位朋友"的形式"""
+    unique = list(dict.fromkeys(usernames))
+    if len(unique) <= limit:
+        return '、'.join(unique)
+    return f"{'、'.join(unique[:limit])}等{len(unique)}位朋友"
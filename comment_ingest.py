@@ -0,0 +1,245 @@
+"""
+评论采集子进程模块
+在独立进程中运行Selenium评论监控，把评论事件通过管道发送回主进程，
+避免浏览器轮询、JS执行和文本解析与主进程的asyncio事件循环、音频播放争抢GIL。
+接口与getusercomment的start_comment_monitoring/stop_comment_monitoring一致
+
+管道中每条消息是一个UTF-8编码的JSON对象，由Connection.send_bytes加上4字节长度前缀:
+    {"type": "comment", "t": 1700000000.12, "room": "769032284842", "user": "小明", "text": "主播好", "kind": "评论"}
+    {"type": "status", "running": true}
+评论消息即ChatEvent.to_dict()，t为子进程抓取到评论时的时间戳，主进程据此还原抓取时间并统计采集延迟
+"""
+
+import json
+import multiprocessing
+import threading
+import time
+from collections import deque
+
+from chat_event import ChatEvent
+
+# 默认的采集子进程，供start_comment_monitoring/stop_comment_monitoring使用
+_default_ingest = None
+
+def encode_event(event):
+    """把事件编码为紧凑的JSON字节串"""
+    return json.dumps(event, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def decode_event(payload):
+    """解码一条事件"""
+    return json.loads(payload.decode('utf-8'))
+
+class IngestChannel:
+    """子进程中采集函数使用的事件发送通道"""
+    
+    def __init__(self, conn, stop_event):
+        self._conn = conn
+        self._send_lock = threading.Lock()  # 评论回调可能来自多个线程
+        self.stop_event = stop_event  # 主进程要求停止时被设置
+    
+    def _send(self, event):
+        try:
+            payload = encode_event(event)
+            with self._send_lock:
+                self._conn.send_bytes(payload)
+        except (OSError, ValueError) as e:
+            # 主进程已关闭管道，停止采集
+            print(f"发送评论事件失败: {str(e)}")
+            self.stop_event.set()
+    
+    def ready(self, running):
+        """通知主进程采集是否已成功启动"""
+        self._send({"type": "status", "running": bool(running)})
+    
+    def emit(self, event):
+        """发送一条评论事件（ChatEvent）"""
+        message = event.to_dict()
+        message["type"] = "comment"
+        self._send(message)
+
+def run_comment_monitor(live_url, channel, record_path=None, lightweight=None):
+    """
+    默认的采集函数：在子进程中运行CommentMonitor，直到主进程要求停止或监控线程退出
+    
+    Args:
+        live_url (str): 直播间URL
+        channel (IngestChannel): 事件发送通道
+        record_path (str, optional): 评论录制文件路径
+        lightweight (bool, optional): 是否以轻量模式运行浏览器
+    """
+    from getusercomment import CommentMonitor
+    
+    monitor = CommentMonitor(record_path=record_path, lightweight=lightweight)
+    monitor.add_room(live_url, channel.emit)
+    started = monitor.start()
+    channel.ready(started)
+    if not started:
+        return
+    try:
+        while monitor.is_running() and not channel.stop_event.wait(1.0):
+            pass
+    finally:
+        monitor.stop()
+
+def _worker_main(worker, live_url, conn, stop_event, options):
+    """子进程入口"""
+    channel = IngestChannel(conn, stop_event)
+    try:
+        worker(live_url, channel, **options)
+    except Exception as e:
+        print(f"评论采集进程出错: {str(e)}")
+        channel.ready(False)
+    finally:
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+class CommentIngestProcess:
+    """在子进程中采集评论，并在主进程的读取线程中回调"""
+    
+    def __init__(self, live_url, callback_function, worker=run_comment_monitor,
+                 start_timeout=120, **options):
+        """
+        Args:
+            live_url (str): 直播间URL
+            callback_function (callable): 评论回调函数 callback(event)，event为ChatEvent
+            worker (callable): 子进程中运行的采集函数 worker(live_url, channel, **options)，
+                               必须是模块级函数以便在spawn模式下传给子进程
+            start_timeout (float): 等待子进程启动浏览器并进入直播间的最长时间（秒）
+            **options: 传给采集函数的其他参数，如record_path、lightweight
+        """
+        self.live_url = live_url
+        self._callback = callback_function
+        self._worker = worker
+        self._options = options
+        self.start_timeout = start_timeout
+        self.received = 0  # 收到的评论数
+        self.latencies = deque(maxlen=10000)  # 最近的采集延迟（秒）：子进程发现评论到主进程回调
+        self._process = None
+        self._conn = None
+        self._stop_event = None
+        self._reader_thread = None
+    
+    def start(self):
+        """
+        启动采集子进程并等待其就绪
+        
+        Returns:
+            bool: 是否成功启动
+        """
+        if self.is_running():
+            print("评论采集进程已在运行中")
+            return True
+        
+        # 使用spawn启动，避免子进程继承主进程的事件循环、音频设备等状态
+        context = multiprocessing.get_context('spawn')
+        self._conn, child_conn = context.Pipe(duplex=False)
+        self._stop_event = context.Event()
+        self._process = context.Process(
+            target=_worker_main,
+            args=(self._worker, self.live_url, child_conn, self._stop_event, self._options),
+            name="comment-ingest",
+            daemon=True
+        )
+        self._process.start()
+        child_conn.close()  # 主进程只保留读取端，子进程退出后读取端才能收到EOF
+        print(f"评论采集进程已启动 (pid={self._process.pid})，等待进入直播间...")
+        
+        try:
+            if not self._conn.poll(self.start_timeout):
+                print("等待评论采集进程启动超时")
+                self.stop()
+                return False
+            event = decode_event(self._conn.recv_bytes())
+        except (EOFError, OSError) as e:
+            print(f"评论采集进程启动失败: {str(e)}")
+            self.stop()
+            return False
+        
+        if not event.get("running"):
+            print("评论采集进程启动失败")
+            self.stop()
+            return False
+        
+        self._reader_thread = threading.Thread(target=self._read_events, name="comment-ingest-reader")
+        self._reader_thread.daemon = True
+        self._reader_thread.start()
+        print("评论采集进程已就绪")
+        return True
+    
+    def _read_events(self):
+        """读取线程：接收子进程发来的事件并回调"""
+        while True:
+            try:
+                payload = self._conn.recv_bytes()
+            except (EOFError, OSError):
+                break
+            try:
+                event = decode_event(payload)
+            except ValueError as e:
+                print(f"无法解析评论事件: {str(e)}")
+                continue
+            
+            if event.get("type") == "comment":
+                self.received += 1
+                self.latencies.append(time.time() - event["t"])
+                try:
+                    self._callback(ChatEvent.from_dict(event))
+                except Exception as e:
+                    print(f"回调函数执行出错: {str(e)}")
+            elif event.get("type") == "status" and not event.get("running"):
+                break
+        print("评论采集进程已断开")
+    
+    def is_running(self):
+        """检查采集子进程是否在运行"""
+        return self._process is not None and self._process.is_alive()
+    
+    def stop(self):
+        """停止采集子进程"""
+        if self._process is None:
+            return
+        print("正在停止评论采集进程...")
+        self._stop_event.set()
+        self._process.join(timeout=15)
+        if self._process.is_alive():
+            print("评论采集进程未能按时退出，强制结束")
+            self._process.terminate()
+            self._process.join(timeout=5)
+        if self._reader_thread:
+            self._reader_thread.join(timeout=2)
+            self._reader_thread = None
+        self._conn.close()
+        self._process = None
+        print("评论采集进程已停止")
+
+def start_comment_monitoring(live_url, callback_function, record_path=None):
+    """
+    在子进程中启动评论监控
+    
+    Args:
+        live_url (str): 抖音直播间URL
+        callback_function (callable): 回调函数 callback(event)，event为ChatEvent，在主进程的读取线程中调用
+        record_path (str, optional): 评论录制文件路径，由子进程写入
+    
+    Returns:
+        bool: 是否成功启动监控
+    """
+    global _default_ingest
+    stop_comment_monitoring()
+    _default_ingest = CommentIngestProcess(live_url, callback_function, record_path=record_path)
+    if not _default_ingest.start():
+        _default_ingest = None
+        return False
+    return True
+
+def stop_comment_monitoring():
+    """停止子进程中的评论监控"""
+    global _default_ingest
+    if _default_ingest:
+        _default_ingest.stop()
+        _default_ingest = None
+
+if __name__ == "__main__":
+    print("此模块不应直接运行，请通过main.py启动程序")
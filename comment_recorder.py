@@ -0,0 +1,105 @@
+"""
+直播间评论录制模块
+将评论监控抓取到的每条消息写入只追加的JSONL日志，
+日志可直接用于chat_replay回放压测和评论解析基准测试
+
+每行格式:
+    {"t": 1718000000.123, "raw": "小明：主播好", "kind": "评论", "user": "小明", "text": "主播好"}
+多直播间监控时每行还带有"room"字段（房间号）
+"""
+
+import json
+import queue
+import threading
+import time
+
+class CommentRecorder:
+    """批量异步写入的评论录制器，record()只做入队，不会阻塞轮询线程"""
+    
+    def __init__(self, path, batch_size=64, flush_interval=1.0, max_pending=10000):
+        """
+        Args:
+            path (str): 录制文件路径，以追加方式打开
+            batch_size (int): 累计多少条后立即写入
+            flush_interval (float): 最长多久写入一次（秒）
+            max_pending (int): 待写入队列上限，超出时丢弃并计数
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.recorded = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+    
+    def record(self, raw, kind=None, user=None, text=None, t=None, room=None):
+        """
+        记录一条消息
+        
+        Args:
+            raw (str): 页面上抓取到的原始文本
+            kind (str, optional): 解析出的消息类型，无法解析时为None
+            user (str, optional): 解析出的用户名
+            text (str, optional): 解析出的评论内容或礼物名称
+            t (float, optional): 抓取时间戳，默认为当前时间
+            room (str, optional): 直播间房间号
+        """
+        record = {
+            "t": round(t if t is not None else time.time(), 3),
+            "raw": raw,
+            "kind": kind,
+            "user": user,
+            "text": text,
+        }
+        if room is not None:
+            record["room"] = room
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+    
+    def _writer(self):
+        """写入线程函数，按批次或时间间隔写入文件"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                record = self._queue.get(timeout=timeout)
+                if record is None:
+                    # 收到关闭信号
+                    self._write_batch(batch)
+                    return
+                batch.append(record)
+            except queue.Empty:
+                pass
+            
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._write_batch(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+    
+    def _write_batch(self, batch):
+        """将一批记录写入文件"""
+        if not batch:
+            return
+        try:
+            self._file.write(''.join(
+                json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+                for record in batch
+            ))
+            self._file.flush()
+            self.recorded += len(batch)
+        except Exception as e:
+            print(f"写入评论录制文件失败: {str(e)}")
+    
+    def close(self):
+        """写入剩余记录并关闭文件"""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        self._file.close()
+        print(f"评论录制已关闭: {self.path}，共写入{self.recorded}条，丢弃{self.dropped}条")
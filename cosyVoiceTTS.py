@@ -37,8 +37,16 @@ if PLAY_REALTIME_RESULT:
 # 使用最新创建的语音模型ID
 VOICE_ID = "cosyvoice-v2-mysound03-3436a10"
 
+# 语音合成服务地址，由于目前阶段大模型音色只在北京地区服务可用，默认使用北京的地址
+# 可通过ALIYUN_NLS_URL指向本地桩服务（benchmarks/nls_stub.py）
+NLS_URL = os.getenv('ALIYUN_NLS_URL', "wss://nls-gateway-cn-beijing.aliyuncs.com/ws/v1")
+
 def get_token():
     """获取阿里云语音合成服务的访问Token"""
+    # 设置了ALIYUN_NLS_TOKEN时直接使用（如连接本地桩服务时），不再调用CreateToken接口
+    token = os.getenv('ALIYUN_NLS_TOKEN')
+    if token:
+        return token
     try:
         # 创建AcsClient实例，用于与阿里云API通信
         client = AcsClient(
@@ -79,7 +87,7 @@ def get_token():
         return None
 
 # 添加process_tts函数，用于被主控文件调用
-def process_tts(token, test_text, story_title=None, sentence_number=None, total_sentences=None):
+def process_tts(token, test_text, story_title=None, sentence_number=None, total_sentences=None, aformat="wav"):
     """
     处理文本到语音的转换
     
@@ -91,9 +99,10 @@ def process_tts(token, test_text, story_title=None, sentence_number=None, total_
         story_title (str, optional): 故事标题，用于控制台输出
         sentence_number (int, optional): 当前句子编号，用于控制台输出
         total_sentences (int, optional): 总句子数，用于控制台输出
+        aformat (str): 音频格式，默认wav；需要拼接音频时使用pcm
         
     Returns:
-        bytes: 生成的WAV音频数据
+        bytes: 生成的音频数据，aformat为wav时是WAV，为pcm时是16位单声道PCM
     """
     # 创建一个内存缓冲区来存储音频数据
     import io
@@ -160,8 +169,7 @@ def process_tts(token, test_text, story_title=None, sentence_number=None, total_
       
         # 初始化语音合成SDK
         sdk = NlsStreamInputTtsSynthesizer(
-            # 由于目前阶段大模型音色只在北京地区服务可用，因此需要调整url到北京
-            url="wss://nls-gateway-cn-beijing.aliyuncs.com/ws/v1",
+            url=NLS_URL,
             token=token,                                            # 访问Token
             appkey=appkey,                                          # 应用的AppKey
             on_data=test_on_data,                                   # 数据回调函数
@@ -173,7 +181,7 @@ def process_tts(token, test_text, story_title=None, sentence_number=None, total_
         # 开始语音合成，设置参数
         sdk.startStreamInputTts(
             voice=VOICE_ID,             # 使用克隆的语音ID
-            aformat="wav",               # 音频格式
+            aformat=aformat,             # 音频格式
             sample_rate=24000,           # 采样率
             volume=50,                   # 音量，范围0-100
             speech_rate=0,               # 语速，0表示正常语速
@@ -210,6 +218,47 @@ def process_tts(token, test_text, story_title=None, sentence_number=None, total_
         except:
             pass
 
+def start_stream_tts(token, on_data, on_error=None, aformat="pcm", sample_rate=24000):
+    """
+    启动一个流式文本输入的语音合成会话，之后可以多次调用sendStreamInputTts逐段发送文本
+    
+    Args:
+        token (str): 阿里云语音合成服务的访问Token
+        on_data (callable): 音频数据回调 on_data(data)，在SDK的接收线程中调用
+        on_error (callable, optional): 错误回调 on_error(message)
+        aformat (str): 音频格式，流式播放时使用pcm
+        sample_rate (int): 采样率
+        
+    Returns:
+        NlsStreamInputTtsSynthesizer: 已启动的合成会话，用完后调用stopStreamInputTts
+    """
+    appkey = os.getenv('ALIYUN_APPKEY')
+    if not appkey:
+        raise ValueError("未找到ALIYUN_APPKEY环境变量")
+    
+    def handle_error(message, *args):
+        print(f"语音合成错误: {str(message)}")
+        if on_error:
+            on_error(message)
+    
+    sdk = NlsStreamInputTtsSynthesizer(
+        url=NLS_URL,
+        token=token,
+        appkey=appkey,
+        on_data=lambda data, *args: on_data(data),
+        on_error=handle_error,
+        callback_args=[]
+    )
+    sdk.startStreamInputTts(
+        voice=VOICE_ID,
+        aformat=aformat,
+        sample_rate=sample_rate,
+        volume=50,
+        speech_rate=0,
+        pitch_rate=0
+    )
+    return sdk
+
 test_text = [
     "流式文本语音合成SDK，",
     "可以将输入的文本",
@@ -256,8 +305,7 @@ if __name__ == "__main__":
     
     # 创建SDK实例
     sdk = NlsStreamInputTtsSynthesizer(
-        # 由于目前阶段大模型音色只在北京地区服务可用，因此需要调整url到北京
-        url="wss://nls-gateway-cn-beijing.aliyuncs.com/ws/v1",
+        url=NLS_URL,
         
         token=token,                                            # 动态获取的token
         appkey=appkey,                                          # 从.env文件中获取的appkey
@@ -3,33 +3,129 @@
 使用千问大模型对直播间用户评论生成回复
 """
 
+import asyncio
+import json
 import os
-from datetime import datetime
 import re
 import time
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
-from typing import Dict, List, Tuple
+from openai import OpenAI, AsyncOpenAI, APIConnectionError, APITimeoutError, RateLimitError, InternalServerError
+from monitor_supervisor import ExponentialBackoff
+from prompt_templates import PromptTemplates, PromptTokenMeter, estimate_prompt_tokens
+from reply_cache import ReplyCache
+from reply_deadline import DeadlineReplyGenerator
+from response_history import ResponseHistory
 
 # 加载环境变量
 load_dotenv()
 
-# 初始化OpenAI客户端（用于调用千问API）
+# 千问兼容模式接口地址，可通过DASHSCOPE_BASE_URL指向本地桩服务（benchmarks/openai_stub.py）
+QWEN_BASE_URL = os.getenv('DASHSCOPE_BASE_URL', "https://dashscope.aliyuncs.com/compatible-mode/v1")
+
+# 初始化OpenAI客户端（用于调用千问API），不自动重试，请求的超时时间就是回复的截止时间
 client = OpenAI(
     api_key=os.getenv('DASHSCOPE_API_KEY'),
-    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+    base_url=QWEN_BASE_URL,
+    max_retries=0
 )
 
-# 全局变量，用于存储所有回复
-# 格式: [(timestamp, comment, response), ...]
-RESPONSES_HISTORY: List[Tuple[datetime, str, str]] = []
+# 异步客户端配置：最多同时生成的回复数、单次请求超时（秒）和失败重试次数
+QWEN_MAX_CONCURRENCY = int(os.getenv('QWEN_MAX_CONCURRENCY', '4'))
+QWEN_TIMEOUT = float(os.getenv('QWEN_TIMEOUT', '15'))
+QWEN_MAX_RETRIES = int(os.getenv('QWEN_MAX_RETRIES', '2'))
+
+# 生成回复使用的模型；回复的截止时间（秒）；主模型QWEN_HEDGE_AFTER秒内没有输出第一个字时
+# 向QWEN_HEDGE_MODEL再发一个请求，QWEN_HEDGE_MODEL为空时不发
+QWEN_MODEL = os.getenv('QWEN_MODEL', "qwen-plus")
+QWEN_HEDGE_MODEL = os.getenv('QWEN_HEDGE_MODEL', "qwen-turbo")
+QWEN_DEADLINE = float(os.getenv('QWEN_DEADLINE', '8'))
+QWEN_HEDGE_AFTER = float(os.getenv('QWEN_HEDGE_AFTER', '1.5'))
+
+# 超时、连接失败、限流和服务端错误时重试，其他错误（如鉴权失败、参数错误）直接抛出
+_RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError)
+
+# 共享的异步客户端和并发信号量，在第一次使用时创建，绑定到主事件循环
+_async_client = None
+_generation_semaphore = None
 
-# 最新回复
-LATEST_RESPONSE: Dict[str, str] = {
-    "comment": "",
-    "response": "",
-    "timestamp": ""
-}
+# 提示词模板：系统提示词是固定前缀，互动类型和观众情况作为后缀放在评论后面，见prompt_templates.py
+REPLY_PROMPTS = PromptTemplates()
+
+# 发送的提示词token数（优先使用接口返回的用量，包括命中上下文缓存的token数）
+PROMPT_TOKENS = PromptTokenMeter()
+
+# 回复缓存：重复或相似的问题直接使用缓存的回复和语音
+REPLY_CACHE = ReplyCache()
+
+# 回复历史：定长环形缓冲区，记录为ResponseRecord(timestamp, comment, response, user)
+# 设置RESPONSE_HISTORY_PATH时每条记录追加写入该JSONL文件，重启后加载最近的记录
+RESPONSES_HISTORY = ResponseHistory(
+    capacity=int(os.getenv('RESPONSE_HISTORY_SIZE', '1000')),
+    path=os.getenv('RESPONSE_HISTORY_PATH') or None
+)
+
+async def _stream_completion(model, messages, on_first_token, timeout):
+    """
+    以流式方式请求一次完整回复，收到第一个字时调用on_first_token，主模型的请求受并发数限制
+    超时、连接失败、限流和服务端错误时在timeout秒内按指数退避重试，最多QWEN_MAX_RETRIES次
+    """
+    async def request(timeout):
+        usage = None
+        try:
+            stream = await get_async_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                extra_body={"stream_options": {"include_usage": True}},
+                timeout=timeout
+            )
+            parts = []
+            try:
+                async for chunk in stream:
+                    usage = getattr(chunk, 'usage', None) or usage
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if not parts:
+                            on_first_token()
+                        parts.append(delta)
+            finally:
+                await stream.close()
+            return "".join(parts)
+        finally:
+            # 被取消或出错的请求也已经发送了提示词
+            _record_usage(usage, messages)
+    
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    backoff = ExponentialBackoff(base=0.5, max_delay=4.0)
+    attempt = 0
+    while True:
+        try:
+            # 对冲请求不排队等待并发名额，每条回复最多多出一个请求
+            if model != QWEN_MODEL:
+                return await request(deadline - loop.time())
+            async with _get_generation_semaphore():
+                return await request(deadline - loop.time())
+        except _RETRYABLE_ERRORS as e:
+            delay = backoff.next_delay()
+            # 退避等待后已经没有时间再请求一次时直接抛出，由调用方发出对冲请求或使用兜底回复
+            if attempt >= QWEN_MAX_RETRIES or loop.time() + delay >= deadline:
+                raise
+            attempt += 1
+            print(f"调用千问API失败（{model}，{type(e).__name__}），{delay:.1f}秒后第{attempt}次重试")
+            await asyncio.sleep(delay)
+
+# 限时生成：截止时间、对冲请求、兜底回复和回复延迟直方图，见reply_deadline.py
+REPLY_GENERATOR = DeadlineReplyGenerator(
+    _stream_completion,
+    QWEN_MODEL,
+    hedge_model=QWEN_HEDGE_MODEL or None,
+    deadline=QWEN_DEADLINE,
+    hedge_after=QWEN_HEDGE_AFTER
+)
 
 def get_response_from_qianwen(comment, system_prompt=None):
     """
@@ -42,87 +138,414 @@ def get_response_from_qianwen(comment, system_prompt=None):
         system_prompt (str, optional): 系统提示词，用于指导模型回复的风格和内容
         
     Returns:
-        str: 模型生成的回复
+        str: 模型生成的回复，出错或超时时返回兜底回复
+    """
+    try:
+        return _request_reply(comment, system_prompt)
+    except Exception as e:
+        print(f"调用千问API时发生错误: {str(e)}")
+        return REPLY_GENERATOR.fallbacks.pick()
+
+def build_messages(comment, system_prompt=None, history=None, suffix=None):
+    """
+    组装发给千问的消息列表
+    
+    Args:
+        comment (str): 用户评论
+        system_prompt (str, optional): 系统提示词，默认使用提示词模板的固定前缀
+        history (list, optional): 插在系统提示词和本次评论之间的历史消息（如观众的对话上下文）
+        suffix (str, optional): 补充说明（互动类型、观众情况等），放在评论后面的括号里，
+                                见prompt_templates.PromptTemplates.suffix
+        
+    Returns:
+        list: [{'role': ..., 'content': ...}, ...]
     """
     if system_prompt is None:
-        system_prompt = "你是一个友好、幽默的直播助手，负责回答直播间观众的问题和评论。回复要简洁、有趣，不超过50个字。"
+        system_prompt = REPLY_PROMPTS.system_prompt()
+    messages = [{'role': 'system', 'content': system_prompt}]
+    if history:
+        messages.extend(history)
+    messages.append({'role': 'user', 'content': f"{comment}（{suffix}）" if suffix else comment})
+    return messages
+
+def _usage_field(usage, name):
+    """读取用量字段，SDK未声明的字段（如流式响应中的usage）以字典形式保留"""
+    if isinstance(usage, dict):
+        return usage.get(name)
+    return getattr(usage, name, None)
+
+def _record_usage(usage, messages):
+    """记录一次请求发送的提示词token数，接口没有返回用量时按消息估算"""
+    prompt_tokens = _usage_field(usage, 'prompt_tokens') if usage else None
+    if prompt_tokens is None:
+        PROMPT_TOKENS.record(estimate_prompt_tokens(messages))
+        return
+    details = _usage_field(usage, 'prompt_tokens_details')
+    PROMPT_TOKENS.record(prompt_tokens, (_usage_field(details, 'cached_tokens') if details else None) or 0)
+
+def _request_reply(comment, system_prompt=None, history=None, suffix=None):
+    """调用千问API获取回复，出错或超过QWEN_DEADLINE秒时抛出异常"""
+    # 调用千问API
+    messages = build_messages(comment, system_prompt, history, suffix)
+    completion = client.chat.completions.create(
+        model=QWEN_MODEL,
+        messages=messages,
+        stream=False,
+        timeout=QWEN_DEADLINE
+    )
+    _record_usage(completion.usage, messages)
+    
+    # 获取回复内容
+    return completion.choices[0].message.content
+
+def stream_response_from_qianwen(comment, system_prompt=None, history=None, suffix=None):
+    """
+    以流式方式从千问大模型获取回复，逐段返回模型生成的文本
     
+    与REPLY_GENERATOR使用同样的截止时间：超过QWEN_DEADLINE秒后不再读取后续文本；
+    出错或超时前还没有输出任何文本时，返回一句兜底回复（可用is_fallback_reply判断）
+    
+    Args:
+        comment (str): 用户评论
+        system_prompt (str, optional): 系统提示词
+        history (list, optional): 历史消息
+        suffix (str, optional): 评论后面的补充说明
+        
+    Yields:
+        str: 增量文本片段
+    """
+    messages = build_messages(comment, system_prompt, history, suffix)
+    deadline = time.monotonic() + QWEN_DEADLINE
+    usage = None
+    stream = None
+    started = False
     try:
-        # 调用千问API
-        completion = client.chat.completions.create(
-            model="qwen-plus",  # 可按需更换模型名称
-            messages=[
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': comment}
-            ],
-            stream=False
+        stream = client.chat.completions.create(
+            model=QWEN_MODEL,
+            messages=messages,
+            stream=True,
+            extra_body={"stream_options": {"include_usage": True}},
+            timeout=QWEN_DEADLINE
         )
-        
-        # 获取回复内容
-        response = completion.choices[0].message.content
-        return response
+        for chunk in stream:
+            usage = getattr(chunk, 'usage', None) or usage
+            if time.monotonic() >= deadline:
+                print(f"流式生成回复超过{QWEN_DEADLINE:.1f}秒，停止生成")
+                break
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                started = True
+                yield delta
+    except Exception as e:
+        if started:
+            # 已经输出的部分回复正在播放，不再补充兜底回复
+            print(f"流式生成回复时发生错误: {str(e)}")
+        else:
+            print(f"调用千问API时发生错误: {str(e)}")
+    finally:
+        if stream is not None:
+            stream.close()
+        _record_usage(usage, messages)
+    if not started:
+        yield REPLY_GENERATOR.fallbacks.pick()
+
+def store_response(comment, response, user=None):
+    """
+    存储评论和回复到回复历史
     
+    Args:
+        comment (str): 发给千问的评论文本
+        response (str): 回复内容
+        user (str, optional): 观众用户名，默认从"用户名: 评论"中解析
+    """
+    RESPONSES_HISTORY.append(comment, response, user=user)
+
+def process_live_comment(comment, system_prompt=None, cache_key=None, viewer=None, history=None, suffix=None):
+    """
+    处理直播评论并获取回复
+    
+    Args:
+        comment (str): 发给千问的评论文本
+        system_prompt (str, optional): 系统提示词
+        cache_key (str, optional): 指定时把成功生成的回复以该问题写入回复缓存，查询缓存使用lookup_cached_reply
+        viewer (str, optional): 提问的观众，回复中的名字在缓存中替换为占位符
+        history (list, optional): 观众的对话上下文消息，见viewer_context.ViewerContextManager.build
+        suffix (str, optional): 评论后面的补充说明（互动类型、观众情况等），不写入回复历史
+        
+    Returns:
+        str: 回复内容
+    """
+    # 从千问获取回复，出错时使用兜底回复，兜底回复不写入缓存
+    try:
+        response = _request_reply(comment, system_prompt, history, suffix)
     except Exception as e:
         print(f"调用千问API时发生错误: {str(e)}")
-        return f"抱歉，我暂时无法回答这个问题。错误信息: {str(e)}"
-
-def store_response(comment, response):
-    """存储评论和回复到全局变量"""
-    global RESPONSES_HISTORY, LATEST_RESPONSE
+        response = REPLY_GENERATOR.fallbacks.pick()
+    else:
+        if cache_key:
+            REPLY_CACHE.store(cache_key, response, viewer=viewer)
     
-    # 获取当前时间
-    now = datetime.now()
+    # 存储回复
+    store_response(comment, response, user=viewer)
     
-    # 更新最新回复
-    LATEST_RESPONSE = {
-        "comment": comment,
-        "response": response,
-        "timestamp": now.strftime("%Y-%m-%d %H:%M:%S")
-    }
+    # 返回回复内容
+    return response
+
+def get_async_client():
+    """
+    获取共享的AsyncOpenAI客户端，所有协程复用同一个连接池
+    安装了h2（pip install httpx[http2]）时使用HTTP/2，多个请求复用同一条连接
+    """
+    global _async_client
+    if _async_client is None:
+        try:
+            import h2  # noqa: F401
+            http2 = True
+        except ImportError:
+            http2 = False
+        http_client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=QWEN_MAX_CONCURRENCY * 2,
+                max_keepalive_connections=QWEN_MAX_CONCURRENCY,
+                keepalive_expiry=60.0
+            ),
+            timeout=httpx.Timeout(QWEN_TIMEOUT, connect=5.0)
+        )
+        # 重试由async_request_reply和_stream_completion按指数退避处理
+        _async_client = AsyncOpenAI(
+            api_key=os.getenv('DASHSCOPE_API_KEY'),
+            base_url=QWEN_BASE_URL,
+            http_client=http_client,
+            max_retries=0
+        )
+    return _async_client
+
+def _get_generation_semaphore():
+    """获取限制并发生成数的信号量，需在事件循环中调用"""
+    global _generation_semaphore
+    if _generation_semaphore is None:
+        _generation_semaphore = asyncio.Semaphore(QWEN_MAX_CONCURRENCY)
+    return _generation_semaphore
+
+async def async_request_reply(comment, system_prompt=None, timeout=None, history=None, suffix=None):
+    """
+    异步调用千问API获取回复，不阻塞事件循环
     
-    # 添加到历史记录
-    RESPONSES_HISTORY.append((now, comment, response))
+    同时进行的请求数不超过QWEN_MAX_CONCURRENCY；超时、连接失败、限流和服务端错误时
+    按指数退避最多重试QWEN_MAX_RETRIES次，退避等待期间不占用并发名额
     
-    # 如果历史记录过长，保留最近的100条
-    if len(RESPONSES_HISTORY) > 100:
-        RESPONSES_HISTORY = RESPONSES_HISTORY[-100:]
+    Args:
+        comment (str): 用户评论
+        system_prompt (str, optional): 系统提示词
+        timeout (float, optional): 单次请求的超时时间（秒），默认QWEN_TIMEOUT
+        history (list, optional): 历史消息
+        suffix (str, optional): 评论后面的补充说明
+        
+    Returns:
+        str: 模型生成的回复，最终失败时抛出异常
+    """
+    messages = build_messages(comment, system_prompt, history, suffix)
+    backoff = ExponentialBackoff(base=0.5, max_delay=4.0)
+    attempt = 0
+    while True:
+        try:
+            async with _get_generation_semaphore():
+                completion = await get_async_client().chat.completions.create(
+                    model=QWEN_MODEL,
+                    messages=messages,
+                    stream=False,
+                    timeout=timeout or QWEN_TIMEOUT
+                )
+            _record_usage(completion.usage, messages)
+            return completion.choices[0].message.content
+        except _RETRYABLE_ERRORS as e:
+            if attempt >= QWEN_MAX_RETRIES:
+                raise
+            attempt += 1
+            delay = backoff.next_delay()
+            print(f"调用千问API失败（{type(e).__name__}），{delay:.1f}秒后第{attempt}次重试")
+            await asyncio.sleep(delay)
 
-def process_live_comment(comment, system_prompt=None):
-    """处理直播评论并获取回复"""
-    # 从千问获取回复
-    response = get_response_from_qianwen(comment, system_prompt)
+async def async_process_live_comment(comment, system_prompt=None, cache_key=None, viewer=None, history=None,
+                                     suffix=None):
+    """
+    异步处理直播评论并获取回复，参数和返回值与process_live_comment相同
     
-    # 存储回复
-    store_response(comment, response)
+    通过REPLY_GENERATOR限时生成：最迟QWEN_DEADLINE秒后返回，主模型慢时发出对冲请求，
+    都没能返回时使用兜底回复（可用is_fallback_reply判断），兜底回复不写入缓存
+    """
+    result = await REPLY_GENERATOR.generate(build_messages(comment, system_prompt, history, suffix))
+    response = result.text
+    if cache_key and result.source != "fallback":
+        REPLY_CACHE.store(cache_key, response, viewer=viewer)
     
-    # 返回回复内容
+    # 存储回复
+    store_response(comment, response, user=viewer)
     return response
 
+# 批量回复的格式要求，拼接在系统提示词之后
+BATCH_REPLY_INSTRUCTION = ("下面是直播间的多条评论，请分别回复每一条，括号中是对该条评论的补充说明。"
+                           "只输出一个JSON字符串数组，数组长度等于评论条数，第i个元素是对第i条评论的回复，不要输出其他内容。")
+
+def parse_batch_replies(content, count):
+    """
+    解析批量回复的JSON数组
+    
+    Args:
+        content (str): 模型输出，可能带有```json代码块标记
+        count (int): 评论条数
+        
+    Returns:
+        list: 与评论一一对应的回复文本
+        
+    Raises:
+        ValueError: 输出不是长度为count的数组，或有空回复
+    """
+    start = content.find('[')
+    end = content.rfind(']')
+    if start < 0 or end < start:
+        raise ValueError("批量回复中没有JSON数组")
+    replies = json.loads(content[start:end + 1])
+    if not isinstance(replies, list) or len(replies) != count:
+        raise ValueError(f"批量回复数量不匹配: 需要{count}条")
+    result = []
+    for reply in replies:
+        # 兼容模型输出[{"reply": "..."}]的情况
+        if isinstance(reply, dict):
+            reply = reply.get("reply") or reply.get("content") or ""
+        reply = str(reply).strip()
+        if not reply:
+            raise ValueError("批量回复中有空回复")
+        result.append(reply)
+    return result
+
+async def async_process_comment_batch(comments, notes=None, cache_keys=None, viewers=None, system_prompt=None):
+    """
+    一次请求为多条评论生成回复，每条回复像process_live_comment一样写入回复历史和回复缓存
+    
+    Args:
+        comments (list): 发给千问的评论文本，如["小明: 主播几岁", ...]
+        notes (list, optional): 每条评论的补充说明（礼物、观众情况等），可以为空字符串
+        cache_keys (list, optional): 每条评论写入回复缓存的键，None表示不缓存
+        viewers (list, optional): 每条评论的观众
+        system_prompt (str, optional): 系统提示词，会在后面拼接批量回复的格式要求，默认使用提示词模板的固定前缀
+        
+    Returns:
+        list: 与comments一一对应的回复
+        
+    Raises:
+        Exception: 请求失败或输出无法解析时抛出，由调用方回退到逐条生成
+    """
+    count = len(comments)
+    notes = notes or [""] * count
+    cache_keys = cache_keys or [None] * count
+    viewers = viewers or [None] * count
+    if system_prompt is None:
+        system_prompt = REPLY_PROMPTS.system_prompt(BATCH_REPLY_INSTRUCTION)
+    else:
+        system_prompt += BATCH_REPLY_INSTRUCTION
+    
+    lines = []
+    for index, (comment, note) in enumerate(zip(comments, notes), 1):
+        lines.append(f"{index}. {comment}（{note}）" if note else f"{index}. {comment}")
+    content = await async_request_reply("\n".join(lines), system_prompt)
+    replies = parse_batch_replies(content, count)
+    
+    for comment, reply, cache_key, viewer in zip(comments, replies, cache_keys, viewers):
+        if cache_key:
+            REPLY_CACHE.store(cache_key, reply, viewer=viewer)
+        store_response(comment, reply, user=viewer)
+    return replies
+
+async def close_async_client():
+    """关闭共享的异步客户端及其连接池"""
+    global _async_client, _generation_semaphore
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+    _generation_semaphore = None
+
+def process_live_comment_stream(comment, system_prompt=None, history=None, viewer=None, suffix=None):
+    """
+    流式处理直播评论，逐段返回回复文本，回复完整生成后存储
+    出错或超时时返回兜底回复，见stream_response_from_qianwen
+    """
+    parts = []
+    for delta in stream_response_from_qianwen(comment, system_prompt, history, suffix):
+        parts.append(delta)
+        yield delta
+    store_response(comment, "".join(parts), user=viewer)
+
+def is_fallback_reply(response):
+    """回复是否是出错或超时时使用的兜底回复"""
+    return REPLY_GENERATOR.is_fallback(response)
+
+def lookup_cached_reply(question, viewer=None):
+    """
+    在回复缓存中查找问题（精确匹配或近似匹配）
+    
+    Args:
+        question (str): 评论原文
+        viewer (str, optional): 提问的观众，用于替换缓存回复中的名字
+        
+    Returns:
+        CachedReply: 命中时返回，包含回复文本和缓存的语音（可能为None），未命中返回None
+    """
+    return REPLY_CACHE.lookup(question, viewer=viewer)
+
+def cache_reply(question, response, audio=None, viewer=None):
+    """把回复（以及合成好的语音）写入回复缓存"""
+    REPLY_CACHE.store(question, response, audio=audio, viewer=viewer)
+
+def cache_reply_audio(question, audio):
+    """为已缓存的回复补充合成好的语音"""
+    return REPLY_CACHE.attach_audio(question, audio)
+
 def get_latest_response():
     """获取最新的回复"""
-    global LATEST_RESPONSE
-    return LATEST_RESPONSE
+    record = RESPONSES_HISTORY.latest()
+    if record is None:
+        return {"comment": "", "response": "", "timestamp": ""}
+    return {
+        "comment": record.comment,
+        "response": record.response,
+        "timestamp": record.timestamp.strftime("%Y-%m-%d %H:%M:%S")
+    }
 
-def get_response_history(limit=None):
-    """获取历史回复记录"""
-    global RESPONSES_HISTORY
+def get_response_history(limit=None, user=None, since=None, until=None):
+    """
+    获取历史回复记录，按时间从旧到新排列
+    
+    Args:
+        limit (int, optional): 返回最近的n条记录
+        user (str, optional): 只返回该观众的记录
+        since (datetime, optional): 起始时间（包含）
+        until (datetime, optional): 结束时间（包含）
+        
+    Returns:
+        list: [ResponseRecord(timestamp, comment, response, user), ...]
+    """
+    if user is not None:
+        records = RESPONSES_HISTORY.by_user(user)
+        if since is not None or until is not None:
+            records = [r for r in records
+                       if (since is None or r.timestamp >= since) and (until is None or r.timestamp <= until)]
+    elif since is not None or until is not None:
+        records = RESPONSES_HISTORY.between(since, until)
+    else:
+        return RESPONSES_HISTORY.recent(limit)
     
     # 如果指定了限制，返回最近的n条记录
     if limit and isinstance(limit, int) and limit > 0:
-        return RESPONSES_HISTORY[-limit:]
-    
-    # 否则返回所有记录
-    return RESPONSES_HISTORY
+        return records[-limit:]
+    return records
 
 def clear_response_history():
     """清空回复历史记录"""
-    global RESPONSES_HISTORY, LATEST_RESPONSE
-    RESPONSES_HISTORY = []
-    LATEST_RESPONSE = {
-        "comment": "",
-        "response": "",
-        "timestamp": ""
-    }
+    RESPONSES_HISTORY.clear()
 
 if __name__ == "__main__":
     print("此模块不应直接运行，请通过main.py启动程序") 
\ No newline at end of file
@@ -18,17 +18,20 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.common.exceptions import (
+    TimeoutException, WebDriverException, InvalidSessionIdException, NoSuchWindowException
+)
 from webdriver_manager.chrome import ChromeDriverManager
 from datetime import datetime
 import concurrent.futures
+from comment_recorder import CommentRecorder
+from chat_event import ChatEvent, KIND_COMMENT, KIND_GIFT
+from monitor_supervisor import (
+    MonitorSupervisor, ExponentialBackoff, STATE_RELOADING
+)
 
-# 全局变量，用于控制评论监控线程
-_monitoring_thread = None
-_stop_monitoring = False
-_driver = None
-_comment_callback = None
-_seen_comments = set()
+# 默认的评论监控器，供start_comment_monitoring/stop_comment_monitoring使用
+_default_monitor = None
 
 @contextmanager
 def suppress_stderr():
@@ -52,98 +55,111 @@ def suppress_stderr():
         # 恢复原始的标准错误
         sys.stderr = original_stderr
 
+# 预编译的单次匹配正则：依次尝试"用户名:内容"和"用户名送出了礼物"两种格式
+# 注意分支顺序即优先级，带冒号的普通评论优先于礼物
+_LINE_PATTERN = re.compile(
+    r'(?P<user>[^:：]+)[:：](?P<content>.+)'
+    r'|(?P<gift_user>.+?)(?:送出了|赠送了|送出|赠送)(?P<gift>.+)'
+)
+
+def classify_comment(comment):
+    """
+    单次解析一行直播间消息，判断消息类型并提取用户名和内容
+    
+    Args:
+        comment (str): 页面上抓取到的原始消息文本
+        
+    Returns:
+        tuple: (kind, user, payload)，kind为KIND_COMMENT或KIND_GIFT；
+               无法解析或系统消息时返回(None, None, None)
+    """
+    # 只取第一行，并移除空白字符
+    line = comment.strip()
+    newline = line.find('\n')
+    if newline != -1:
+        line = line[:newline].strip()
+    if not line:
+        return None, None, None
+    
+    # "用户名来了"进场消息
+    if '来了' in line:
+        username = line.replace('来了', '').strip()
+        if username:
+            return KIND_COMMENT, username, "来了"
+    
+    match = _LINE_PATTERN.fullmatch(line)
+    if match:
+        if match.lastgroup == 'content':
+            username = match.group('user').strip()
+            content = match.group('content').strip()
+            if username and content:
+                return KIND_COMMENT, username, content
+        else:
+            username = match.group('gift_user').strip()
+            gift_name = match.group('gift').strip()
+            if username and gift_name:
+                return KIND_GIFT, username, gift_name
+    
+    # 没有分隔符的系统消息
+    if '来了' in line or '进入直播间' in line:
+        return None, None, None
+    
+    # 无法解析时，将整行作为匿名评论
+    return KIND_COMMENT, '匿名用户', line
+
 def parse_comment(comment):
     """解析评论内容，提取用户名和评论内容"""
-    try:
-        # 移除可能的空白字符
-        comment = comment.strip()
-        
-        # 如果评论包含多个评论（用换行符分隔），只取第一个
-        if '\n' in comment:
-            comment = comment.split('\n')[0].strip()
-        
-        # 检查是否包含"来了"关键词
-        if '来了' in comment:
-            # 尝试提取用户名（用户名来了）
-            username = comment.replace('来了', '').strip()
-            if username:
-                return username, "来了"
-        
-        # 尝试多种分隔符
-        separators = [':', '：']
-        for sep in separators:
-            if sep in comment:
-                parts = comment.split(sep, 1)
-                if len(parts) == 2:
-                    username = parts[0].strip()
-                    content = parts[1].strip()
-                    if username and content:
-                        return username, content
-        
-        # 如果上面的方法都失败，尝试使用正则表达式
-        pattern = r'^([^:：]+)[:：](.+)$'
-        match = re.match(pattern, comment)
-        if match:
-            username = match.group(1).strip()
-            content = match.group(2).strip()
-            if username and content:
-                return username, content
-        
-        # 如果评论中没有分隔符，可能是系统消息或特殊格式
-        if '来了' in comment or '进入直播间' in comment:
-            return None, None
-            
-        # 如果无法解析，尝试将整个评论作为内容
-        return '匿名用户', comment
-        
-    except Exception as e:
-        print(f"解析评论时出错: {str(e)}")
-        return None, None
+    kind, username, content = classify_comment(comment)
+    if kind == KIND_COMMENT:
+        return username, content
+    return None, None
 
 def parse_gift(comment):
     """解析礼物信息，提取用户名和礼物名称"""
+    kind, username, gift_name = classify_comment(comment)
+    if kind == KIND_GIFT:
+        return username, gift_name
+    return None, None
+
+# 轻量模式下通过CDP屏蔽的请求：直播视频流、图片和字体，评论文本不受影响
+BLOCKED_URL_PATTERNS = [
+    "*.flv*", "*.m3u8*", "*.ts", "*.ts?*", "*.mp4*", "*.m4s*",
+    "*.jpg*", "*.jpeg*", "*.png*", "*.gif*", "*.webp*", "*.avif*", "*.image*",
+    "*.woff*", "*.woff2*", "*.ttf*", "*.otf*",
+]
+
+def _apply_resource_blocking(driver):
+    """在当前标签页启用请求屏蔽，每个标签页都需要单独设置"""
     try:
-        # 移除可能的空白字符
-        comment = comment.strip()
-        
-        # 如果评论包含多个评论（用换行符分隔），只取第一个
-        if '\n' in comment:
-            comment = comment.split('\n')[0].strip()
-        
-        # 尝试多种礼物格式
-        patterns = [
-            r'^(.+)送出了(.+)$',
-            r'^(.+)赠送(.+)$',
-            r'^(.+)送出(.+)$',
-            r'^(.+)赠送了(.+)$',
-            r'^(.+)送出了(.+)$'
-        ]
-        
-        for pattern in patterns:
-            match = re.match(pattern, comment)
-            if match:
-                username = match.group(1).strip()
-                gift_name = match.group(2).strip()
-                if username and gift_name:
-                    return username, gift_name
-        
-        # 如果无法解析为礼物，返回None
-        return None, None
-        
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
     except Exception as e:
-        print(f"解析礼物时出错: {str(e)}")
-        return None, None
+        print(f"设置请求屏蔽失败: {str(e)}")
 
-def _initialize_browser():
-    """初始化浏览器驱动"""
-    global _driver
+def _initialize_browser(user_data_dir=None, debugger_address=None, lightweight=False):
+    """
+    初始化浏览器驱动，成功时返回driver，失败时返回None
     
+    Args:
+        user_data_dir (str, optional): 持久化的Chrome用户数据目录，复用磁盘缓存和Cookie以加快启动，
+                                       不指定时使用无痕模式
+        debugger_address (str, optional): 已启动Chrome的远程调试地址（如"127.0.0.1:9222"），
+                                          指定后直接连接该浏览器而不再启动新的Chrome
+        lightweight (bool): 轻量模式，无头运行、缩小视口、静音并屏蔽视频流/图片/字体请求
+    """
     try:
         # 配置Chrome浏览器选项
         chrome_options = Options()
         
-        # 添加无痕模式
-        chrome_options.add_argument("--incognito")
+        if debugger_address:
+            # 连接预先启动的Chrome（chrome --remote-debugging-port=9222），启动参数由该浏览器自己决定
+            chrome_options.add_experimental_option("debuggerAddress", debugger_address)
+        elif user_data_dir:
+            # 使用持久化的用户数据目录
+            chrome_options.add_argument(f"--user-data-dir={os.path.abspath(user_data_dir)}")
+        else:
+            # 添加无痕模式
+            chrome_options.add_argument("--incognito")
         
         # 基本设置
         chrome_options.add_argument('--disable-web-security')  # 禁用网页安全性检查
@@ -176,7 +192,14 @@ def _initialize_browser():
         chrome_options.add_argument('--enable-features=NetworkService,NetworkServiceInProcess')  # 启用网络服务
         chrome_options.add_argument('--metrics-recording-only')  # 仅记录指标
         chrome_options.add_argument('--no-pings')  # 禁用ping
-        chrome_options.add_argument('--window-size=1920,1080')  # 设置窗口大小
+        if lightweight:
+            chrome_options.add_argument('--headless=new')  # 无头模式
+            chrome_options.add_argument('--window-size=800,600')  # 缩小视口，减少渲染开销
+            chrome_options.add_argument('--mute-audio')  # 静音
+            chrome_options.add_argument('--autoplay-policy=user-gesture-required')  # 禁止视频自动播放
+            chrome_options.add_argument('--blink-settings=imagesEnabled=false')  # 不加载图片
+        else:
+            chrome_options.add_argument('--window-size=1920,1080')  # 设置窗口大小
         
         # 设置随机User-Agent
         user_agents = [
@@ -201,14 +224,14 @@ def _initialize_browser():
                 return None
                 
             service = Service(driver_path)
-            _driver = webdriver.Chrome(service=service, options=chrome_options)
+            driver = webdriver.Chrome(service=service, options=chrome_options)
             
             # 设置页面加载超时
-            _driver.set_page_load_timeout(30)
-            _driver.set_script_timeout(30)
+            driver.set_page_load_timeout(30)
+            driver.set_script_timeout(30)
             
             # 使用CDP命令修改navigator.webdriver标志
-            _driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
+            driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
                 'source': '''
                     Object.defineProperty(navigator, 'webdriver', {
                         get: () => undefined
@@ -234,17 +257,11 @@ def _initialize_browser():
                 '''
             })
             
-            # 测试网络连接
-            print("测试网络连接...")
-            try:
-                _driver.get("https://www.baidu.com")
-                print("网络连接测试成功")
-                print("Chrome浏览器初始化成功")
-                return _driver
-            except Exception as e:
-                print(f"网络连接测试失败: {str(e)}")
-                print("请检查网络连接或代理设置")
-                return None
+            if lightweight:
+                _apply_resource_blocking(driver)
+            
+            print("Chrome浏览器初始化成功")
+            return driver
                 
         except Exception as e:
             print(f"初始化Chrome浏览器失败: {str(e)}")
@@ -254,334 +271,802 @@ def _initialize_browser():
         print(f"初始化浏览器时出错: {str(e)}")
         return None
 
-def _monitor_comments():
-    """监控评论的线程函数"""
-    global _driver, _stop_monitoring, _seen_comments
-    
-    _seen_comments = set()  # 重置已处理评论集合
-    last_print_time = 0  # 上次打印时间
-    print_interval = 5  # 打印间隔（秒）
-    retry_count = 0  # 重试计数器
-    max_retries = 3  # 最大重试次数
-    last_url = None  # 记录最后访问的URL
-    
-    while not _stop_monitoring:
-        try:
-            if not _driver:
-                print("浏览器未初始化，尝试重新初始化...")
-                _driver = _initialize_browser()
-                if not _driver:
-                    print("浏览器初始化失败，等待后重试...")
-                    time.sleep(2)
-                    continue
-                
-                # 如果有上次的URL，尝试重新访问
-                if last_url:
-                    print(f"尝试重新访问直播间: {last_url}")
-                    try:
-                        _driver.get(last_url)
-                        time.sleep(5)  # 等待页面加载
-                    except Exception as e:
-                        print(f"重新访问直播间失败: {str(e)}")
-                        continue
-            
-            # 检查页面是否仍然加载
-            try:
-                # 保存当前URL
-                last_url = _driver.current_url
-                
-                # 检查页面状态
-                page_state = _driver.execute_script("return document.readyState")
-                if page_state != "complete":
-                    print(f"页面未完全加载 (状态: {page_state})，等待加载完成...")
-                    time.sleep(2)
-                    continue
-                
-                # 检查是否存在服务器错误提示
-                error_elements = _driver.find_elements(By.XPATH, "//*[contains(text(), '服务器开小差了') or contains(text(), '点击刷新重试')]")
-                if error_elements:
-                    print("检测到服务器错误，尝试刷新页面...")
-                    try:
-                        _driver.refresh()
-                        time.sleep(5)  # 等待页面刷新
-                    except Exception as e:
-                        print(f"刷新页面失败: {str(e)}")
-                        # 如果刷新失败，尝试重新访问
-                        try:
-                            _driver.get(last_url)
-                            time.sleep(5)
-                        except:
-                            print("刷新页面失败，尝试重新初始化浏览器...")
-                            _driver.quit()
-                            _driver = None
-                            continue
-                    
-                    retry_count += 1
-                    if retry_count >= max_retries:
-                        print("达到最大重试次数，重新初始化浏览器...")
-                        _driver.quit()
-                        _driver = None
-                        retry_count = 0
-                    continue
-                
-                # 重置重试计数器
-                retry_count = 0
-                
-            except Exception as e:
-                print(f"检查页面状态时出错: {str(e)}")
-                if "invalid session id" in str(e):
-                    print("浏览器会话已失效，需要重新初始化...")
-                    _driver = None
-                print("尝试重新加载页面...")
-                try:
-                    _driver.refresh()
-                    time.sleep(5)
-                except:
-                    print("刷新页面失败，尝试重新初始化浏览器...")
-                    _driver.quit()
-                    _driver = None
-                continue
-            
-            # 使用JavaScript获取评论元素，改进选择器
-            current_time = time.time()
-            if current_time - last_print_time >= print_interval:
-                print("正在监控评论...")
-                # 打印页面结构信息
-                try:
-                    page_source = _driver.page_source
-                    
-                    # 尝试多个可能的选择器来定位评论容器
-                    selectors = [
-                        "div[class*='webcast-chatroom']",
-                        "div[class*='chatroom']",
-                        "div[class*='chat-list']",
-                        "div[class*='message-list']",
-                        "div[class*='comment-list']"
-                    ]
-                    
-                    for selector in selectors:
-                        elements = _driver.find_elements(By.CSS_SELECTOR, selector)
-                        if elements:
-                            print(f"找到评论容器，使用选择器: {selector}")
-                            print(f"容器数量: {len(elements)}")
-                            for i, elem in enumerate(elements):
-                                print(f"容器 {i+1} 内容: {elem.text[:100]}...")
-                            break
-                except Exception as e:
-                    print(f"检查页面结构时出错: {str(e)}")
-                
-                last_print_time = current_time
-            
+class AdaptivePollInterval:
+    """
+    根据评论速率自适应调整轮询间隔
+    
+    房间安静时逐步退避到max_interval，有新评论时立即收紧，
+    评论越密集间隔越短，最短为min_interval
+    """
+    
+    def __init__(self, min_interval=0.1, max_interval=4.0, initial=0.5, backoff=1.5, smoothing=0.3):
+        """
+        Args:
+            min_interval (float): 最短轮询间隔（秒）
+            max_interval (float): 最长轮询间隔（秒）
+            initial (float): 初始轮询间隔（秒）
+            backoff (float): 没有新评论时间隔的放大倍数
+            smoothing (float): 评论速率指数平滑系数
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.smoothing = smoothing
+        self.interval = initial
+        self.rate = 0.0  # 平滑后的评论速率（条/秒）
+        self._last_time = None
+    
+    def update(self, new_count, now=None):
+        """
+        根据本次轮询发现的新评论数更新间隔
+        
+        Returns:
+            float: 下次轮询前应等待的秒数
+        """
+        now = time.monotonic() if now is None else now
+        if self._last_time is not None:
+            elapsed = max(now - self._last_time, 1e-3)
+            self.rate += self.smoothing * (new_count / elapsed - self.rate)
+        self._last_time = now
+        
+        if new_count > 0:
+            # 有新评论：先减半，再按速率收紧到大约每次轮询一条评论
+            target = 1.0 / self.rate if self.rate > 0 else self.interval
+            self.interval = min(self.interval / 2, target)
+        else:
+            self.interval *= self.backoff
+        self.interval = max(self.min_interval, min(self.max_interval, self.interval))
+        return self.interval
+
+# 在页面中提取评论文本的脚本
+# 评论节点选择器：第一个为抖音当前页面的标准选择器，其余按顺序作为备选
+COMMENT_SELECTORS = [
+    'div[class*="webcast-chatroom___list"] div[class*="webcast-chatroom___item"]',
+    'div[class*="webcast-chatroom___list"] div[class*="webcast-chatroom___message"]',
+    'div[class*="webcast-chatroom___list"] div[class*="webcast-chatroom___content"]',
+    'div[class*="webcast-chatroom___list"] div[class*="webcast-chatroom___text"]',
+    'div[class*="chat-message"]',
+    'div[class*="message-item"]',
+    'div[class*="chat-item"]',
+    'div[class*="comment-item"]',
+    'div[class*="chat-list"] div[class*="item"]',
+    'div[class*="chat-list"] div[class*="message"]',
+    'div[class*="webcast-chatroom"] div[class*="item"]',
+    'div[class*="webcast-chatroom"] div[class*="message"]',
+    'div[class*="chatroom"] div[class*="item"]',
+    'div[class*="chatroom"] div[class*="message"]',
+    'div[class*="message-list"] div[class*="item"]',
+    'div[class*="message-list"] div[class*="message"]'
+]
+
+# 增量提取评论：arguments[0]为已确定的选择器，arguments[1]为备选选择器列表
+# 已处理的节点记录在页面内的WeakMap中，从列表末尾向前遍历，遇到已处理且内容未变的节点（水位线）即停止，
+# 每次轮询的工作量只与新评论数量有关，而与历史评论数量无关
+_EXTRACT_COMMENTS_JS = """
+    let selector = arguments[0];
+    const candidates = arguments[1];
+    const debugInfo = [];
+    const processed = window.__liveCommentNodes || (window.__liveCommentNodes = new WeakMap());
+    
+    let elements = selector ? document.querySelectorAll(selector) : [];
+    if (elements.length === 0) {
+        // 选择器未确定或已失效时，按顺序查找第一个能匹配到评论的选择器
+        selector = null;
+        for (const candidate of candidates) {
+            const found = document.querySelectorAll(candidate);
+            debugInfo.push(`选择器 ${candidate} 找到 ${found.length} 个元素`);
+            if (found.length > 0) {
+                selector = candidate;
+                elements = found;
+                break;
+            }
+        }
+    }
+    
+    const comments = [];
+    let scanned = 0;
+    for (let i = elements.length - 1; i >= 0; i--) {
+        const el = elements[i];
+        const text = el.textContent.trim();
+        if (processed.get(el) === text) {
+            break;
+        }
+        scanned++;
+        if (!text) {
+            continue;
+        }
+        processed.set(el, text);
+        if (!text.includes('系统提示') && !text.includes('欢迎来到直播间')) {
+            comments.push(text);
+        }
+    }
+    comments.reverse();
+    
+    return {
+        selector: selector,
+        comments: comments,
+        total: elements.length,
+        scanned: scanned,
+        debugInfo: debugInfo
+    };
+"""
+
+# 页面服务器错误提示
+_SERVER_ERROR_XPATH = "//*[contains(text(), '服务器开小差了') or contains(text(), '点击刷新重试')]"
+
+def _is_session_lost(error):
+    """判断异常是否表示浏览器会话已失效，需要重启浏览器"""
+    if isinstance(error, (InvalidSessionIdException, NoSuchWindowException)):
+        return True
+    # 部分Selenium版本只抛出带有该信息的WebDriverException
+    return isinstance(error, WebDriverException) and "invalid session id" in str(error)
+
+def room_id_from_url(live_url):
+    """从直播间URL中提取房间号，如 https://live.douyin.com/769032284842 -> 769032284842"""
+    return live_url.split('?', 1)[0].rstrip('/').rsplit('/', 1)[-1] or live_url
+
+class _Room:
+    """单个直播间的监控状态"""
+    
+    def __init__(self, room_id, live_url, callback, max_reloads=3):
+        self.room_id = room_id
+        self.live_url = live_url
+        self.callback = callback
+        self.window_handle = None  # 直播间所在标签页
+        self.use_iframe = False  # 评论是否在iframe中
+        self.seen_comments = set()  # 已处理评论集合
+        self.poll_interval = AdaptivePollInterval()  # 自适应轮询间隔
+        self.next_poll = 0  # 下次轮询时间；等待打开时为下次尝试打开的时间
+        self.next_health_check = 0  # 下次页面健康检查时间
+        self.supervisor = MonitorSupervisor(room_id, max_reloads=max_reloads)  # 自愈状态机和健康指标
+        self.structure_logged = False  # 是否已打印过页面结构信息
+        self.comment_selector = None  # 当前页面上确定的评论选择器，页面重新加载后重新查找
+        self.last_print_time = 0  # 上次打印状态的时间
+        self.poll_count = 0  # 轮询次数
+
+class CommentMonitor:
+    """
+    多直播间评论监控器
+    
+    所有直播间共用一个Chrome实例，每个直播间占用一个标签页。
+    监控线程按各直播间的自适应轮询间隔轮流切换标签页抓取评论，
+    每个直播间的评论回调到该直播间自己的回调函数。
+    """
+    
+    def __init__(self, record_path=None, health_check_interval=10, max_retries=3, callback_workers=4,
+                 user_data_dir=None, debugger_address=None, lightweight=None):
+        """
+        Args:
+            record_path (str, optional): 评论录制文件路径，录制内容包含房间号
+            health_check_interval (float): 每个直播间页面健康检查的间隔（秒）
+            max_retries (int): 连续刷新页面多少次仍未恢复后重启浏览器
+            callback_workers (int): 执行评论回调的线程数
+            user_data_dir (str, optional): 持久化的Chrome用户数据目录，默认读取CHROME_USER_DATA_DIR环境变量
+            debugger_address (str, optional): 预先启动的Chrome远程调试地址，默认读取CHROME_DEBUGGER_ADDRESS环境变量
+            lightweight (bool, optional): 轻量模式（无头、屏蔽视频流/图片/字体），默认读取CHROME_LIGHTWEIGHT环境变量
+        """
+        self.health_check_interval = health_check_interval
+        self.user_data_dir = user_data_dir or os.getenv('CHROME_USER_DATA_DIR')
+        self.debugger_address = debugger_address or os.getenv('CHROME_DEBUGGER_ADDRESS')
+        if lightweight is None:
+            lightweight = os.getenv('CHROME_LIGHTWEIGHT', '').lower() in ('1', 'true', 'yes')
+        self.lightweight = lightweight
+        self.cold_start_seconds = None  # 首次启动浏览器并打开直播间的耗时
+        self.reconnect_seconds = []  # 每次重启浏览器并恢复直播间的耗时
+        self.max_retries = max_retries
+        self.browser_restarts = 0  # 浏览器重启次数
+        self._browser_backoff = ExponentialBackoff(base=1.0, max_delay=60.0)
+        self.print_interval = 5  # 状态打印间隔（秒）
+        self.webdriver_calls = 0  # WebDriver调用次数
+        self._driver = None
+        self._rooms = {}
+        self._pending_rooms = []  # 监控线程运行期间新增的直播间，由监控线程打开
+        self._active_room = None  # 当前所在的直播间标签页
+        self._rooms_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._callback_workers = callback_workers
+        self._executor = None
+        self._recorder = None
+        if record_path:
             try:
-                # 使用更全面的选择器列表
-                comments = _driver.execute_script("""
-                    const selectors = [
-                        'div[class*="webcast-chatroom___list"] div[class*="webcast-chatroom___item"]',
-                        'div[class*="webcast-chatroom___list"] div[class*="webcast-chatroom___message"]',
-                        'div[class*="webcast-chatroom___list"] div[class*="webcast-chatroom___content"]',
-                        'div[class*="webcast-chatroom___list"] div[class*="webcast-chatroom___text"]',
-                        'div[class*="chat-message"]',
-                        'div[class*="message-item"]',
-                        'div[class*="chat-item"]',
-                        'div[class*="comment-item"]',
-                        'div[class*="chat-list"] div[class*="item"]',
-                        'div[class*="chat-list"] div[class*="message"]',
-                        'div[class*="webcast-chatroom"] div[class*="item"]',
-                        'div[class*="webcast-chatroom"] div[class*="message"]',
-                        'div[class*="chatroom"] div[class*="item"]',
-                        'div[class*="chatroom"] div[class*="message"]',
-                        'div[class*="message-list"] div[class*="item"]',
-                        'div[class*="message-list"] div[class*="message"]'
-                    ];
-                    
-                    let comments = [];
-                    let debugInfo = [];
-                    
-                    for (const selector of selectors) {
-                        const elements = document.querySelectorAll(selector);
-                        debugInfo.push(`选择器 ${selector} 找到 ${elements.length} 个元素`);
-                        
-                        for (const el of elements) {
-                            const text = el.textContent.trim();
-                            if (text && !text.includes('系统提示') && !text.includes('欢迎来到直播间')) {
-                                comments.push(text);
-                            }
-                        }
-                    }
-                    
-                    return {
-                        comments: [...new Set(comments)],
-                        debugInfo: debugInfo
-                    };
-                """)
-                
-                # 打印调试信息
-                if current_time - last_print_time >= print_interval:
-                    print("\n调试信息:")
-                    for info in comments['debugInfo']:
-                        print(info)
-                    print(f"找到 {len(comments['comments'])} 条评论\n")
-                
-                if comments['comments']:
-                    for comment_text in comments['comments']:
-                        if comment_text not in _seen_comments:
-                            _seen_comments.add(comment_text)
-                            print(f"发现新评论: {comment_text}")
-                            try:
-                                # 解析评论
-                                username, content = parse_comment(comment_text)
-                                if username and content:
-                                    print(f"解析评论成功: {username}: {content}")
-                                    # 使用线程池执行回调
-                                    with concurrent.futures.ThreadPoolExecutor() as executor:
-                                        executor.submit(_comment_callback, username, content, "评论")
-                                
-                                # 解析礼物
-                                username, gift_name = parse_gift(comment_text)
-                                if username and gift_name:
-                                    print(f"解析礼物成功: {username} 送出了 {gift_name}")
-                                    # 使用线程池执行回调
-                                    with concurrent.futures.ThreadPoolExecutor() as executor:
-                                        executor.submit(_comment_callback, username, gift_name, "礼物")
-                            except Exception as e:
-                                print(f"处理评论时出错: {str(e)}")
-                                continue
-                
+                self._recorder = CommentRecorder(record_path)
+                print(f"评论录制已开启: {record_path}")
             except Exception as e:
-                print(f"获取评论时出错: {str(e)}")
-                if "invalid session id" in str(e):
-                    print("浏览器会话已失效，需要重新初始化...")
-                    _driver = None
-                continue
-            
-            time.sleep(0.5)  # 降低检查频率
+                print(f"打开评论录制文件失败: {str(e)}")
+    
+    @property
+    def room_ids(self):
+        """正在监控的直播间房间号列表"""
+        with self._rooms_lock:
+            return list(self._rooms) + [room.room_id for room in self._pending_rooms]
+    
+    def add_room(self, live_url, callback_function, room_id=None):
+        """
+        添加要监控的直播间，由监控线程打开；打开失败时按退避时间重试，
+        等待打开的直播间见metrics()中的pending_rooms
+        
+        Args:
+            live_url (str): 抖音直播间URL
+            callback_function (callable): 回调函数 callback(event)，event为ChatEvent
+            room_id (str, optional): 房间号，默认从URL中提取
             
-        except Exception as e:
-            print(f"监控评论时出错: {str(e)}")
-            if "invalid session id" in str(e):
-                print("浏览器会话已失效，需要重新初始化...")
-                _driver = None
-            time.sleep(2)  # 出错后等待更长时间再重试
-            continue
-
-def start_comment_monitoring(live_url, callback_function):
-    """启动评论监控线程"""
-    global _monitoring_thread, _stop_monitoring, _driver, _comment_callback
+        Returns:
+            str: 房间号
+        """
+        room = _Room(room_id or room_id_from_url(live_url), live_url, callback_function, self.max_retries)
+        with self._rooms_lock:
+            if room.room_id in self._rooms or any(r.room_id == room.room_id for r in self._pending_rooms):
+                print(f"直播间已在监控中: {room.room_id}")
+                return room.room_id
+            self._pending_rooms.append(room)
+        return room.room_id
     
-    print("开始初始化评论监控...")
+    def remove_room(self, room_id):
+        """停止监控指定直播间，实际关闭标签页由监控线程完成"""
+        with self._rooms_lock:
+            pending = [r for r in self._pending_rooms if r.room_id == room_id]
+            self._pending_rooms = [r for r in self._pending_rooms if r.room_id != room_id]
+            room = self._rooms.get(room_id)
+            # 正在打开的直播间也标记为已移除，打开失败时不再重新排队
+            for r in pending + ([room] if room else []):
+                r.callback = None
+        return room is not None or bool(pending)
     
-    # 保存回调函数
-    _comment_callback = callback_function
+    def start(self):
+        """
+        初始化浏览器，打开已添加的直播间并启动监控线程
+        
+        Returns:
+            bool: 是否成功启动
+        """
+        if self._thread and self._thread.is_alive():
+            print("评论监控线程已在运行")
+            return True
+        
+        self._stop_event.clear()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._callback_workers)
+        start_time = time.monotonic()
+        self._driver = self._launch_browser()
+        if not self._driver:
+            print("浏览器初始化失败，无法启动评论监控")
+            return False
+        browser_seconds = time.monotonic() - start_time
+        
+        # 部分直播间打开失败时仍然启动，这些直播间由监控线程按退避时间重试；一个都没打开时启动失败
+        if not self._open_pending_rooms() and not self._rooms:
+            return False
+        self.cold_start_seconds = time.monotonic() - start_time
+        print(f"冷启动耗时: 浏览器{browser_seconds:.1f}s，共{self.cold_start_seconds:.1f}s（含打开直播间）")
+        
+        # 创建并启动新的监控线程
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        
+        # 验证线程是否成功启动
+        if self._thread.is_alive():
+            print(f"评论监控线程已成功启动，监控直播间: {', '.join(self.room_ids)}")
+            return True
+        print("评论监控线程启动失败")
+        return False
     
-    # 如果已经有监控线程在运行，先停止它
-    if _monitoring_thread and _monitoring_thread.is_alive():
-        print("发现已有监控线程在运行，先停止它...")
-        stop_comment_monitoring()
+    def stop(self):
+        """停止监控线程并关闭浏览器"""
+        print("正在停止评论监控...")
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=10)
+        self._thread = None
+        self._quit_driver()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        
+        # 写入剩余的录制记录
+        if self._recorder:
+            self._recorder.close()
+            self._recorder = None
+        print("评论监控已停止")
     
-    # 重置停止标志
-    _stop_monitoring = False
+    def is_running(self):
+        """监控线程是否在运行"""
+        return bool(self._thread and self._thread.is_alive())
     
-    # 初始化浏览器
-    _driver = _initialize_browser()
-    if not _driver:
-        print("浏览器初始化失败，无法启动评论监控")
-        return False
+    def _launch_browser(self):
+        """按配置启动或连接浏览器"""
+        return _initialize_browser(
+            user_data_dir=self.user_data_dir,
+            debugger_address=self.debugger_address,
+            lightweight=self.lightweight
+        )
+    
+    def _quit_driver(self):
+        """安全关闭浏览器"""
+        driver, self._driver = self._driver, None
+        self._active_room = None
+        if driver:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+    
+    def _open_pending_rooms(self):
+        """
+        打开到期的待打开直播间（新添加的，或浏览器重启后需要恢复的）
+        打开失败的直播间按该直播间的退避时间重新排队，不会丢失
         
-    # 访问直播间
-    try:
-        print("正在访问直播间...")
-        _driver.get(live_url)
-        print(f"当前页面URL: {_driver.current_url}")
+        Returns:
+            bool: 没有直播间仍在等待打开时返回True
+        """
+        now = time.monotonic()
+        with self._rooms_lock:
+            pending = [room for room in self._pending_rooms if room.next_poll <= now]
+            self._pending_rooms = [room for room in self._pending_rooms if room.next_poll > now]
+        
+        for room in pending:
+            if self._open_room(room):
+                room.next_poll = 0
+                with self._rooms_lock:
+                    self._rooms[room.room_id] = room
+                continue
+            room.supervisor.record_failure("打开直播间失败")
+            delay = room.supervisor.next_delay()
+            room.next_poll = time.monotonic() + delay
+            with self._rooms_lock:
+                if room.callback is None:
+                    continue
+                self._pending_rooms.append(room)
+            print(f"直播间 [{room.room_id}] 打开失败，{delay:.1f}s后重试")
+        with self._rooms_lock:
+            return not self._pending_rooms
+    
+    def _open_room(self, room):
+        """在新标签页（第一个直播间使用初始窗口）中打开直播间"""
+        driver = self._driver
+        new_tab = False
+        try:
+            print(f"正在访问直播间 [{room.room_id}]...")
+            if self._rooms or self._active_room is not None:
+                driver.switch_to.new_window('tab')
+                new_tab = True
+                if self.lightweight:
+                    _apply_resource_blocking(driver)
+            else:
+                driver.switch_to.default_content()
+            room.window_handle = driver.current_window_handle
+            self._active_room = None
+            self._load_room_page(room)
+            return True
+        except Exception as e:
+            print(f"访问直播间 [{room.room_id}] 时出错: {str(e)}")
+            # 关闭打开失败的标签页，重试时重新打开
+            if new_tab:
+                try:
+                    driver.close()
+                    driver.switch_to.window(driver.window_handles[0])
+                except Exception:
+                    pass
+            room.window_handle = None
+            self._active_room = None
+            return False
+    
+    def _load_room_page(self, room):
+        """在当前标签页加载直播间页面并定位评论所在的iframe"""
+        driver = self._driver
+        room.comment_selector = None
+        driver.get(room.live_url)
+        print(f"当前页面URL: {driver.current_url}")
         
         # 等待页面加载
         print("等待页面加载...")
-        WebDriverWait(_driver, 30).until(
+        WebDriverWait(driver, 30).until(
             EC.presence_of_element_located((By.CSS_SELECTOR, "body"))
         )
         print("页面加载完成")
         
-        # 打印页面标题和源码长度，用于调试
-        print(f"页面标题: {_driver.title}")
+        # 打印页面标题，用于调试
+        print(f"页面标题: {driver.title}")
         
         print("查找iframe...")
+        room.use_iframe = False
         try:
             # 等待iframe加载
-            iframe = WebDriverWait(_driver, 10).until(
+            iframe = WebDriverWait(driver, 10).until(
                 EC.presence_of_element_located((By.TAG_NAME, "iframe"))
             )
             print("找到iframe，尝试切换...")
-            _driver.switch_to.frame(iframe)
+            driver.switch_to.frame(iframe)
+            room.use_iframe = True
             print("已切换到iframe")
             
             # 等待iframe内容加载
-            WebDriverWait(_driver, 10).until(
+            WebDriverWait(driver, 10).until(
                 EC.presence_of_element_located((By.CSS_SELECTOR, "body"))
             )
             print("iframe内容加载完成")
             
-            # 打印iframe中的元素数量，用于调试
-            elements = _driver.find_elements(By.CSS_SELECTOR, "*")
-            print(f"iframe中元素数量: {len(elements)}")
-            
             # 尝试查找评论区域
             print("尝试查找评论区域...")
-            chat_area = _driver.find_elements(By.CSS_SELECTOR, "div[class*='chatroom']")
+            chat_area = driver.find_elements(By.CSS_SELECTOR, "div[class*='chatroom']")
             if chat_area:
                 print("找到评论区域")
             else:
                 print("未找到评论区域，尝试其他选择器...")
-                chat_area = _driver.find_elements(By.CSS_SELECTOR, "div[class*='chat']")
+                chat_area = driver.find_elements(By.CSS_SELECTOR, "div[class*='chat']")
                 if chat_area:
                     print("找到可能的评论区域")
             
         except Exception as e:
             print(f"处理iframe时出错: {str(e)}")
             print("未找到iframe或切换失败，继续在当前页面查找评论...")
+            driver.switch_to.default_content()
+        
+        self._active_room = room
+    
+    def _enter_room(self, room):
+        """切换到直播间所在的标签页（及iframe）"""
+        if self._active_room is room:
+            return
+        driver = self._driver
+        driver.switch_to.window(room.window_handle)
+        self.webdriver_calls += 1
+        if room.use_iframe:
+            iframes = driver.find_elements(By.TAG_NAME, "iframe")
+            self.webdriver_calls += 1
+            if iframes:
+                driver.switch_to.frame(iframes[0])
+                self.webdriver_calls += 1
+        self._active_room = room
+    
+    def _close_room(self, room):
+        """关闭已移除直播间的标签页"""
+        with self._rooms_lock:
+            self._rooms.pop(room.room_id, None)
+        try:
+            if len(self._driver.window_handles) > 1:
+                self._driver.switch_to.window(room.window_handle)
+                self._driver.close()
+        except Exception as e:
+            print(f"关闭直播间标签页失败: {str(e)}")
+        self._active_room = None
+        print(f"已停止监控直播间 [{room.room_id}]")
+    
+    def metrics(self):
+        """返回各直播间的健康指标和浏览器重启统计"""
+        with self._rooms_lock:
+            rooms = list(self._rooms.values())
+            pending = [room.room_id for room in self._pending_rooms]
+        return {
+            "browser_restarts": self.browser_restarts,
+            "cold_start_seconds": self.cold_start_seconds,
+            "reconnect_seconds": list(self.reconnect_seconds),
+            "webdriver_calls": self.webdriver_calls,
+            "pending_rooms": pending,
+            "rooms": {room.room_id: room.supervisor.metrics() for room in rooms},
+        }
+    
+    def _request_restart(self, reason):
+        """关闭浏览器，由监控线程按退避时间重启并恢复所有直播间"""
+        print(f"需要重启浏览器: {reason}")
+        with self._rooms_lock:
+            rooms = list(self._rooms.values())
+        for room in rooms:
+            room.supervisor.begin_restart(reason)
+        self._quit_driver()
+    
+    def _restart_browser(self):
+        """
+        重新初始化浏览器并重新打开所有直播间
+        
+        Returns:
+            bool: 浏览器启动且所有直播间都已打开时返回True；部分直播间打开失败时返回False，
+                  这些直播间留在待打开列表中按退避时间重试
+        """
+        self._quit_driver()
+        print("浏览器未初始化，尝试重新初始化...")
+        start_time = time.monotonic()
+        self._driver = self._launch_browser()
+        if not self._driver:
+            return False
+        self.browser_restarts += 1
+        
+        with self._rooms_lock:
+            rooms = list(self._rooms.values())
+            self._rooms.clear()
+            self._pending_rooms = rooms + self._pending_rooms
+        for room in rooms:
+            room.next_poll = 0
+            room.next_health_check = 0
+        if not self._open_pending_rooms():
+            with self._rooms_lock:
+                failed = [room.room_id for room in self._pending_rooms]
+            print(f"浏览器已重启，但有直播间未能打开: {', '.join(failed)}")
+            return False
+        
+        elapsed = time.monotonic() - start_time
+        self.reconnect_seconds.append(elapsed)
+        print(f"浏览器恢复耗时: {elapsed:.1f}s（第{len(self.reconnect_seconds)}次）")
+        return True
+    
+    def _run(self):
+        """监控线程函数：每次选出最早到期的直播间进行轮询"""
+        while not self._stop_event.is_set():
+            try:
+                if not self._driver:
+                    if self._restart_browser():
+                        self._browser_backoff.reset()
+                    elif not self._driver:
+                        delay = self._browser_backoff.next_delay()
+                        print(f"浏览器初始化失败，{delay:.1f}s后重试...")
+                        self._stop_event.wait(delay)
+                    # 浏览器已启动但部分直播间未能打开时不重置退避时间，这些直播间在下面按各自的退避时间重试
+                    continue
+                
+                if self._pending_rooms and self._open_pending_rooms():
+                    self._browser_backoff.reset()
+                
+                with self._rooms_lock:
+                    rooms = list(self._rooms.values())
+                if not rooms:
+                    self._stop_event.wait(0.5)
+                    continue
+                
+                room = min(rooms, key=lambda r: r.next_poll)
+                if room.callback is None:
+                    self._close_room(room)
+                    continue
+                
+                delay = room.next_poll - time.monotonic()
+                if delay > 0:
+                    # 等待期间可能新增直播间，最多等待0.5秒后重新选择
+                    if self._stop_event.wait(min(delay, 0.5)):
+                        break
+                    if delay > 0.5:
+                        continue
+                
+                self._poll_room(room)
+                
+            except Exception as e:
+                print(f"监控评论时出错: {str(e)}")
+                if _is_session_lost(e):
+                    self._request_restart("浏览器会话已失效")
+                else:
+                    self._stop_event.wait(self._browser_backoff.next_delay())
+    
+    def _poll_room(self, room):
+        """对一个直播间进行一次健康检查（如到期）和评论抓取"""
+        try:
+            self._enter_room(room)
+            
+            # 页面健康检查按独立的较慢计时器运行，不在每次轮询时执行
+            if time.monotonic() >= room.next_health_check:
+                problem = self._check_room_health(room)
+                if problem:
+                    self._handle_room_failure(room, *problem)
+                    return
+        except Exception as e:
+            print(f"检查页面状态时出错: {str(e)}")
+            self._handle_room_failure(room, "检查页面状态出错", error=e)
+            return
+        
+        current_time = time.time()
+        print_due = current_time - room.last_print_time >= self.print_interval
+        if print_due:
+            room.last_print_time = current_time
+            health = room.supervisor.metrics()
+            print(f"正在监控评论 [{room.room_id}]... 轮询间隔{room.poll_interval.interval:.2f}s，"
+                  f"评论速率{room.poll_interval.rate:.2f}条/秒，轮询{room.poll_count}次，"
+                  f"WebDriver调用{self.webdriver_calls}次，状态{health['state']}，"
+                  f"刷新{health['reloads']}次，重启{health['restarts']}次，评论中断累计{health['comment_gap_seconds']}s")
+        
+        # 首次健康检查通过后打印一次页面结构信息，用于调试选择器
+        if not room.structure_logged:
+            room.structure_logged = True
+            self._log_page_structure()
+        
+        new_count = 0
+        try:
+            room.poll_count += 1
+            self.webdriver_calls += 1
+            comments = self._driver.execute_script(
+                _EXTRACT_COMMENTS_JS, room.comment_selector, COMMENT_SELECTORS
+            )
+            captured = time.monotonic()
+            
+            if comments['selector'] != room.comment_selector:
+                room.comment_selector = comments['selector']
+                if room.comment_selector:
+                    print(f"评论选择器 [{room.room_id}]: {room.comment_selector}")
             
-            # 打印当前页面中的元素数量，用于调试
-            elements = _driver.find_elements(By.CSS_SELECTOR, "*")
-            print(f"当前页面元素数量: {len(elements)}")
+            # 打印调试信息
+            if print_due:
+                print("\n调试信息:")
+                for info in comments['debugInfo']:
+                    print(info)
+                print(f"页面共 {comments['total']} 条评论，本次检查 {comments['scanned']} 个节点，"
+                      f"新评论 {len(comments['comments'])} 条\n")
             
+            for comment_text in comments['comments']:
+                if comment_text not in room.seen_comments:
+                    room.seen_comments.add(comment_text)
+                    new_count += 1
+                    print(f"发现新评论 [{room.room_id}]: {comment_text}")
+                    self._dispatch(room, comment_text, captured)
+                    
+        except Exception as e:
+            print(f"获取评论时出错: {str(e)}")
+            self._handle_room_failure(room, "获取评论出错", error=e)
+            return
+        
+        room.supervisor.record_success()
+        # 按评论速率自适应调整检查频率
+        room.next_poll = time.monotonic() + room.poll_interval.update(new_count)
+    
+    def _handle_room_failure(self, room, reason, force_reload=False, error=None):
+        """
+        按状态机处理直播间的一次失败：退避重试、刷新页面或重启浏览器
+        
+        Args:
+            room (_Room): 出错的直播间
+            reason (str): 失败原因
+            force_reload (bool): 是否立即刷新页面（如页面显示服务器错误）
+            error (Exception, optional): 引发失败的异常
+        """
+        if error is not None and _is_session_lost(error):
+            self._request_restart("浏览器会话已失效")
+            return
+        
+        # 下次轮询前先做一次页面健康检查
+        room.next_health_check = 0
+        action = room.supervisor.record_failure(reason)
+        if force_reload or action == STATE_RELOADING:
+            if not room.supervisor.begin_reload(reason):
+                self._request_restart(f"直播间 [{room.room_id}] 连续刷新{self.max_retries}次仍未恢复")
+                return
+            if not self._reload_room(room):
+                self._request_restart(f"直播间 [{room.room_id}] 页面无法重新加载")
+                return
+        
+        room.next_poll = time.monotonic() + room.supervisor.next_delay()
+    
+    def _dispatch(self, room, comment_text, captured):
+        """解析一条新评论，录制并回调到直播间的回调函数"""
+        try:
+            # 单次解析评论或礼物
+            kind, username, content = classify_comment(comment_text)
+            if self._recorder:
+                self._recorder.record(comment_text, kind, username, content, room=room.room_id)
+            if kind == KIND_COMMENT:
+                print(f"解析评论成功 [{room.room_id}]: {username}: {content}")
+            elif kind == KIND_GIFT:
+                print(f"解析礼物成功 [{room.room_id}]: {username} 送出了 {content}")
+            if kind and room.callback and self._executor:
+                # 使用线程池执行回调
+                event = ChatEvent(username, content, kind, room=room.room_id, captured=captured)
+                self._executor.submit(_safe_callback, room.callback, event)
+        except Exception as e:
+            print(f"处理评论时出错: {str(e)}")
+    
+    def _check_room_health(self, room):
+        """
+        检查直播间页面状态
+        
+        Returns:
+            tuple: 页面正常时返回None，否则返回(失败原因, 是否需要立即刷新页面)
+        """
+        driver = self._driver
+        self.webdriver_calls += 2
+        # 检查页面状态
+        page_state = driver.execute_script("return document.readyState")
+        if page_state != "complete":
+            print(f"页面未完全加载 [{room.room_id}] (状态: {page_state})，等待加载完成...")
+            return f"页面未完全加载({page_state})", False
+        
+        # 检查是否存在服务器错误提示
+        error_elements = driver.find_elements(By.XPATH, _SERVER_ERROR_XPATH)
+        if error_elements:
+            print(f"检测到服务器错误 [{room.room_id}]，尝试刷新页面...")
+            return "页面显示服务器错误", True
+        
+        room.next_health_check = time.monotonic() + self.health_check_interval
+        return None
+    
+    def _reload_room(self, room):
+        """
+        刷新直播间页面，失败时重新访问
+        
+        Returns:
+            bool: 是否成功重新加载
+        """
+        driver = self._driver
+        self._active_room = None
+        room.comment_selector = None
+        try:
+            # refresh会等待页面加载完成，之后由健康检查确认状态
+            driver.refresh()
+            self._enter_room(room)
+            return True
+        except Exception as e:
+            print(f"刷新页面失败: {str(e)}")
+            if _is_session_lost(e):
+                return False
+        
+        # 如果刷新失败，尝试重新访问
+        try:
+            self._load_room_page(room)
+            return True
+        except Exception as e:
+            print(f"重新访问直播间失败: {str(e)}")
+            return False
+    
+    def _log_page_structure(self):
+        """打印可能的评论容器，用于调试选择器"""
+        try:
+            # 尝试多个可能的选择器来定位评论容器
+            selectors = [
+                "div[class*='webcast-chatroom']",
+                "div[class*='chatroom']",
+                "div[class*='chat-list']",
+                "div[class*='message-list']",
+                "div[class*='comment-list']"
+            ]
+            
+            for selector in selectors:
+                self.webdriver_calls += 1
+                elements = self._driver.find_elements(By.CSS_SELECTOR, selector)
+                if elements:
+                    print(f"找到评论容器，使用选择器: {selector}")
+                    print(f"容器数量: {len(elements)}")
+                    for i, elem in enumerate(elements):
+                        print(f"容器 {i+1} 内容: {elem.text[:100]}...")
+                    break
+        except Exception as e:
+            print(f"检查页面结构时出错: {str(e)}")
+
+def _safe_callback(callback, event):
+    """执行评论回调并打印异常，避免异常被线程池吞掉"""
+    try:
+        callback(event)
     except Exception as e:
-        print(f"访问直播间时出错: {str(e)}")
-        return False
+        print(f"评论回调出错: {str(e)}")
+
+def start_comment_monitoring(live_url, callback_function, record_path=None):
+    """
+    启动评论监控线程（单直播间）
     
-    # 创建并启动新的监控线程
-    _monitoring_thread = threading.Thread(
-        target=_monitor_comments,
-        daemon=True
-    )
-    _monitoring_thread.start()
+    Args:
+        live_url (str): 抖音直播间URL
+        callback_function (callable): 回调函数 callback(event)，event为ChatEvent
+        record_path (str, optional): 评论录制文件路径，指定后将抓取到的每条消息追加写入该文件
+    """
+    global _default_monitor
     
-    # 验证线程是否成功启动
-    if _monitoring_thread.is_alive():
-        print(f"评论监控线程已成功启动，监控直播间: {live_url}")
-        return True
-    else:
-        print("评论监控线程启动失败")
+    print("开始初始化评论监控...")
+    
+    # 如果已经有监控线程在运行，先停止它
+    if _default_monitor and _default_monitor.is_running():
+        print("发现已有监控线程在运行，先停止它...")
+        stop_comment_monitoring()
+    
+    _default_monitor = CommentMonitor(record_path=record_path)
+    _default_monitor.add_room(live_url, callback_function)
+    if not _default_monitor.start():
+        _default_monitor.stop()
+        _default_monitor = None
         return False
+    return True
 
 def stop_comment_monitoring():
     """停止评论监控线程"""
-    global _monitoring_thread, _stop_monitoring, _driver
+    global _default_monitor
     
-    if not _monitoring_thread or not _monitoring_thread.is_alive():
+    if not _default_monitor:
         print("没有正在运行的评论监控线程")
         return False
     
-    print("正在停止评论监控...")
-    _stop_monitoring = True
-    
-    # 确保浏览器已关闭
-    if _driver:
-        try:
-            _driver.quit()
-            _driver = None
-        except:
-            pass
-    
-    print("评论监控已停止")
+    _default_monitor.stop()
+    _default_monitor = None
     return True
 
 if __name__ == "__main__":
-    print("此模块不应直接运行，请通过main.py启动程序") 
\ No newline at end of file
+    print("此模块不应直接运行，请通过main.py启动程序")
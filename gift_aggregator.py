@@ -0,0 +1,206 @@
+"""
+礼物聚合模块
+礼物连击时页面会逐条显示每次送礼，逐条感谢会挤满千问和语音合成的处理队列。
+聚合器按(观众, 礼物)累计一个时间窗口内的礼物数量并识别连击，
+窗口结束时每位观众只发出一条合并后的感谢事件
+
+窗口从观众的第一份礼物开始：超过window秒没有新礼物，或距第一份礼物超过flush_deadline秒时发出
+"""
+
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from chat_event import ChatEvent, KIND_GIFT
+
+# 礼物数量后缀，如"小心心 x3"、"玫瑰×10"、"抖音1号*2"
+_QUANTITY_PATTERN = re.compile(r'^(?P<name>.+?)\s*[xX×*]\s*(?P<count>\d+)$')
+
+def parse_gift_quantity(gift_text):
+    """
+    拆分礼物名称和数量
+    
+    Returns:
+        tuple: (礼物名称, 数量)，没有数量后缀时数量为1
+    """
+    text = gift_text.strip()
+    match = _QUANTITY_PATTERN.match(text)
+    if match:
+        return match.group('name').strip(), int(match.group('count'))
+    return text, 1
+
+class _GiftTally:
+    """一位观众一种礼物在窗口内的累计"""
+    
+    def __init__(self):
+        self.completed = 0  # 已结束的连击累计数量
+        self.combo = 0  # 当前连击显示的数量
+        self.events = 0  # 收到的礼物消息数
+        self.combo_hits = 0  # 连击中数量递增的次数
+    
+    def add(self, count):
+        # 连击时页面显示的是累计数量（x1、x2、x3...），数量递增视为同一次连击
+        if count > self.combo:
+            if self.combo:
+                self.combo_hits += 1
+            self.combo = count
+        else:
+            self.completed += self.combo
+            self.combo = count
+        self.events += 1
+    
+    @property
+    def total(self):
+        return self.completed + self.combo
+
+class _ViewerWindow:
+    """一位观众的聚合窗口"""
+    
+    def __init__(self, now, first_event):
+        self.opened = now
+        self.last_gift = now
+        self.room = first_event.room
+        self.captured = first_event.captured  # 合并事件沿用第一份礼物的抓取时间
+        self.tallies = OrderedDict()  # 礼物名称 -> _GiftTally，保持送礼顺序
+
+class GiftAggregator:
+    """线程安全的礼物聚合器，后台线程按截止时间发出合并后的事件"""
+    
+    def __init__(self, emit, window=3.0, flush_deadline=10.0):
+        """
+        Args:
+            emit (callable): 发出合并事件的回调 emit(event)，event为ChatEvent，
+                             text形如"小心心×10、玫瑰×2"，gift_count为礼物总数
+            window (float): 观众超过多少秒没有送出新礼物后发出合并事件
+            flush_deadline (float): 从第一份礼物开始最多等待多少秒就发出合并事件
+        """
+        self._emit = emit
+        self.window = window
+        self.flush_deadline = flush_deadline
+        self._windows = OrderedDict()  # 观众 -> _ViewerWindow，按打开时间排序
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = None
+        # 计数器: received（收到的礼物消息）/merged（被合并的消息）/emitted（发出的事件）/combos（识别到的连击）
+        self.counters = Counter()
+    
+    def __len__(self):
+        with self._condition:
+            return len(self._windows)
+    
+    def add(self, event, now=None):
+        """记录一条礼物消息"""
+        now = time.monotonic() if now is None else now
+        username = event.user
+        name, count = parse_gift_quantity(event.text)
+        with self._condition:
+            if self._closed:
+                return
+            self._ensure_thread()
+            window = self._windows.get(username)
+            if window is None:
+                window = _ViewerWindow(now, event)
+                self._windows[username] = window
+                self._condition.notify()
+            else:
+                self.counters["merged"] += 1
+            window.last_gift = now
+            tally = window.tallies.get(name)
+            if tally is None:
+                tally = window.tallies[name] = _GiftTally()
+            tally.add(count)
+            self.counters["received"] += 1
+    
+    def _deadline(self, window):
+        """窗口的发出时间"""
+        return min(window.last_gift + self.window, window.opened + self.flush_deadline)
+    
+    def _take_due(self, now, force=False):
+        """
+        取出所有到期的窗口并生成合并内容，调用时需持有锁
+        
+        Returns:
+            list: [ChatEvent, ...]
+        """
+        due = []
+        for username, window in list(self._windows.items()):
+            if not force and self._deadline(window) > now:
+                continue
+            del self._windows[username]
+            parts = []
+            gift_count = 0
+            for name, tally in window.tallies.items():
+                parts.append(f"{name}×{tally.total}")
+                gift_count += tally.total
+                if tally.combo_hits:
+                    self.counters["combos"] += 1
+            self.counters["emitted"] += 1
+            due.append(ChatEvent(username, "、".join(parts), KIND_GIFT, room=window.room,
+                                 gift_count=gift_count, captured=window.captured))
+        return due
+    
+    def _emit_windows(self, due):
+        """发出合并事件，在锁外调用以免回调阻塞新礼物的记录"""
+        for event in due:
+            try:
+                self._emit(event)
+            except Exception as e:
+                print(f"发出礼物事件时出错: {str(e)}")
+    
+    def flush(self, now=None, force=False):
+        """
+        立即发出到期的窗口
+        
+        Args:
+            now (float, optional): 当前时间，默认time.monotonic()
+            force (bool): 是否发出所有窗口，不论是否到期
+        """
+        now = time.monotonic() if now is None else now
+        with self._condition:
+            due = self._take_due(now, force)
+        self._emit_windows(due)
+    
+    def _ensure_thread(self):
+        """第一次收到礼物时启动后台线程，调用时需持有锁"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="gift-aggregator")
+            self._thread.daemon = True
+            self._thread.start()
+    
+    def _run(self):
+        """后台线程：等待最早的截止时间并发出到期的窗口"""
+        while True:
+            with self._condition:
+                if self._closed:
+                    return
+                now = time.monotonic()
+                due = self._take_due(now)
+                if not due:
+                    timeout = None
+                    if self._windows:
+                        timeout = max(0.0, min(self._deadline(w) for w in self._windows.values()) - now)
+                    self._condition.wait(timeout)
+                    continue
+            self._emit_windows(due)
+    
+    def stats(self):
+        """返回计数器快照"""
+        with self._condition:
+            stats = dict(self.counters)
+            stats["pending"] = len(self._windows)
+            return stats
+    
+    def close(self):
+        """停止后台线程，并发出所有未到期的窗口"""
+        with self._condition:
+            self._closed = True
+            due = self._take_due(0, force=True)
+            self._condition.notify()
+        thread = self._thread
+        if thread:
+            thread.join(timeout=2)
+        self._emit_windows(due)
+
+if __name__ == "__main__":
+    print("此模块不应直接运行，请通过main.py启动程序")
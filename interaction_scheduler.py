@@ -0,0 +1,292 @@
+"""
+互动优先级调度模块
+用优先队列替代扁平的评论缓存列表：按互动类型（礼物 > 提问 > 欢迎 > 评论）、
+等待时间和观众排序，支持哈希去重、按类型限流和显式的丢弃策略。
+传入观众索引（viewer_index.ViewerIndex）时，还会跳过重复的欢迎、优先回复老观众和送礼观众、限制刷屏观众
+"""
+
+import heapq
+import re
+import threading
+import time
+from collections import Counter
+
+# 互动类型，数值越小优先级越高
+CLASS_GIFT = "礼物"
+CLASS_QUESTION = "提问"
+CLASS_COMMENT = "评论"
+CLASS_GREETING = "欢迎"
+
+CLASS_PRIORITY = {
+    CLASS_GIFT: 0,
+    CLASS_QUESTION: 1,
+    CLASS_GREETING: 2,
+    CLASS_COMMENT: 3,
+}
+
+# 各类型互动的最长等待时间（秒），超时后不再回复
+DEFAULT_MAX_AGE = {
+    CLASS_GIFT: 300,
+    CLASS_QUESTION: 120,
+    CLASS_COMMENT: 60,
+    CLASS_GREETING: 30,
+}
+
+# 各类型互动的限流参数 (每秒令牌数, 桶容量)，未列出的类型不限流
+DEFAULT_RATE_LIMITS = {
+    CLASS_COMMENT: (0.5, 5),
+    CLASS_GREETING: (0.2, 3),
+}
+
+_QUESTION_PATTERN = re.compile(r'[?？]|[吗呢么嘛]$|什么|怎么|为什么|为啥|几|多少|哪|谁|是不是|能不能|有没有')
+_GREETINGS = {"来了", "你好", "主播好", "大家好", "晚上好", "早上好", "下午好", "hello", "hi"}
+
+def classify_interaction(content, kind):
+    """
+    判断互动类型
+    
+    Args:
+        content (str): 评论内容或礼物名称
+        kind (str): 评论监控给出的消息类型（"评论"或"礼物"）
+        
+    Returns:
+        str: 互动类型
+    """
+    if kind == "礼物":
+        return CLASS_GIFT
+    text = content.strip().lower()
+    if text in _GREETINGS:
+        return CLASS_GREETING
+    if _QUESTION_PATTERN.search(text):
+        return CLASS_QUESTION
+    return CLASS_COMMENT
+
+class TokenBucket:
+    """令牌桶限流器"""
+    
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+    
+    def consume(self, now=None):
+        """尝试消耗一个令牌，成功返回True"""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+class InteractionScheduler:
+    """线程安全的互动优先队列"""
+    
+    def __init__(self, max_size=200, max_age=None, rate_limits=None, viewers=None):
+        """
+        Args:
+            max_size (int): 队列容量，超出时丢弃优先级最低的互动
+            max_age (dict, optional): 各类型最长等待时间，默认DEFAULT_MAX_AGE
+            rate_limits (dict, optional): 各类型限流参数，默认DEFAULT_RATE_LIMITS
+            viewers (ViewerIndex, optional): 观众索引，入队时记录观众活跃度并据此调整优先级
+        """
+        self.max_size = max_size
+        self.viewers = viewers
+        self.max_age = DEFAULT_MAX_AGE if max_age is None else max_age
+        limits = DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits
+        self._buckets = {name: TokenBucket(rate, capacity) for name, (rate, capacity) in limits.items()}
+        # 堆中的条目: [优先级, 该观众已排队数, 入队时间, 序号, 去重键, 事件]
+        # 被淘汰或已出队的条目将互动置为None，出队时跳过
+        self._heap = []
+        # 按优先级反向排序的堆，堆顶是优先级最低的条目，队列满时用于淘汰: (反向排序键, 条目)
+        self._worst = []
+        self._entries = {}
+        self._pending_by_viewer = Counter()
+        self._sequence = 0
+        # 最近一次出队的互动的入队时间，用于合并同一时间窗口内的相似评论
+        self.last_enqueue_time = None
+        self._lock = threading.Lock()
+        # 计数器: enqueued/dispatched/duplicate/rate_limited/overflow/expired/welcomed/throttled，以及按类型的丢弃数
+        self.counters = Counter()
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+    
+    def push(self, event):
+        """
+        添加一条互动，入队成功时设置事件的互动类型和入队时间
+        
+        Args:
+            event (ChatEvent): 评论或礼物事件
+            
+        Returns:
+            bool: 是否成功入队（重复、被限流或被丢弃时返回False）
+        """
+        username = event.user
+        key = (username, event.text)
+        interaction_class = classify_interaction(event.text, event.kind)
+        now = time.monotonic()
+        viewers = self.viewers
+        
+        with self._lock:
+            # 先做不改变状态的检查，被丢弃的互动不消耗类型和观众的限流额度，也不计入观众活跃度
+            if key in self._entries:
+                self.counters["duplicate"] += 1
+                return False
+            if viewers is not None and interaction_class == CLASS_GREETING and not viewers.should_welcome(username):
+                # 冷却时间内已经欢迎过该观众
+                self._count_drop("welcomed", interaction_class)
+                return False
+            
+            bonus = viewers.priority_bonus(username) if viewers is not None else 0.0
+            entry = [
+                CLASS_PRIORITY[interaction_class] - bonus,
+                self._pending_by_viewer[username],
+                now,
+                self._sequence,
+                key,
+                event,
+            ]
+            worst = None
+            if len(self._entries) >= self.max_size:
+                # 队列已满：新互动本身优先级最低时直接丢弃，否则入队时淘汰优先级最低的互动
+                while self._worst[0][-1][-1] is None:
+                    heapq.heappop(self._worst)
+                worst = self._worst[0][-1]
+                if entry[:4] >= worst[:4]:
+                    self._count_drop("overflow", interaction_class)
+                    return False
+            
+            bucket = self._buckets.get(interaction_class)
+            if bucket and not bucket.consume(now):
+                self._count_drop("rate_limited", interaction_class)
+                return False
+            if (viewers is not None and interaction_class in (CLASS_COMMENT, CLASS_QUESTION)
+                    and not viewers.allow_chat(username, now)):
+                self._count_drop("throttled", interaction_class)
+                return False
+            
+            if worst is not None:
+                heapq.heappop(self._worst)
+                self._count_drop("overflow", worst[-1].category)
+                self._remove(worst)
+            self._sequence += 1
+            if viewers is not None:
+                if interaction_class == CLASS_GIFT:
+                    viewers.record_gift(username, event.gift_count)
+                else:
+                    viewers.record_comment(username)
+            
+            event.category = interaction_class
+            event.enqueued = now
+            heapq.heappush(self._heap, entry)
+            heapq.heappush(self._worst, ((-entry[0], -entry[1], -entry[2], -entry[3]), entry))
+            self._entries[key] = entry
+            self._pending_by_viewer[username] += 1
+            self.counters["enqueued"] += 1
+            self._compact()
+            return True
+    
+    def pop(self):
+        """
+        取出优先级最高且未过期的互动
+        
+        Returns:
+            ChatEvent: 队列为空时返回None
+        """
+        now = time.monotonic()
+        with self._lock:
+            while self._heap:
+                entry = heapq.heappop(self._heap)
+                event = entry[-1]
+                if event is None:
+                    continue
+                self._forget(entry)
+                
+                interaction_class = event.category
+                max_age = self.max_age.get(interaction_class)
+                if max_age is not None and now - entry[2] > max_age:
+                    self._count_drop("expired", interaction_class)
+                    continue
+                
+                self.counters["dispatched"] += 1
+                self.last_enqueue_time = entry[2]
+                if interaction_class == CLASS_GREETING and self.viewers is not None:
+                    self.viewers.record_welcome(event.user)
+                return event
+            return None
+    
+    def take_matching(self, predicate, within=None, limit=None):
+        """
+        取出所有满足条件的待处理互动，用于合并相似评论
+        
+        Args:
+            predicate (callable): predicate(event)，返回True表示取出
+            within (float, optional): 只考虑与最近一次出队的互动入队时间相差within秒以内的互动
+            limit (int, optional): 最多取出的数量，按入队顺序优先
+            
+        Returns:
+            list: [ChatEvent, ...]，按入队时间排序
+        """
+        with self._lock:
+            anchor = self.last_enqueue_time
+            matched = [
+                entry for entry in self._entries.values()
+                if (within is None or anchor is None or abs(entry[2] - anchor) <= within)
+                and predicate(entry[-1])
+            ]
+            matched.sort(key=lambda entry: entry[2])
+            if limit is not None:
+                matched = matched[:limit]
+            
+            taken = []
+            for entry in matched:
+                taken.append(entry[-1])
+                self._remove(entry)
+            self.counters["coalesced"] += len(taken)
+            return taken
+    
+    def clear(self):
+        """清空队列"""
+        with self._lock:
+            self._heap.clear()
+            self._worst.clear()
+            self._entries.clear()
+            self._pending_by_viewer.clear()
+    
+    def stats(self):
+        """返回计数器快照"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats["pending"] = len(self._entries)
+            return stats
+    
+    def _remove(self, entry):
+        """标记淘汰堆中的条目"""
+        self._forget(entry)
+        self._compact()
+    
+    def _compact(self):
+        """被标记的条目过多时重建堆"""
+        if len(self._heap) > 2 * len(self._entries) + 16:
+            self._heap = [e for e in self._heap if e[-1] is not None]
+            heapq.heapify(self._heap)
+        if len(self._worst) > 2 * len(self._entries) + 16:
+            self._worst = [item for item in self._worst if item[-1][-1] is not None]
+            heapq.heapify(self._worst)
+    
+    def _forget(self, entry):
+        """从去重表和观众计数中移除条目，并标记条目已失效"""
+        entry[-1] = None
+        del self._entries[entry[4]]
+        username = entry[4][0]
+        self._pending_by_viewer[username] -= 1
+        if self._pending_by_viewer[username] <= 0:
+            del self._pending_by_viewer[username]
+    
+    def _count_drop(self, reason, interaction_class):
+        """记录丢弃原因"""
+        self.counters[reason] += 1
+        self.counters[f"dropped_{interaction_class}"] += 1
@@ -10,10 +10,23 @@ import sounddevice as sd
 import soundfile as sf
 import pygame
 import queue
+from collections import Counter
 import importlib
 import numpy as np
-from getusercomment import start_comment_monitoring, stop_comment_monitoring
-from getResponseFromQianwen import process_live_comment
+import getusercomment
+import comment_ingest
+from getResponseFromQianwen import (async_process_live_comment, async_process_comment_batch, close_async_client,
+                                   lookup_cached_reply, cache_reply, cache_reply_audio, is_fallback_reply,
+                                   REPLY_CACHE, REPLY_GENERATOR, REPLY_PROMPTS, PROMPT_TOKENS)
+from interaction_scheduler import InteractionScheduler, CLASS_GREETING
+from prompt_templates import prompt_types
+from viewer_index import ViewerIndex
+from viewer_context import ViewerContextManager
+from gift_aggregator import GiftAggregator, parse_gift_quantity
+from chat_event import StageLatencyTracker, KIND_GIFT
+from speculative_audio import SpeculativeAudio, pcm_to_wav
+from streaming_reply import ReplyTimings, ReplyLatencyStats, stream_reply
+from comment_coalescer import CommentCoalescer, format_usernames
 from dotenv import load_dotenv
 import struct
 from spotify_api import SpotifyAPI
@@ -26,9 +39,21 @@ import requests
 # 缓存文件路径
 CACHE_PATH = ".spotify_cache"
 
+# 欢迎语，观众名插在前后两段之间
+WELCOME_PREFIX = "欢迎"
+WELCOME_SUFFIX = "来到直播间，天天开心喔"
+
+# 预合成感谢语音的礼物，可通过SPECULATIVE_GIFTS（逗号分隔）修改；其他礼物收到GIFT_TEMPLATE_MIN_COUNT次后也会预合成
+DEFAULT_SPECULATIVE_GIFTS = "小心心,玫瑰,人气票,抖音1号"
+GIFT_TEMPLATE_MIN_COUNT = 3
+
 # https://live.douyin.com/769032284842
 class StoryPlayer:
-    def __init__(self):
+    def __init__(self, offline=False):
+        """
+        Args:
+            offline (bool): 离线模式，不初始化pygame混音器和Spotify，用于回放压测
+        """
         # 强制重新加载环境变量
         load_dotenv(override=True)
         
@@ -36,26 +61,65 @@ class StoryPlayer:
         self.use_pygame = False  # 设置为 False 使用虚拟声卡播放
         self.virtual_output_device_id = 17  # CABLE Input (VB-Audio Virtual Cable)
         
+        self.offline = offline
+        
         # 初始化 pygame 混音器
-        pygame.mixer.init()
+        if not offline:
+            pygame.mixer.init()
         
-        # 创建事件和锁
+        # 创建事件和锁；互动处理在事件循环中进行，持锁期间会await，使用asyncio.Lock
         self.song_completed = threading.Event()
         self.song_completed.set()
-        self.interaction_lock = threading.Lock()
-        self.comment_cache_lock = threading.Lock()
+        self.interaction_lock = asyncio.Lock()
         
         # 状态变量
         self.is_processing_interaction = False
         self.global_token = None
-        self.comment_cache = []
+        # 评论缓存：按礼物 > 提问 > 欢迎 > 评论排序的优先队列，自带去重和限流
+        # 观众活跃度索引，定期保存到VIEWER_INDEX_PATH（默认viewers.json），离线模式只保存在内存中
+        self.viewers = ViewerIndex(None if offline else os.getenv('VIEWER_INDEX_PATH', 'viewers.json'))
+        self.comment_cache = InteractionScheduler(viewers=self.viewers)
+        # 每位观众最近几轮问答和滚动摘要，按token预算限制长度，让追问能接上之前的对话；
+        # 超出轮数时一次折叠到只剩1轮，两次折叠之间请求开头不变，可以命中千问的上下文缓存
+        self.viewer_context = ViewerContextManager(fold_to=1)
+        # 礼物聚合器：合并同一观众连续送出的礼物，每个窗口只感谢一次
+        self.gift_aggregator = GiftAggregator(self._enqueue_interaction)
+        # 每轮最多连续处理的互动数，处理完后让出时间给音乐播放
+        self.max_interactions_per_round = 3
+        # 相似评论合并器，合并后只调用一次千问和语音合成
+        self.coalescer = CommentCoalescer()
+        # 互动各阶段（抓取->入队->开始处理->回复完毕）的延迟统计
+        self.stage_latency = StageLatencyTracker()
+        # 流式回复：千问边生成边按短句送入流式语音合成，第一句合成好就开始播放，通过STREAMING_REPLY=1开启
+        self.streaming_replies = os.getenv('STREAMING_REPLY', '').lower() in ('1', 'true', 'yes')
+        self.reply_latency = ReplyLatencyStats()
+        # 批量生成：一轮中需要千问生成的评论最多LLM_BATCH_SIZE条打包成一次请求，默认1（不打包）
+        self.llm_batch_size = max(1, int(os.getenv('LLM_BATCH_SIZE', '1')))
+        self.batch_counters = Counter()
+        # 预合成语音：欢迎和常见礼物感谢的固定部分在空闲时提前合成，播报时只合成观众名再拼接，
+        # 下一首歌的歌曲信息也在空闲时提前合成，通过SPECULATIVE_AUDIO=0关闭
+        self.speculative = None
+        self.gift_name_counts = Counter()
+        if os.getenv('SPECULATIVE_AUDIO', '1').lower() not in ('0', 'false', 'no'):
+            self.speculative = SpeculativeAudio(self._synthesize_pcm, idle=self._is_idle)
+            self.speculative.add_template("welcome", WELCOME_PREFIX, WELCOME_SUFFIX)
+            for gift in os.getenv('SPECULATIVE_GIFTS', DEFAULT_SPECULATIVE_GIFTS).split(','):
+                if gift.strip():
+                    self._add_gift_template(gift.strip())
+            # 千问出错或超时时的兜底回复也提前合成
+            self.speculative.prefetch_phrases(REPLY_GENERATOR.fallbacks.replies)
+        self.comment_source = None  # 评论来源模块（getusercomment或comment_ingest），启动监控后设置
         self.current_song_index = None
+        # 主事件循环，评论回调在其他线程中通过它提交协程
+        self.loop = None
         
-        # 初始化Spotify API
-        self.spotify_api = SpotifyAPI()
-        
-        # 初始化Spotify播放器
-        self.sp = self._init_spotify()
+        # 初始化Spotify API和播放器
+        if offline:
+            self.spotify_api = None
+            self.sp = None
+        else:
+            self.spotify_api = SpotifyAPI()
+            self.sp = self._init_spotify()
         
         # 加载歌曲信息
         self.songs_info = self._load_songs_info()
@@ -207,8 +271,9 @@ class StoryPlayer:
                 sentences.append(sentence)
         return sentences
     
-    def comment_handler(self, username, comment_text, comment_type="评论"):
-        """处理直播间评论的回调函数"""
+    def comment_handler(self, event):
+        """处理直播间评论的回调函数，event为ChatEvent"""
+        comment_text = event.text
         # 过滤特定的表情评论
         filtered_comments = ["小表情", "会员表情"]
         if comment_text in filtered_comments:
@@ -220,33 +285,56 @@ class StoryPlayer:
             song_name = comment_text.split("想听", 1)[1].strip()
             if song_name:
                 # 创建异步任务来搜索和播放歌曲
-                asyncio.create_task(self.search_and_play_song(song_name))
+                self._schedule_coroutine(self.search_and_play_song(song_name))
             return
+        
+        # 礼物先进入聚合窗口，窗口结束后再合并为一条感谢入队
+        if event.kind == "礼物":
+            self._speculate_gift(event)
+            self.gift_aggregator.add(event)
+            return
+        
+        self._enqueue_interaction(event)
+    
+    def _enqueue_interaction(self, event):
+        """将互动添加到缓存队列，并在当前句子播放完成后处理"""
+        # 将评论添加到缓存队列（重复、被限流或队列已满时不会入队）
+        if self.comment_cache.push(event):
+            print(f"缓存评论: {event.user}: {event.text}")
+            # 欢迎一入队就开始合成观众名，轮到播报时只需拼接
+            if event.text == "来了" and self.speculative:
+                self.speculative.prefetch_name(event.user)
             
-        # 将评论添加到缓存队列
-        with self.comment_cache_lock:
-            # 检查是否已存在相同的评论
-            if not any(c[0] == username and c[1] == comment_text for c in self.comment_cache):
-                self.comment_cache.append((username, comment_text, comment_type))
-                print(f"缓存评论: {username}: {comment_text}")
-                
-                # 设置暂停事件，但等待当前句子播放完成
-                if not self.song_completed.is_set():
-                    print("等待当前句子播放完成...")
-                    self.song_completed.set()
-                else:
-                    # 如果当前句子已经播放完成，立即处理评论
-                    print(f"当前句子已播放完成，立即处理评论: {username}: {comment_text}")
-                    self.song_completed.set()
-                    asyncio.create_task(self.process_comment_cache())
+            # 设置暂停事件，但等待当前句子播放完成
+            if not self.song_completed.is_set():
+                print("等待当前句子播放完成...")
+                self.song_completed.set()
+            else:
+                # 如果当前句子已经播放完成，立即处理评论
+                print(f"当前句子已播放完成，立即处理评论: {event.user}: {event.text}")
+                self.song_completed.set()
+                self._schedule_coroutine(self.process_comment_cache())
+    
+    def _schedule_coroutine(self, coro):
+        """将协程提交到主事件循环，评论回调运行在监控线程中，不能直接create_task"""
+        if self.loop is None or self.loop.is_closed():
+            coro.close()
+            return
+        asyncio.run_coroutine_threadsafe(coro, self.loop)
     
     async def _announce_welcome(self, username):
         """播报欢迎信息"""
         try:
+            # 优先使用预合成的欢迎语拼接观众名
+            audio_data = await self._render_speculative("welcome", username)
+            if audio_data:
+                await self.play_audio(audio_data)
+                return
+            
             # 获取token，如果全局token不可用则重新获取
             token = self.global_token
             if not token:
-                token = get_token()
+                token = await asyncio.to_thread(get_token)
                 if token:
                     self.global_token = token
             
@@ -255,10 +343,11 @@ class StoryPlayer:
                 return
             
             # 准备播报内容
-            welcome_message = f"欢迎{username}来到直播间，天天开心喔"
+            welcome_message = f"{WELCOME_PREFIX}{username}{WELCOME_SUFFIX}"
             
-            # 使用TTS生成语音数据
-            audio_data = process_tts(
+            # 在线程中使用TTS生成语音数据，不阻塞事件循环
+            audio_data = await asyncio.to_thread(
+                process_tts,
                 token,
                 [welcome_message],
                 story_title=f"欢迎信息",
@@ -275,33 +364,312 @@ class StoryPlayer:
         except Exception as e:
             print(f"播报欢迎信息时出错: {str(e)}")
     
-    async def process_interaction(self, username, comment_text, comment_type="评论"):
-        """处理用户互动"""
+    def _synthesize_pcm(self, text):
+        """合成一段PCM语音，供预合成使用，在后台线程中调用"""
+        token = self.global_token or get_token()
+        if not token:
+            return None
+        return process_tts(token, [text], aformat="pcm")
+    
+    def _is_idle(self):
+        """没有正在处理的互动和待处理的评论时视为空闲，预合成只在空闲时进行"""
+        return bool(self.global_token) and not self.is_processing_interaction and not self.comment_cache
+    
+    def _add_gift_template(self, gift):
+        self.speculative.add_template(f"gift:{gift}", "谢谢", f"送的{gift}，爱你哟")
+    
+    def _speculate_gift(self, event):
+        """统计礼物名，常见礼物注册感谢模板；可以使用模板的礼物（只送了一个）一到就开始合成观众名"""
+        if self.speculative is None:
+            return
+        gift, quantity = parse_gift_quantity(event.text)
+        key = f"gift:{gift}"
+        self.gift_name_counts[gift] += 1
+        if not self.speculative.has_template(key) and self.gift_name_counts[gift] >= GIFT_TEMPLATE_MIN_COUNT:
+            self._add_gift_template(gift)
+        if quantity == 1 and self.speculative.has_template(key):
+            self.speculative.prefetch_name(event.user)
+    
+    def _gift_template_key(self, event, merged_events=()):
+        """
+        只送了一个礼物且感谢模板已合成好时返回模板名，否则返回None（由千问生成感谢）
+        模板里没有数量，送了多个（如"小心心×99"）时由千问生成提到数量的感谢
+        """
+        if self.speculative is None or merged_events or event.kind != KIND_GIFT or "、" in event.text:
+            return None
+        gift, quantity = parse_gift_quantity(event.text)
+        if quantity != 1:
+            return None
+        key = f"gift:{gift}"
+        return key if self.speculative.ready(key) else None
+    
+    async def _render_speculative(self, key, username):
+        """
+        用预合成的模板拼接语音，只需等待观众名合成
+        
+        Returns:
+            bytes: WAV音频，模板尚未合成好或观众名合成失败时返回None
+        """
+        if self.speculative is None or not self.speculative.ready(key):
+            return None
+        pcm = await asyncio.get_running_loop().run_in_executor(None, self.speculative.render, key, username)
+        return pcm_to_wav(pcm) if pcm else None
+    
+    def _prerendered_phrase(self, text):
+        """返回预合成的短语语音（WAV），没有时返回None"""
+        pcm = self.speculative.phrase(text) if self.speculative else None
+        return pcm_to_wav(pcm) if pcm else None
+    
+    async def _thank_gift(self, event, merged_events, username):
+        """
+        用预合成的模板感谢礼物
+        
+        Returns:
+            bool: 是否已播报，无法使用模板时返回False，由千问生成感谢
+        """
+        key = self._gift_template_key(event, merged_events)
+        audio_data = await self._render_speculative(key, username) if key else None
+        if audio_data is None:
+            return False
+        response = self.speculative.template_text(key, username)
+        print(f"回复评论 - {username}: {event.text} -> {response}（预合成语音）")
+        self.viewers.record_reply(username, response)
+        await self.play_audio(audio_data)
+        return True
+    
+    def _reply_prompt(self, event, merged_events=(), batched=False):
+        """
+        生成发给千问的评论文本、系统提示词、观众的对话上下文和补充说明
+        系统提示词是固定前缀，互动类型和观众情况放在补充说明中，见prompt_templates.py
+        
+        Args:
+            batched (bool): 是否用于批量请求，批量请求不带对话历史，补充说明中需要提到上次的回复
+        
+        Returns:
+            tuple: (用户名, 评论文本, 系统提示词, 历史消息列表, 补充说明)，合并回复时用户名为多位观众的合并名称，
+                   没有对话上下文
+        """
+        merged_count = 1 + len(merged_events)
+        if merged_count > 1:
+            username = format_usernames([e.user for e in (event, *merged_events)])
+        else:
+            username = event.user
+        
+        notes = ""
+        history = []
+        if merged_count == 1:
+            summary, history = self.viewer_context.build(username)
+            # 对话历史中已经有上次的回复，不再在说明中重复
+            notes = self.viewers.describe(username, last_reply=batched or not history) + summary
+        suffix = REPLY_PROMPTS.suffix(prompt_types(event, merged=merged_count > 1), notes)
+        
+        prompt = f"{username}: {event.text}" if merged_count > 1 else event.prompt_text()
+        return username, prompt, REPLY_PROMPTS.system_prompt(), history, suffix
+    
+    def _reply_cache_keys(self, event, merged_events=()):
+        """
+        Returns:
+            tuple: (查询缓存的键, 写入缓存的键)，礼物感谢不使用缓存，合并回复会提到多位观众，不写入缓存；
+                   观众有对话上下文时（如追问"那第二个呢"）回复依赖上下文，既不查找也不写入缓存
+        """
+        if event.kind == "礼物":
+            return None, None
+        if not merged_events:
+            summary, history = self.viewer_context.build(event.user)
+            if summary or history:
+                return None, None
+        cache_key = event.text
+        store_key = cache_key if not merged_events else None
+        return cache_key, store_key
+    
+    def _reply_from_cache(self, event, merged_events, username):
+        """
+        查找回复缓存，命中的回复与上次对这位观众的回复相同时视为未命中
+        
+        Returns:
+            tuple: (回复, 缓存的语音, 补充语音时使用的缓存键)，未命中时回复为None
+        """
+        cache_key, store_key = self._reply_cache_keys(event, merged_events)
+        cached = lookup_cached_reply(cache_key, viewer=username) if cache_key else None
+        if cached and not merged_events:
+            stats = self.viewers.get(username)
+            if stats and stats.last_reply == cached.reply:
+                cached = None
+        if not cached:
+            return None, None, store_key
+        match = "精确匹配" if cached.exact else f"相似度{cached.similarity:.2f}"
+        print(f"命中回复缓存（{match}，{'含语音' if cached.audio else '需合成语音'}）")
+        return cached.reply, cached.audio, cached.key
+    
+    async def _generate_reply(self, event, merged_events=(), use_cache=True):
+        """
+        生成回复文本：先查回复缓存，未命中时异步调用千问，不阻塞事件循环
+        
+        Returns:
+            tuple: (回复, 缓存的语音或None, 补充语音时使用的缓存键或None)
+        """
+        username, prompt, system_prompt, history, suffix = self._reply_prompt(event, merged_events)
+        response, audio_data, audio_key = None, None, None
+        if use_cache:
+            response, audio_data, audio_key = self._reply_from_cache(event, merged_events, username)
+        if response is None:
+            _, store_key = self._reply_cache_keys(event, merged_events)
+            response = await async_process_live_comment(prompt, system_prompt, cache_key=store_key,
+                                                        viewer=username, history=history, suffix=suffix)
+            audio_key = store_key
+        return response, audio_data, audio_key
+    
+    def _start_reply_task(self, event, merged_events=()):
+        """
+        提前开始生成回复，与正在进行的语音合成和播放并行
+        欢迎、流式回复和使用预合成模板的礼物感谢不需要提前生成，返回None
+        """
+        if event.text == "来了" or self.streaming_replies or self._gift_template_key(event, merged_events):
+            return None
+        return asyncio.create_task(self._generate_reply(event, merged_events))
+    
+    def _start_batch_replies(self, groups):
+        """
+        为一轮互动生成回复：缓存命中的直接使用，其余评论每llm_batch_size条打包成一次千问请求
+        
+        Args:
+            groups (list): [(评论, 合并的相似评论), ...]
+            
+        Returns:
+            list: 与groups对应的Future，结果与_generate_reply相同；欢迎和使用预合成模板的礼物感谢不需要生成回复，为None
+        """
+        loop = asyncio.get_running_loop()
+        futures = []
+        pending = []
+        for event, similar in groups:
+            if event.text == "来了" or self._gift_template_key(event, similar):
+                futures.append(None)
+                continue
+            future = loop.create_future()
+            futures.append(future)
+            username, prompt, system_prompt, history, suffix = self._reply_prompt(event, similar,
+                                                                                  batched=self.llm_batch_size > 1)
+            response, audio_data, audio_key = self._reply_from_cache(event, similar, username)
+            if response is not None:
+                future.set_result((response, audio_data, audio_key))
+                continue
+            _, store_key = self._reply_cache_keys(event, similar)
+            pending.append((future, username, prompt, system_prompt, history, suffix, store_key))
+        
+        for start in range(0, len(pending), self.llm_batch_size):
+            asyncio.create_task(self._run_reply_batch(pending[start:start + self.llm_batch_size]))
+        return futures
+    
+    async def _run_reply_batch(self, batch):
+        """
+        用一次千问请求为一批评论生成回复，请求失败或输出无法解析时改为逐条并发生成
+        批量请求只带观众说明和对话摘要，不带逐轮的对话历史
+        """
+        try:
+            replies = None
+            if len(batch) > 1:
+                try:
+                    replies = await async_process_comment_batch(
+                        [prompt for _, _, prompt, *_ in batch],
+                        notes=[suffix for *_, suffix, _ in batch],
+                        cache_keys=[store_key for *_, store_key in batch],
+                        viewers=[username for _, username, *_ in batch]
+                    )
+                    self.batch_counters["requests"] += 1
+                    self.batch_counters["batched"] += len(batch)
+                except Exception as e:
+                    self.batch_counters["fallbacks"] += 1
+                    print(f"批量生成回复失败，改为逐条生成: {str(e)}")
+            if replies is None:
+                replies = await asyncio.gather(*(
+                    async_process_live_comment(prompt, system_prompt, cache_key=store_key,
+                                               viewer=username, history=history, suffix=suffix)
+                    for _, username, prompt, system_prompt, history, suffix, store_key in batch
+                ))
+            for (future, *_, store_key), reply in zip(batch, replies):
+                if not future.done():
+                    future.set_result((reply, None, store_key))
+        except Exception as e:
+            for future, *_ in batch:
+                if not future.done():
+                    future.set_exception(e)
+    
+    async def process_interaction(self, event, merged_events=(), reply_task=None):
+        """
+        处理用户互动
+        
+        Args:
+            event (ChatEvent): 要回复的评论或礼物
+            merged_events (list): 合并到本次回复中的其他相似评论
+            reply_task (asyncio.Task, optional): 提前开始生成回复的任务（_start_reply_task），
+                                                 为None时在这里生成
+        """
+        events = [event, *merged_events]
+        merged_count = len(events)
+        comment_text = event.text
+        if merged_count > 1:
+            username = format_usernames([e.user for e in events])
+        else:
+            username = event.user
+        
         # 使用锁确保同一时间只处理一个互动
-        with self.interaction_lock:
+        async with self.interaction_lock:
             # 设置正在处理互动的标志
             self.is_processing_interaction = True
+            handled = time.monotonic()
+            for e in events:
+                e.handled = handled
             
             try:
                 # 检查是否是"来了"的评论
                 if comment_text == "来了":
                     # 直接播报欢迎信息
                     await self._announce_welcome(username)
-                else:               
-                    # 使用千问AI生成回复
-                    system_prompt = "你是一个友好、幽默的直播助手，负责回答直播间观众的问题和评论。回复要简洁、有趣，不超过50个字。"
-                    if comment_type == "礼物":
-                        system_prompt += "这是一个礼物，请表达感谢。"
-                    
-                    response = process_live_comment(f"{username}: {comment_text}", system_prompt)
+                elif await self._thank_gift(event, merged_events, username):
+                    # 常见礼物使用预合成的感谢语音
+                    pass
+                else:
+                    response = None
+                    audio_data = None
+                    audio_key = None
+                    streamed = False
+                    if reply_task is None and self.streaming_replies:
+                        # 流式回复：缓存未命中时千问边生成边合成播放
+                        response, audio_data, audio_key = self._reply_from_cache(event, merged_events, username)
+                        if response is None:
+                            _, prompt, system_prompt, history, suffix = self._reply_prompt(event, merged_events)
+                            audio_parts = []
+                            response = await self._stream_interaction(prompt, system_prompt, audio_parts,
+                                                                      history=history, viewer=username, suffix=suffix)
+                            streamed = response is not None
+                            # 兜底回复不写入回复缓存，避免相似评论在缓存有效期内都听到同一句兜底回复
+                            if streamed and audio_key and not is_fallback_reply(response):
+                                cache_reply(audio_key, response, audio=b"".join(audio_parts), viewer=username)
+                        use_cache = False
+                    else:
+                        use_cache = True
+                    if response is None:
+                        # 使用千问AI生成回复（或等待提前开始的生成任务）
+                        if reply_task is None:
+                            reply_task = self._generate_reply(event, merged_events, use_cache=use_cache)
+                        response, audio_data, audio_key = await reply_task
                     
                     # 只打印评论原文和回复信息
                     print(f"回复评论 - {username}: {comment_text} -> {response}")
+                    fallback = is_fallback_reply(response)
+                    if not fallback:
+                        # 合并回复的每位观众都记录这次回复，对话上下文只记录单独回复的评论
+                        for e in events:
+                            self.viewers.record_reply(e.user, response)
+                        if merged_count == 1:
+                            self.viewer_context.record_turn(username, comment_text, response)
+                    if streamed:
+                        return
                     
                     # 获取token，如果全局token不可用则重新获取
                     token = self.global_token
                     if not token:
-                        token = get_token()
+                        token = await asyncio.to_thread(get_token)
                         if token:
                             # 如果成功获取了新token，更新全局token
                             self.global_token = token
@@ -310,14 +678,22 @@ class StoryPlayer:
                         print("无法获取语音token，跳过语音生成")
                         return
                     
-                    # 使用TTS生成语音数据
-                    audio_data = process_tts(
-                        token,
-                        [response],
-                        story_title=f"回复{username}",
-                        sentence_number=1,
-                        total_sentences=1
-                    )
+                    # 兜底回复使用预合成的语音
+                    if audio_data is None and fallback:
+                        audio_data = self._prerendered_phrase(response)
+                    
+                    # 使用TTS生成语音数据，缓存中已有语音时跳过；在线程中合成，不阻塞提前生成的回复和批量生成
+                    if audio_data is None:
+                        audio_data = await asyncio.to_thread(
+                            process_tts,
+                            token,
+                            [response],
+                            story_title=f"回复{username}",
+                            sentence_number=1,
+                            total_sentences=1
+                        )
+                        if audio_data and audio_key:
+                            cache_reply_audio(audio_key, audio_data)
                     
                     # 播放语音回复
                     if audio_data:
@@ -328,9 +704,11 @@ class StoryPlayer:
             except Exception as e:
                 print(f"处理互动时出错: {str(e)}")
             finally:
-                # 处理完成后，清空评论缓存
-                with self.comment_cache_lock:
-                    self.comment_cache.clear()
+                # 记录各阶段延迟
+                completed = time.monotonic()
+                for e in events:
+                    e.completed = completed
+                    self.stage_latency.record(e)
                 
                 # 重置处理标志
                 self.is_processing_interaction = False
@@ -341,36 +719,210 @@ class StoryPlayer:
                 # 恢复故事播放
                 self.song_completed.clear()
     
+    async def _stream_interaction(self, prompt, system_prompt, audio_parts=None, history=None, viewer=None,
+                                  suffix=None):
+        """
+        流式生成回复并边合成边播放
+        
+        Args:
+            prompt (str): 发给千问的评论文本
+            system_prompt (str): 系统提示词
+            audio_parts (list, optional): 收集合成的PCM数据块，用于写入回复缓存
+            history (list, optional): 观众的对话上下文消息
+            viewer (str, optional): 提问的观众
+            suffix (str, optional): 评论后面的补充说明
+        
+        Returns:
+            str: 回复文本；没有播放出任何音频时返回None，由调用方回退到非流式接口
+        """
+        token = self.global_token
+        if not token:
+            token = await asyncio.to_thread(get_token)
+            if token:
+                self.global_token = token
+        if not token:
+            return None
+        
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        timings = ReplyTimings()
+        player = asyncio.create_task(self.play_pcm_stream(chunks, timings))
+        failed = False
+        response = None
+        
+        def on_audio(data):
+            # 语音合成SDK在自己的线程中回调音频数据，通过call_soon_threadsafe交给事件循环
+            if audio_parts is not None:
+                audio_parts.append(data)
+            loop.call_soon_threadsafe(chunks.put_nowait, data)
+        
+        try:
+            response = await loop.run_in_executor(
+                None,
+                lambda: stream_reply(token, prompt, system_prompt, on_audio, timings, history=history, viewer=viewer,
+                                     suffix=suffix)
+            )
+        except Exception as e:
+            failed = True
+            print(f"流式回复出错: {str(e)}")
+        finally:
+            # 排在已提交的音频数据之后，播放完所有数据再结束
+            loop.call_soon(chunks.put_nowait, None)
+        played = await player
+        
+        if not played:
+            if not failed:
+                print("流式回复没有生成音频，回退到普通回复")
+            return None
+        print(f"流式回复延迟: {timings.format()}")
+        # 兜底回复不是千问生成的，不计入回复延迟统计
+        if response is None or not is_fallback_reply(response):
+            self.reply_latency.record(timings)
+        # 已经播放了部分音频时不再回退，避免重复回复
+        return response if response is not None else ""
+    
+    async def play_pcm_stream(self, chunks, timings=None, sample_rate=24000):
+        """
+        边接收边播放16位单声道PCM音频
+        
+        Args:
+            chunks (asyncio.Queue): PCM数据块，None表示结束
+            timings (ReplyTimings, optional): 记录开始出声的时间
+            sample_rate (int): 采样率，与start_stream_tts一致
+            
+        Returns:
+            bool: 是否播放了音频
+        """
+        loop = asyncio.get_running_loop()
+        stream = None
+        pending = b""
+        try:
+            while True:
+                data = await chunks.get()
+                if data is None:
+                    break
+                # 16位采样按2字节对齐，多出的一个字节留到下一块
+                data = pending + data
+                cut = len(data) - len(data) % 2
+                data, pending = data[:cut], data[cut:]
+                if not data:
+                    continue
+                if stream is None:
+                    stream = sd.RawOutputStream(samplerate=sample_rate, channels=1, dtype='int16')
+                    stream.start()
+                    if timings:
+                        timings.first_audio = time.monotonic()
+                # write会阻塞到数据写入设备缓冲区，放到线程池中执行
+                await loop.run_in_executor(None, stream.write, data)
+        except Exception as e:
+            print(f"流式播放音频时出错: {str(e)}")
+        finally:
+            if stream is not None:
+                try:
+                    # stop会等待缓冲区中的音频播放完毕
+                    await loop.run_in_executor(None, stream.stop)
+                    stream.close()
+                except Exception as e:
+                    print(f"关闭音频流时出错: {str(e)}")
+        return stream is not None
+    
+    def _next_interaction(self, start_reply=True):
+        """
+        取出优先级最高的评论及与其相似的评论，并开始生成回复
+        
+        Args:
+            start_reply (bool): 是否立即开始生成回复，批量模式下由_start_batch_replies统一生成
+        
+        Returns:
+            tuple: (评论, 合并的相似评论, 生成回复的任务或None)，队列为空时返回None
+        """
+        event = self.comment_cache.pop()
+        if event is None:
+            return None
+        
+        # 取出队列中与该评论相似的其他评论，合并为一次回复
+        similar = []
+        predicate = self.coalescer.matcher(event)
+        if predicate:
+            similar = self.comment_cache.take_matching(
+                predicate,
+                within=self.coalescer.window,
+                limit=self.coalescer.max_group - 1
+            )
+            self.coalescer.record_group(event.text, 1 + len(similar))
+            # 出队时只记录了基准评论的欢迎，合并进来的欢迎同样计入冷却时间
+            for other in similar:
+                if other.category == CLASS_GREETING:
+                    self.viewers.record_welcome(other.user)
+        
+        if similar:
+            usernames = format_usernames([event.user] + [other.user for other in similar])
+            print(f"合并{1 + len(similar)}条相似评论: {usernames}: {event.text}")
+        else:
+            print(f"处理评论: {event.user}: {event.text}")
+        return event, similar, self._start_reply_task(event, similar) if start_reply else None
+    
     async def process_comment_cache(self):
         """处理评论缓存中的评论"""
         # 如果已经在处理互动，直接返回
         if self.is_processing_interaction:
             return
         
-        # 从缓存中获取评论
-        with self.comment_cache_lock:
-            if not self.comment_cache:
-                # 如果缓存为空，清除暂停事件
-                print("评论缓存为空，清除暂停事件")
-                self.song_completed.clear()
-                return
-            
-            # 获取所有未处理的评论
-            comments_to_process = self.comment_cache.copy()
-            # 清空缓存，准备接收新评论
-            self.comment_cache.clear()
-        
-        # 按顺序处理每条评论
-        for comment in comments_to_process:
-            username, comment_text, comment_type = comment
-            print(f"处理评论: {username}: {comment_text}")
-            await self.process_interaction(username, comment_text, comment_type)
-            
-            # 处理完一条评论后，检查是否有新评论加入
-            with self.comment_cache_lock:
-                if self.comment_cache:
-                    # 如果有新评论，先处理新评论
+        if not self.comment_cache:
+            # 如果缓存为空，清除暂停事件
+            print("评论缓存为空，清除暂停事件")
+            self.song_completed.clear()
+            return
+        
+        if self.llm_batch_size > 1 and not self.streaming_replies:
+            # 批量模式：一次取出本轮的互动，需要千问生成的评论打包请求，回复按优先级依次合成播放
+            groups = []
+            for _ in range(max(self.max_interactions_per_round, self.llm_batch_size)):
+                interaction = self._next_interaction(start_reply=False)
+                if interaction is None:
+                    break
+                groups.append(interaction[:2])
+            for (event, similar), reply_future in zip(groups, self._start_batch_replies(groups)):
+                await self.process_interaction(event, similar, reply_future)
+        else:
+            # 每次取出优先级最高的评论，处理期间新到的高优先级评论会排到前面；
+            # 播放当前回复时已取出下一条并开始生成回复，千问的耗时与语音合成和播放重叠
+            upcoming = self._next_interaction()
+            for index in range(self.max_interactions_per_round):
+                if upcoming is None:
                     break
+                event, similar, reply_task = upcoming
+                upcoming = None
+                if index + 1 < self.max_interactions_per_round:
+                    upcoming = self._next_interaction()
+                await self.process_interaction(event, similar, reply_task)
+        
+        stats = self.comment_cache.stats()
+        saved = self.coalescer.counters
+        print(f"评论队列状态: 待处理{stats['pending']}条，已处理{stats.get('dispatched', 0)}条，"
+              f"限流{stats.get('rate_limited', 0)}条，溢出{stats.get('overflow', 0)}条，过期{stats.get('expired', 0)}条，"
+              f"合并节省千问调用{saved['llm_calls_saved']}次、语音合成{saved['tts_calls_saved']}次")
+        print(f"互动延迟: {self.stage_latency.format_summary()}")
+        cache = REPLY_CACHE.stats()
+        print(f"回复缓存: {cache['entries']}条，精确命中{cache.get('exact_hits', 0)}次，"
+              f"相似命中{cache.get('similar_hits', 0)}次，未命中{cache.get('misses', 0)}次")
+        if self.streaming_replies:
+            print(f"流式回复延迟: {self.reply_latency.format_summary()}")
+        if REPLY_GENERATOR.histograms["all"].count:
+            print(f"千问回复延迟: {REPLY_GENERATOR.format_summary()}")
+        if PROMPT_TOKENS.totals:
+            print(f"提示词: {PROMPT_TOKENS.format_summary()}")
+        if self.batch_counters:
+            batch = self.batch_counters
+            print(f"批量生成: {batch['requests']}次请求生成{batch['batched']}条回复，回退逐条生成{batch['fallbacks']}次")
+        if self.speculative:
+            spec = self.speculative.stats()
+            print(f"预合成语音: 模板命中{spec.get('template_hits', 0)}次、未就绪{spec.get('template_misses', 0)}次，"
+                  f"观众名缓存命中{spec.get('name_hits', 0)}次，短语命中{spec.get('phrase_hits', 0)}次")
+        context = self.viewer_context.stats()
+        if context["viewers"]:
+            print(f"对话上下文: {context['viewers']}位观众，平均{context['avg_tokens']:.0f} tokens，"
+                  f"最多{context['max_tokens']} tokens")
     
     async def play_spotify_music(self):
         """异步播放Spotify音乐"""
@@ -411,13 +963,16 @@ class StoryPlayer:
             
             # 创建歌曲列表的副本用于随机播放
             available_tracks = tracks.copy()
+            # 预先选好的下一首歌（已预合成歌曲信息）
+            next_track = None
             
             while True:  # 添加无限循环
                 if not available_tracks:  # 如果所有歌曲都播放过了，重新填充列表
                     available_tracks = tracks.copy()
                 
-                # 随机选择一首歌曲
-                random_track = random.choice(available_tracks)
+                # 随机选择一首歌曲，优先使用预先选好的歌曲
+                random_track = next_track if next_track in available_tracks else random.choice(available_tracks)
+                next_track = None
                 available_tracks.remove(random_track)  # 从可用列表中移除已播放的歌曲
                 
                 track_name = random_track['track']['name']
@@ -439,8 +994,19 @@ class StoryPlayer:
                     # 开始播放
                     self.sp.start_playback(device_id=device_id, uris=[track_uri])
                     
-                    # 查找并播报歌曲信息
+                    # 查找并播报歌曲信息，后面几句在播报第一句时预合成
                     song_info = self._find_song_info(track_name, artist_name)
+                    if song_info and self.speculative:
+                        self.speculative.prefetch_phrases(self._song_info_lines(song_info)[1:])
+                    
+                    # 提前选好下一首歌，在这首歌播放期间的空闲时间预合成它的歌曲信息
+                    if self.speculative and available_tracks:
+                        next_track = random.choice(available_tracks)
+                        next_info = self._find_song_info(next_track['track']['name'],
+                                                         next_track['track']['artists'][0]['name'])
+                        if next_info:
+                            self.speculative.prefetch_phrases(self._song_info_lines(next_info))
+                    
                     if song_info:
                         await self._announce_song_info(song_info)
                     
@@ -484,13 +1050,17 @@ class StoryPlayer:
         print(f"未找到匹配的歌曲信息")
         return None
         
+    def _song_info_lines(self, song_info):
+        """歌曲信息播报的各句：标题和每行非空的描述"""
+        return [song_info['title']] + [line for line in song_info['description'].split('\n') if line.strip()]
+    
     async def _announce_song_info(self, song_info):
         """播报歌曲信息"""
         try:
             # 获取token，如果全局token不可用则重新获取
             token = self.global_token
             if not token:
-                token = get_token()
+                token = await asyncio.to_thread(get_token)
                 if token:
                     self.global_token = token
             
@@ -501,8 +1071,9 @@ class StoryPlayer:
             # 准备播报内容
             title_announcement = f"{song_info['title']}"
             
-            # 使用TTS生成并播放标题
-            title_audio = process_tts(
+            # 使用TTS生成并播放标题，已预合成时直接使用
+            title_audio = self._prerendered_phrase(title_announcement) or await asyncio.to_thread(
+                process_tts,
                 token,
                 [title_announcement],
                 story_title=f"歌曲标题",
@@ -523,8 +1094,9 @@ class StoryPlayer:
                 if not line.strip():  # 跳过空行
                     continue
                     
-                # 使用TTS生成语音数据
-                audio_data = process_tts(
+                # 使用TTS生成语音数据，已预合成时直接使用
+                audio_data = self._prerendered_phrase(line) or await asyncio.to_thread(
+                    process_tts,
                     token,
                     [line],
                     story_title=f"歌曲描述",
@@ -624,6 +1196,8 @@ class StoryPlayer:
     
     async def run(self):
         """运行音乐播放器"""
+        self.loop = asyncio.get_running_loop()
+        self.viewers.start()
         try:
             # 获取语音转换token并保存到全局变量
             self.global_token = get_token()
@@ -638,7 +1212,14 @@ class StoryPlayer:
             if douyin_live_url:
                 print(f"使用直播间URL: {douyin_live_url}")
                 # 确保评论监控成功启动
-                if not start_comment_monitoring(douyin_live_url, self.comment_handler):
+                # 设置COMMENT_RECORD_PATH环境变量可将评论录制为JSONL，用于回放压测
+                record_path = os.getenv('COMMENT_RECORD_PATH')
+                # 设置COMMENT_INGEST_PROCESS=1可在独立进程中运行浏览器评论监控，避免与音频播放争抢GIL
+                if os.getenv('COMMENT_INGEST_PROCESS', '').lower() in ('1', 'true', 'yes'):
+                    self.comment_source = comment_ingest
+                else:
+                    self.comment_source = getusercomment
+                if not self.comment_source.start_comment_monitoring(douyin_live_url, self.comment_handler, record_path=record_path):
                     print("评论监控启动失败，请检查URL是否正确")
                     return
                 print("评论监控已成功启动")
@@ -655,9 +1236,15 @@ class StoryPlayer:
             print(f"运行出错：{str(e)}")
         finally:
             # 如果启动了评论监控，确保停止
-            if 'douyin_live_url' in locals() and douyin_live_url:
-                stop_comment_monitoring()
-
+            if self.comment_source:
+                self.comment_source.stop_comment_monitoring()
+            # 发出尚未到期的礼物窗口，再保存观众索引快照
+            self.gift_aggregator.close()
+            self.viewers.close()
+            if self.speculative:
+                self.speculative.close()
+            await close_async_client()
+    
     def _load_songs_info(self):
         """加载歌曲信息"""
         try:
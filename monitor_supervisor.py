@@ -0,0 +1,161 @@
+"""
+评论监控自愈状态机
+为每个直播间维护 健康 -> 降级 -> 刷新中 -> 重启中 的状态，
+失败后按带抖动的指数退避等待，并统计刷新次数、重启次数、各状态停留时间和评论中断时长
+"""
+
+import random
+import threading
+import time
+from collections import Counter
+
+# 监控状态
+STATE_HEALTHY = "healthy"        # 正常抓取评论
+STATE_DEGRADED = "degraded"      # 出现错误，退避后重试
+STATE_RELOADING = "reloading"    # 正在刷新直播间页面
+STATE_RESTARTING = "restarting"  # 正在重启浏览器
+
+class ExponentialBackoff:
+    """带抖动的指数退避"""
+    
+    def __init__(self, base=0.5, factor=2.0, max_delay=60.0, jitter=0.5):
+        """
+        Args:
+            base (float): 第一次重试前的等待时间（秒）
+            factor (float): 每次失败后等待时间的放大倍数
+            max_delay (float): 最长等待时间（秒）
+            jitter (float): 抖动比例，实际等待时间在 delay*(1-jitter) 到 delay 之间
+        """
+        self.base = base
+        self.factor = factor
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.attempts = 0
+    
+    def next_delay(self):
+        """返回下一次重试前的等待时间，并增加失败次数"""
+        delay = min(self.max_delay, self.base * (self.factor ** self.attempts))
+        self.attempts += 1
+        return delay * (1 - self.jitter * random.random())
+    
+    def reset(self):
+        """成功后重置"""
+        self.attempts = 0
+
+class MonitorSupervisor:
+    """单个直播间的监控状态机和健康指标"""
+    
+    def __init__(self, name, degraded_failures=3, max_reloads=3):
+        """
+        Args:
+            name (str): 名称，用于日志输出
+            degraded_failures (int): 降级状态下连续失败多少次后刷新页面
+            max_reloads (int): 连续刷新多少次仍未恢复后重启浏览器
+        """
+        self.name = name
+        self.degraded_failures = degraded_failures
+        self.max_reloads = max_reloads
+        self.backoff = ExponentialBackoff()
+        self.state = STATE_HEALTHY
+        self.consecutive_failures = 0
+        self.consecutive_reloads = 0
+        # 计数器: failures/reloads/restarts/recoveries
+        self.counters = Counter()
+        self._state_since = time.monotonic()
+        self._time_in_state = Counter()
+        self._gap_started = None  # 本次评论中断的开始时间
+        self.gap_seconds_total = 0.0  # 累计评论中断时长
+        self.gap_seconds_max = 0.0  # 最长一次评论中断
+        self._lock = threading.Lock()
+    
+    def _transition(self, new_state, reason=None):
+        """切换状态并累计上一个状态的停留时间"""
+        now = time.monotonic()
+        if new_state == self.state:
+            return
+        self._time_in_state[self.state] += now - self._state_since
+        print(f"监控状态 [{self.name}]: {self.state} -> {new_state}" + (f"（{reason}）" if reason else ""))
+        
+        if self.state == STATE_HEALTHY:
+            self._gap_started = now
+        elif new_state == STATE_HEALTHY and self._gap_started is not None:
+            gap = now - self._gap_started
+            self.gap_seconds_total += gap
+            self.gap_seconds_max = max(self.gap_seconds_max, gap)
+            self._gap_started = None
+            self.counters["recoveries"] += 1
+            print(f"评论抓取已恢复 [{self.name}]，中断{gap:.1f}s")
+        
+        self.state = new_state
+        self._state_since = now
+    
+    def record_success(self):
+        """一次成功的抓取"""
+        with self._lock:
+            self.consecutive_failures = 0
+            self.consecutive_reloads = 0
+            self.backoff.reset()
+            self._transition(STATE_HEALTHY)
+    
+    def record_failure(self, reason):
+        """
+        记录一次失败，返回建议的下一步状态
+        
+        Returns:
+            str: STATE_DEGRADED（退避后重试）、STATE_RELOADING（刷新页面）或STATE_RESTARTING（重启浏览器）
+        """
+        with self._lock:
+            self.counters["failures"] += 1
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.degraded_failures:
+                self.consecutive_failures = 0
+                return STATE_RELOADING
+            self._transition(STATE_DEGRADED, reason)
+            return STATE_DEGRADED
+    
+    def begin_reload(self, reason):
+        """
+        开始刷新页面
+        
+        Returns:
+            bool: 连续刷新次数已达上限，应改为重启浏览器时返回False
+        """
+        with self._lock:
+            if self.consecutive_reloads >= self.max_reloads:
+                return False
+            self.consecutive_reloads += 1
+            self.counters["reloads"] += 1
+            self._transition(STATE_RELOADING, reason)
+            return True
+    
+    def begin_restart(self, reason):
+        """开始重启浏览器"""
+        with self._lock:
+            self.consecutive_reloads = 0
+            self.counters["restarts"] += 1
+            self._transition(STATE_RESTARTING, reason)
+    
+    def next_delay(self):
+        """下一次重试前的退避时间"""
+        with self._lock:
+            return self.backoff.next_delay()
+    
+    def metrics(self):
+        """返回指标快照"""
+        with self._lock:
+            now = time.monotonic()
+            time_in_state = dict(self._time_in_state)
+            time_in_state[self.state] = time_in_state.get(self.state, 0.0) + now - self._state_since
+            gap_total = self.gap_seconds_total
+            if self._gap_started is not None:
+                gap_total += now - self._gap_started
+            return {
+                "state": self.state,
+                "reloads": self.counters["reloads"],
+                "restarts": self.counters["restarts"],
+                "failures": self.counters["failures"],
+                "recoveries": self.counters["recoveries"],
+                "time_in_state": {state: round(seconds, 1) for state, seconds in time_in_state.items()},
+                "comment_gap_seconds": round(gap_total, 1),
+                "comment_gap_max_seconds": round(self.gap_seconds_max, 1),
+            }
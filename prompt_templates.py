@@ -0,0 +1,155 @@
+"""
+回复提示词模板模块
+所有回复请求的系统提示词都是同一段固定前缀，每次都不一样的内容（互动类型、观众情况、对话摘要）
+不再拼接进系统提示词，而是作为后缀放在最后一条评论后面的括号里:
+    系统提示词（固定前缀） -> 观众的历史问答（只追加） -> 评论（互动类型后缀 + 观众情况）
+这样同一场直播中所有请求的开头逐字节相同，同一位观众连续提问时历史问答也相同，
+千问的上下文缓存可以复用这部分的预填充结果，缩短首字延迟，命中缓存的token也按更低的价格计费
+
+同时统计每小时发送的提示词token数以及其中命中缓存的token数
+"""
+
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from interaction_scheduler import classify_interaction, CLASS_GIFT, CLASS_QUESTION, CLASS_COMMENT, CLASS_GREETING
+from viewer_context import estimate_tokens
+
+# 点歌和多位观众合并回复的提示词类型，其余类型与互动类型相同
+PROMPT_SONG_REQUEST = "点歌"
+PROMPT_MERGED = "合并"
+
+# 固定前缀：人设、回复要求和补充说明的格式，不随请求变化
+REPLY_PROMPT_PREFIX = ("你是一个友好、幽默的直播助手，负责回答直播间观众的问题和评论。回复要简洁、有趣，不超过50个字。"
+                       "评论后面括号里是补充说明（互动类型、观众情况等），按说明回复，不要复述括号里的内容。")
+
+# 各类型的后缀，评论没有后缀
+DEFAULT_PROMPT_SUFFIXES = {
+    CLASS_GIFT: "这是一个礼物，请表达感谢。",
+    CLASS_QUESTION: "观众在提问，请直接回答。",
+    CLASS_COMMENT: "",
+    CLASS_GREETING: "观众在打招呼，请热情回应。",
+    PROMPT_SONG_REQUEST: "观众在点歌，请热情回应，说会尽量安排，不要承诺具体时间。",
+    PROMPT_MERGED: "这是多位观众发送的相似评论，请一起回复。",
+}
+
+_SONG_REQUEST_PATTERN = re.compile(r'点歌|点一首|来一首|唱一首|放一首|想听|播放')
+
+def prompt_types(event, merged=False):
+    """
+    判断评论的提示词类型
+    
+    Args:
+        event (ChatEvent): 评论或礼物
+        merged (bool): 是否与其他观众的相似评论合并回复
+    
+    Returns:
+        list: 提示词类型，如["礼物"]、["点歌", "合并"]
+    """
+    category = event.category or classify_interaction(event.text, event.kind)
+    if category != CLASS_GIFT and _SONG_REQUEST_PATTERN.search(event.text):
+        category = PROMPT_SONG_REQUEST
+    return [category, PROMPT_MERGED] if merged else [category]
+
+def estimate_prompt_tokens(messages):
+    """估算消息列表的提示词token数，接口没有返回用量时使用"""
+    return sum(estimate_tokens(message.get("content") or "") for message in messages)
+
+class PromptTemplates:
+    """回复提示词模板：固定前缀 + 按类型的后缀"""
+    
+    def __init__(self, prefix=REPLY_PROMPT_PREFIX, suffixes=None):
+        """
+        Args:
+            prefix (str): 系统提示词的固定前缀
+            suffixes (dict, optional): {提示词类型: 后缀}，默认DEFAULT_PROMPT_SUFFIXES
+        """
+        self.prefix = prefix
+        self.prefix_tokens = estimate_tokens(prefix)
+        self._suffixes = dict(DEFAULT_PROMPT_SUFFIXES if suffixes is None else suffixes)
+        self._systems = {"": prefix}
+    
+    def register(self, prompt_type, suffix):
+        """注册或替换一个类型的后缀"""
+        self._suffixes[prompt_type] = suffix
+    
+    def system_prompt(self, instruction=""):
+        """
+        返回系统提示词：固定前缀，加上同样固定的附加说明（如批量回复的输出格式）
+        同一附加说明每次返回同一个字符串，保证请求开头逐字节相同
+        """
+        system = self._systems.get(instruction)
+        if system is None:
+            system = self._systems.setdefault(instruction, self.prefix + instruction)
+        return system
+    
+    def suffix(self, types, notes=""):
+        """
+        生成放在评论后面的补充说明
+        
+        Args:
+            types (list): 提示词类型，见prompt_types
+            notes (str): 观众情况、对话摘要等
+        
+        Returns:
+            str: 补充说明，没有内容时为空字符串
+        """
+        return "".join(self._suffixes.get(prompt_type, "") for prompt_type in types) + notes
+
+class PromptTokenMeter:
+    """线程安全的提示词token统计，按最近一小时的请求计算每小时发送的token数"""
+    
+    def __init__(self, window=3600.0):
+        self.window = window
+        self._samples = deque()  # (时间, 提示词token数, 命中缓存的token数)
+        self._started = None
+        self._lock = threading.Lock()
+        # 计数器: requests/prompt_tokens/cached_tokens，从启动开始累计
+        self.totals = Counter()
+    
+    def record(self, prompt_tokens, cached_tokens=0, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._started is None:
+                self._started = now
+            self._samples.append((now, prompt_tokens, cached_tokens))
+            self.totals["requests"] += 1
+            self.totals["prompt_tokens"] += prompt_tokens
+            self.totals["cached_tokens"] += cached_tokens
+            self._expire(now)
+    
+    def stats(self, now=None):
+        """
+        Returns:
+            dict: requests/prompt_tokens/cached_tokens（累计），per_hour/cached_per_hour（每小时的token数，
+                  运行不满一小时时按已运行的时间折算），cache_ratio（命中缓存的比例）
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._expire(now)
+            prompt = sum(tokens for _, tokens, _ in self._samples)
+            cached = sum(tokens for _, _, tokens in self._samples)
+            stats = dict(self.totals)
+            elapsed = now - self._started if self._started is not None else 0.0
+        # 运行时间太短时折算误差很大，至少按一分钟计算
+        scale = self.window / min(self.window, max(elapsed, 60.0))
+        stats["per_hour"] = prompt * scale * 3600.0 / self.window
+        stats["cached_per_hour"] = cached * scale * 3600.0 / self.window
+        stats["cache_ratio"] = cached / prompt if prompt else 0.0
+        return stats
+    
+    def format_summary(self):
+        """格式化为一行文本，用于打印"""
+        stats = self.stats()
+        return (f"每小时{stats['per_hour']:.0f} tokens（命中缓存{stats['cache_ratio']:.0%}），"
+                f"累计{stats.get('requests', 0)}次请求{stats.get('prompt_tokens', 0)} tokens")
+    
+    def _expire(self, now):
+        """丢弃窗口之外的样本，调用时需持有锁"""
+        while self._samples and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+
+if __name__ == "__main__":
+    print("此模块不应直接运行，请通过main.py启动程序")
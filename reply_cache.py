@@ -0,0 +1,318 @@
+"""
+回复缓存模块
+观众经常反复问同样的问题（"主播几岁"、"这是什么歌"），缓存千问的回复和合成好的语音，
+命中时可以同时跳过千问和语音合成。
+
+两层查找:
+    精确匹配: 评论规范化（全半角统一、小写、去掉标点和空白、压缩重复字符）后完全相同
+    近似匹配: 在本地字符n-gram TF-IDF索引中查找余弦相似度不低于阈值的问题
+
+太短的评论（如"那第二个呢"）往往依赖上下文，不缓存；回复中称呼提问观众的名字时，
+缓存中以占位符保存，命中时替换为新观众的名字，这类回复的语音包含名字，不缓存语音。条目超过存活时间后失效，超过容量时淘汰最久未使用的条目
+"""
+
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict, defaultdict
+
+# 回复中观众名字的占位符
+_VIEWER_PLACEHOLDER = "\x00"
+
+# 与常用称呼相同的观众名，回复中出现时多半不是在叫这位观众，不替换为占位符
+_COMMON_NAMES = {"主播", "大家", "朋友", "宝宝", "观众", "小伙伴", "家人们"}
+
+# 称呼观众的位置：名字前是开头、标点或"谢谢"等，名字后是结尾、标点或"你"等
+_ADDRESS_BEFORE = r'(?:^|(?<=[\s，,。.！!？?：:、~～@])|(?<=谢谢)|(?<=感谢)|(?<=欢迎)|(?<=亲爱的))'
+_ADDRESS_AFTER = r'(?=$|[\s，,。.！!？?：:、~～]|你|的|同学|宝宝|呀|啊|哦)'
+
+# 句尾语气词，不影响问题的意思
+_TRAILING_PARTICLES = set("啊呀呢吗嘛哦喔噢吧呗啦哈")
+
+def normalize_text(text):
+    """
+    规范化评论文本，用于精确匹配和n-gram索引
+    
+    Returns:
+        str: 全角转半角并转小写、只保留文字和数字、连续3个以上相同字符压缩为2个、
+             去掉句尾语气词后的文本
+    """
+    chars = []
+    for char in unicodedata.normalize("NFKC", text).lower():
+        if not char.isalnum():
+            continue
+        if len(chars) >= 2 and chars[-1] == char and chars[-2] == char:
+            continue
+        chars.append(char)
+    while len(chars) > 2 and chars[-1] in _TRAILING_PARTICLES:
+        chars.pop()
+    return "".join(chars)
+
+def char_ngrams(text, sizes=(2, 3)):
+    """
+    统计规范化文本的字符n-gram，长度不足时使用整段文本
+    
+    Returns:
+        Counter: {n-gram: 出现次数}
+    """
+    grams = Counter()
+    for size in sizes:
+        for i in range(len(text) - size + 1):
+            grams[text[i:i + size]] += 1
+    if not grams and text:
+        grams[text] = 1
+    return grams
+
+class _CacheEntry:
+    """一条缓存的问答"""
+    
+    __slots__ = ("key", "reply", "audio", "grams", "created", "hits")
+    
+    def __init__(self, key, reply, grams, now):
+        self.key = key  # 规范化后的问题
+        self.reply = reply  # 回复文本，观众名字已替换为占位符
+        self.audio = None  # 合成好的语音，回复中包含观众名字时为None
+        self.grams = grams
+        self.created = now
+        self.hits = 0
+    
+    @property
+    def personalized(self):
+        return _VIEWER_PLACEHOLDER in self.reply
+
+class CachedReply:
+    """一次缓存命中"""
+    
+    def __init__(self, key, reply, audio, similarity, exact):
+        self.key = key  # 命中的缓存问题（规范化后），用于补充语音
+        self.reply = reply  # 已替换为当前观众名字的回复
+        self.audio = audio  # 可直接播放的语音，没有缓存语音时为None
+        self.similarity = similarity  # 与缓存问题的相似度，精确匹配为1.0
+        self.exact = exact
+
+class ReplyCache:
+    """线程安全的回复缓存"""
+    
+    def __init__(self, max_entries=500, ttl=1800.0, similarity_threshold=0.8,
+                 ngram_sizes=(2, 3), min_similar_chars=3, max_audio_bytes=64 * 1024 * 1024,
+                 min_key_chars=4, min_viewer_chars=2):
+        """
+        Args:
+            max_entries (int): 最多缓存的问题数，超出时淘汰最久未使用的条目
+            ttl (float): 条目的存活时间（秒），从写入时开始计算
+            similarity_threshold (float): 近似匹配的最低余弦相似度
+            ngram_sizes (tuple): 索引使用的字符n-gram长度
+            min_similar_chars (int): 规范化后少于多少个字的评论只做精确匹配
+            max_audio_bytes (int): 缓存语音的总字节数上限，超出时先丢弃最久未使用条目的语音
+            min_key_chars (int): 规范化后少于多少个字的评论不查找也不写入缓存
+            min_viewer_chars (int): 观众名少于多少个字时不替换为占位符，避免误替换回复中的普通字词
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.ngram_sizes = ngram_sizes
+        self.min_similar_chars = min_similar_chars
+        self.max_audio_bytes = max_audio_bytes
+        self.min_key_chars = min_key_chars
+        self.min_viewer_chars = min_viewer_chars
+        self._entries = OrderedDict()  # 规范化问题 -> _CacheEntry，按最近使用排序
+        self._postings = defaultdict(set)  # n-gram -> 包含它的规范化问题
+        self._audio_bytes = 0
+        self._lock = threading.Lock()
+        # 计数器: exact_hits/similar_hits/misses/stored/evicted/expired
+        self.counters = Counter()
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+    
+    def lookup(self, text, viewer=None, now=None):
+        """
+        查找缓存的回复
+        
+        Args:
+            text (str): 评论原文
+            viewer (str, optional): 提问的观众，用于替换回复中的名字占位符
+            now (float, optional): 当前时间（time.monotonic()）
+        
+        Returns:
+            CachedReply: 命中时返回，未命中返回None
+        """
+        key = normalize_text(text)
+        if len(key) < max(1, self.min_key_chars):
+            return None
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._live_entry(key, now)
+            similarity = 1.0
+            if entry is None and len(key) >= self.min_similar_chars:
+                entry, similarity = self._most_similar(key, now)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(entry.key)
+            entry.hits += 1
+            exact = entry.key == key
+            self.counters["exact_hits" if exact else "similar_hits"] += 1
+            reply, audio = entry.reply, entry.audio
+        if _VIEWER_PLACEHOLDER in reply:
+            reply = reply.replace(_VIEWER_PLACEHOLDER, viewer or "")
+        return CachedReply(entry.key, reply, audio, similarity, exact)
+    
+    def store(self, text, reply, audio=None, viewer=None, now=None):
+        """
+        缓存一条回复
+        
+        Args:
+            text (str): 评论原文
+            reply (str): 千问的回复
+            audio (bytes, optional): 回复的语音，回复中包含观众名字时不缓存
+            viewer (str, optional): 提问的观众，回复中称呼该观众的名字会替换为占位符
+            now (float, optional): 当前时间（time.monotonic()）
+        """
+        key = normalize_text(text)
+        if len(key) < max(1, self.min_key_chars) or not reply or self.max_entries <= 0:
+            return
+        personalized = self._personalize(reply, viewer)
+        if personalized is None:
+            return
+        if personalized != reply:
+            reply = personalized
+            audio = None
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            entry = _CacheEntry(key, reply, char_ngrams(key, self.ngram_sizes), now)
+            self._entries[key] = entry
+            for gram in entry.grams:
+                self._postings[gram].add(key)
+            self.counters["stored"] += 1
+            if audio:
+                self._set_audio(entry, audio)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.counters["evicted"] += 1
+    
+    def _personalize(self, reply, viewer):
+        """
+        把回复中称呼观众的名字替换为占位符，名字太短或是常用称呼时不替换
+        
+        Returns:
+            str: 替换后的回复；替换后仍提到观众的名字（不在称呼的位置）时返回None，这条回复不缓存
+        """
+        if not viewer or len(viewer) < self.min_viewer_chars or viewer in _COMMON_NAMES:
+            return reply
+        reply = re.sub(_ADDRESS_BEFORE + re.escape(viewer) + _ADDRESS_AFTER, _VIEWER_PLACEHOLDER, reply)
+        return None if viewer in reply else reply
+    
+    def attach_audio(self, text, audio):
+        """
+        为已缓存的回复补充语音，回复中包含观众名字的条目不缓存语音
+        
+        Returns:
+            bool: 是否已缓存
+        """
+        key = normalize_text(text)
+        if not key or not audio:
+            return False
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.personalized:
+                return False
+            self._set_audio(entry, audio)
+            return True
+    
+    def stats(self):
+        """返回计数器快照"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self._entries)
+            stats["audio_bytes"] = self._audio_bytes
+            return stats
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._postings.clear()
+            self._audio_bytes = 0
+    
+    def _live_entry(self, key, now):
+        """返回未过期的条目，过期的条目直接删除，调用时需持有锁"""
+        entry = self._entries.get(key)
+        if entry is not None and now - entry.created > self.ttl:
+            self._remove(key)
+            self.counters["expired"] += 1
+            return None
+        return entry
+    
+    def _most_similar(self, key, now):
+        """
+        在n-gram索引中查找最相似的问题，调用时需持有锁
+        
+        Returns:
+            tuple: (_CacheEntry, 相似度)，没有达到阈值的问题时为(None, 0.0)
+        """
+        grams = char_ngrams(key, self.ngram_sizes)
+        candidates = set()
+        for gram in grams:
+            candidates.update(self._postings.get(gram, ()))
+        if not candidates:
+            return None, 0.0
+        
+        total = len(self._entries)
+        
+        def idf(gram):
+            return math.log((1 + total) / (1 + len(self._postings.get(gram, ())))) + 1.0
+        
+        query = {gram: count * idf(gram) for gram, count in grams.items()}
+        query_norm = math.sqrt(sum(weight * weight for weight in query.values()))
+        best, best_similarity = None, 0.0
+        for candidate in candidates:
+            entry = self._live_entry(candidate, now)
+            if entry is None:
+                continue
+            dot = 0.0
+            norm = 0.0
+            for gram, count in entry.grams.items():
+                weight = count * idf(gram)
+                norm += weight * weight
+                if gram in query:
+                    dot += weight * query[gram]
+            similarity = dot / (query_norm * math.sqrt(norm)) if norm else 0.0
+            if similarity > best_similarity:
+                best, best_similarity = entry, similarity
+        if best_similarity < self.similarity_threshold:
+            return None, 0.0
+        return best, best_similarity
+    
+    def _set_audio(self, entry, audio):
+        """设置条目的语音，超出总字节数时丢弃最久未使用条目的语音，调用时需持有锁"""
+        if entry.audio:
+            self._audio_bytes -= len(entry.audio)
+        entry.audio = audio
+        self._audio_bytes += len(audio)
+        for other in self._entries.values():
+            if self._audio_bytes <= self.max_audio_bytes:
+                break
+            if other.audio and other is not entry:
+                self._audio_bytes -= len(other.audio)
+                other.audio = None
+    
+    def _remove(self, key):
+        """删除条目及其索引，调用时需持有锁"""
+        entry = self._entries.pop(key)
+        for gram in entry.grams:
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+        if entry.audio:
+            self._audio_bytes -= len(entry.audio)
+
+if __name__ == "__main__":
+    print("此模块不应直接运行，请通过main.py启动程序")
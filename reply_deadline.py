@@ -0,0 +1,223 @@
+"""
+限时生成回复模块
+直播间的回复要在几秒内说出口，千问偶尔很慢或出错时不能一直等，更不能把错误信息念出来:
+    截止时间: 每次生成都有截止时间，到点还没有完整回复就放弃
+    对冲请求: 主模型在hedge_after秒内还没有输出第一个字（或已经出错）时，向更快的模型（如qwen-turbo）
+              再发一个请求，两个请求谁先完整返回用谁，另一个取消
+    兜底回复: 两个请求都没能在截止时间内返回时，使用预先写好的兜底回复，兜底回复是固定的几句话，
+              可以提前合成好语音，不写入回复缓存
+每次生成的耗时记入对数分桶的直方图，按来源（主模型、对冲、兜底）分别统计p50/p95/p99
+"""
+
+import asyncio
+import bisect
+import math
+import threading
+from collections import Counter, namedtuple
+
+# 兜底回复，轮流使用，避免连续两次说同一句
+DEFAULT_FALLBACK_REPLIES = (
+    "哎呀，主播刚刚走神了，你再说一遍好不好呀",
+    "这个问题有点难倒我了，让我想一想再回答你哦",
+    "收到收到，主播看到你的评论啦，谢谢你的陪伴",
+    "网络有点卡，主播没听清，待会儿再聊这个好不好",
+)
+
+# 生成结果: 回复文本、来源（primary/hedge/fallback）和耗时（秒）
+GeneratedReply = namedtuple("GeneratedReply", ["text", "source", "latency"])
+
+class LatencyHistogram:
+    """线程安全的对数分桶延迟直方图，内存占用固定，百分位数的误差不超过一个桶的宽度"""
+    
+    def __init__(self, min_value=0.01, max_value=60.0, buckets_per_decade=20):
+        """
+        Args:
+            min_value (float): 第一个桶的上界（秒），更小的值都计入第一个桶
+            max_value (float): 最后一个有界桶的上界（秒），更大的值计入溢出桶
+            buckets_per_decade (int): 每10倍区间的桶数，20个桶时相邻上界相差约12%
+        """
+        count = int(math.ceil(math.log10(max_value / min_value) * buckets_per_decade))
+        self.bounds = [min_value * 10 ** (i / buckets_per_decade) for i in range(count + 1)]
+        self._counts = [0] * (len(self.bounds) + 1)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def record(self, seconds):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.bounds, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+    
+    def percentile(self, p):
+        """返回第p百分位数所在桶的上界（秒），不超过记录到的最大值，没有样本时返回0"""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = max(1, int(math.ceil(p / 100.0 * self.count)))
+            seen = 0
+            for index, count in enumerate(self._counts):
+                seen += count
+                if seen >= rank:
+                    break
+            bound = self.bounds[index] if index < len(self.bounds) else self.max
+            return min(bound, self.max)
+    
+    def buckets(self):
+        """
+        Returns:
+            list: [(桶上界, 样本数), ...]，只包含有样本的桶，溢出桶的上界为inf
+        """
+        with self._lock:
+            return [(self.bounds[i] if i < len(self.bounds) else float("inf"), count)
+                    for i, count in enumerate(self._counts) if count]
+    
+    def summary(self):
+        """
+        Returns:
+            dict: {"count", "p50", "p95", "p99", "max"}，单位秒
+        """
+        return {"count": self.count, "p50": self.percentile(50), "p95": self.percentile(95),
+                "p99": self.percentile(99), "max": self.max}
+    
+    def format_summary(self):
+        """格式化为一行文本，用于打印"""
+        s = self.summary()
+        return f"p50={s['p50']:.2f}s p95={s['p95']:.2f}s p99={s['p99']:.2f}s（{s['count']}次）"
+
+class FallbackReplies:
+    """轮流使用的兜底回复"""
+    
+    def __init__(self, replies=DEFAULT_FALLBACK_REPLIES):
+        self.replies = tuple(replies)
+        self._next = 0
+        self._lock = threading.Lock()
+    
+    def pick(self):
+        with self._lock:
+            reply = self.replies[self._next % len(self.replies)]
+            self._next += 1
+            return reply
+    
+    def is_fallback(self, text):
+        return text in self.replies
+
+class DeadlineReplyGenerator:
+    """带截止时间和对冲请求的回复生成，需在事件循环中使用"""
+    
+    def __init__(self, request, primary_model, hedge_model=None, deadline=8.0, hedge_after=1.5, fallbacks=None):
+        """
+        Args:
+            request (callable): 协程函数 request(model, messages, on_first_token, timeout)，返回完整回复文本，
+                                出错时抛出异常；收到第一个字时调用on_first_token()
+            primary_model (str): 主模型
+            hedge_model (str, optional): 对冲请求使用的模型，为空时不发对冲请求
+            deadline (float): 截止时间（秒），从开始生成算起
+            hedge_after (float): 主模型多久没有输出第一个字时发出对冲请求（秒）
+            fallbacks (FallbackReplies, optional): 兜底回复
+        """
+        self._request = request
+        self.primary_model = primary_model
+        self.hedge_model = hedge_model
+        self.deadline = deadline
+        self.hedge_after = hedge_after
+        self.fallbacks = fallbacks or FallbackReplies()
+        # 延迟直方图: all为所有回复，其余按来源统计
+        self.histograms = {source: LatencyHistogram() for source in ("all", "primary", "hedge", "fallback")}
+        # 计数器: primary/hedge/fallback（各来源的回复数）、hedged（发出的对冲请求数）、
+        # primary_errors/hedge_errors、timeouts（截止时间到仍未返回）
+        self.counters = Counter()
+    
+    async def generate(self, messages):
+        """
+        生成回复，不会抛出异常，最迟在截止时间后返回
+        
+        Args:
+            messages (list): 发给模型的消息列表
+        
+        Returns:
+            GeneratedReply: 回复文本、来源和耗时
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + self.deadline
+        first_token = asyncio.Event()
+        tasks = {self._start(self.primary_model, messages, first_token.set, self.deadline): "primary"}
+        hedged = not self.hedge_model
+        text, source = None, "fallback"
+        try:
+            while text is None:
+                now = loop.time()
+                if not hedged and (not tasks or (not first_token.is_set() and now >= start + self.hedge_after)):
+                    # 主模型迟迟没有输出或已经出错，向更快的模型再发一个请求
+                    hedged = True
+                    self.counters["hedged"] += 1
+                    tasks[self._start(self.hedge_model, messages, lambda: None, deadline - now)] = "hedge"
+                if not tasks or now >= deadline:
+                    break
+                
+                waiters = set(tasks)
+                timeout = deadline - now
+                token_waiter = None
+                if not hedged and not first_token.is_set():
+                    token_waiter = asyncio.ensure_future(first_token.wait())
+                    waiters.add(token_waiter)
+                    timeout = min(timeout, max(0.0, start + self.hedge_after - now))
+                try:
+                    done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    if token_waiter is not None:
+                        token_waiter.cancel()
+                
+                for task in done:
+                    if task not in tasks:
+                        continue
+                    label = tasks.pop(task)
+                    error = task.exception()
+                    if error is not None:
+                        self.counters[f"{label}_errors"] += 1
+                        print(f"调用千问API时发生错误（{label}）: {str(error)}")
+                    elif task.result() and text is None:
+                        text, source = task.result(), label
+            if text is None and tasks:
+                self.counters["timeouts"] += 1
+                print(f"生成回复超过{self.deadline:.1f}秒，使用兜底回复")
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        if text is None:
+            text = self.fallbacks.pick()
+        latency = loop.time() - start
+        self.counters[source] += 1
+        self.histograms["all"].record(latency)
+        self.histograms[source].record(latency)
+        return GeneratedReply(text, source, latency)
+    
+    def is_fallback(self, text):
+        """回复是否是兜底回复"""
+        return self.fallbacks.is_fallback(text)
+    
+    def stats(self):
+        """
+        Returns:
+            dict: 计数器快照，加上各来源的延迟汇总 {"latency": {来源: LatencyHistogram.summary()}}
+        """
+        stats = dict(self.counters)
+        stats["latency"] = {source: histogram.summary() for source, histogram in self.histograms.items()
+                            if histogram.count}
+        return stats
+    
+    def format_summary(self):
+        """格式化为一行文本，用于打印"""
+        return (f"{self.histograms['all'].format_summary()}，主模型{self.counters['primary']}次，"
+                f"对冲请求{self.counters['hedged']}次（采用{self.counters['hedge']}次），"
+                f"兜底{self.counters['fallback']}次")
+    
+    def _start(self, model, messages, on_first_token, timeout):
+        return asyncio.ensure_future(self._request(model, messages, on_first_token, timeout))
+
+if __name__ == "__main__":
+    print("此模块不应直接运行，请通过main.py启动程序")
@@ -0,0 +1,230 @@
+"""
+回复历史记录
+固定容量的环形缓冲区保存最近的评论和回复，追加为O(1)，写满后覆盖最旧的记录；
+附带按观众和按时间范围的索引，可选地把每条记录追加写入JSONL文件，重启后加载最近的记录
+
+文件中每行一条记录:
+    {"t": 1700000000.0, "user": "小明", "comment": "小明: 主播几岁", "response": "..."}
+"""
+
+import json
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from collections import deque, namedtuple
+from datetime import datetime
+
+# 一条回复记录，前三个字段与原来的(timestamp, comment, response)元组一致
+ResponseRecord = namedtuple("ResponseRecord", ["timestamp", "comment", "response", "user"])
+
+def parse_comment_user(comment):
+    """从"用户名: 评论"格式的文本中取出用户名，没有用户名时返回None"""
+    if ": " in comment:
+        return comment.split(": ", 1)[0]
+    return None
+
+class ResponseHistory:
+    """线程安全的定长回复历史"""
+    
+    def __init__(self, capacity=1000, path=None, compact_factor=10):
+        """
+        Args:
+            capacity (int): 最多保存的记录数
+            path (str, optional): JSONL文件路径，为None时只保存在内存中
+            compact_factor (int): 文件行数超过capacity的多少倍时，加载后重写为最近capacity条
+        """
+        self.capacity = capacity
+        self.path = path
+        self.compact_factor = compact_factor
+        self._slots = [None] * capacity
+        self._start = 0  # 最旧记录所在的位置
+        self._size = 0
+        self._first_seq = 0  # 最旧记录的序号，序号随追加递增
+        self._by_user = {}  # 用户名 -> deque(序号)，按时间排序
+        self._lock = threading.RLock()
+        self._file = None
+        if path:
+            self._load(path)
+            self._file = open(path, 'a', encoding='utf-8')
+    
+    def __len__(self):
+        with self._lock:
+            return self._size
+    
+    def _at(self, index):
+        """第index条记录（0为最旧），调用时需持有锁"""
+        return self._slots[(self._start + index) % self.capacity]
+    
+    def append(self, comment, response, user=None, timestamp=None):
+        """
+        追加一条记录，写满后覆盖最旧的记录
+        
+        Args:
+            comment (str): 发给千问的评论文本
+            response (str): 回复内容
+            user (str, optional): 观众用户名，默认从"用户名: 评论"中解析
+            timestamp (datetime, optional): 记录时间，默认当前时间
+        
+        Returns:
+            ResponseRecord: 新记录
+        """
+        record = ResponseRecord(timestamp or datetime.now(), comment, response,
+                                user if user is not None else parse_comment_user(comment))
+        with self._lock:
+            self._append(record)
+            if self._file:
+                try:
+                    self._file.write(json.dumps(self._to_dict(record), ensure_ascii=False) + "\n")
+                    self._file.flush()
+                except (OSError, ValueError) as e:
+                    print(f"写入回复历史文件失败: {str(e)}")
+        return record
+    
+    def _append(self, record):
+        """追加到环形缓冲区并更新索引，调用时需持有锁"""
+        if self.capacity <= 0:
+            return
+        if self._size == self.capacity:
+            # 覆盖最旧的记录，同时从观众索引中移除
+            oldest = self._slots[self._start]
+            self._drop_user_seq(oldest.user, self._first_seq)
+            self._slots[self._start] = record
+            self._start = (self._start + 1) % self.capacity
+            self._first_seq += 1
+        else:
+            self._slots[(self._start + self._size) % self.capacity] = record
+            self._size += 1
+        if record.user is not None:
+            self._by_user.setdefault(record.user, deque()).append(self._first_seq + self._size - 1)
+    
+    def _drop_user_seq(self, user, seq):
+        """从观众索引中移除被覆盖的记录，调用时需持有锁"""
+        seqs = self._by_user.get(user)
+        if seqs and seqs[0] == seq:
+            seqs.popleft()
+            if not seqs:
+                del self._by_user[user]
+    
+    def latest(self):
+        """返回最新的记录，没有记录时返回None"""
+        with self._lock:
+            if not self._size:
+                return None
+            return self._at(self._size - 1)
+    
+    def recent(self, limit=None):
+        """
+        返回最近的记录，按时间从旧到新排列
+        
+        Args:
+            limit (int, optional): 最多返回的条数，默认全部
+        """
+        with self._lock:
+            count = self._size if not limit or limit <= 0 else min(limit, self._size)
+            return [self._at(i) for i in range(self._size - count, self._size)]
+    
+    def by_user(self, user, limit=None):
+        """返回某位观众最近的记录，按时间从旧到新排列"""
+        with self._lock:
+            seqs = self._by_user.get(user)
+            if not seqs:
+                return []
+            if limit and limit > 0:
+                seqs = list(seqs)[-limit:]
+            return [self._at(seq - self._first_seq) for seq in seqs]
+    
+    def between(self, since=None, until=None):
+        """
+        返回时间范围内的记录，按时间从旧到新排列，使用二分查找定位
+        
+        Args:
+            since (datetime, optional): 起始时间（包含）
+            until (datetime, optional): 结束时间（包含）
+        """
+        with self._lock:
+            times = _TimestampView(self)
+            low = 0 if since is None else bisect_left(times, since)
+            high = self._size if until is None else bisect_right(times, until)
+            return [self._at(i) for i in range(low, high)]
+    
+    def users(self):
+        """返回当前历史中出现过的观众"""
+        with self._lock:
+            return list(self._by_user)
+    
+    def clear(self):
+        """清空内存中的记录，并截断历史文件"""
+        with self._lock:
+            self._slots = [None] * self.capacity
+            self._start = 0
+            self._size = 0
+            self._by_user.clear()
+            if self._file:
+                self._file.seek(0)
+                self._file.truncate()
+    
+    def close(self):
+        """关闭历史文件"""
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+    
+    @staticmethod
+    def _to_dict(record):
+        return {"t": record.timestamp.timestamp(), "user": record.user,
+                "comment": record.comment, "response": record.response}
+    
+    def _load(self, path):
+        """从文件加载最近capacity条记录，文件过大时重写"""
+        if not os.path.exists(path):
+            return
+        lines = 0
+        tail = deque(maxlen=self.capacity)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    lines += 1
+                    tail.append(line)
+        except OSError as e:
+            print(f"加载回复历史失败: {str(e)}")
+            return
+        
+        with self._lock:
+            for line in tail:
+                try:
+                    data = json.loads(line)
+                    self._append(ResponseRecord(datetime.fromtimestamp(data["t"]), data["comment"],
+                                                data["response"], data.get("user")))
+                except (ValueError, KeyError, TypeError):
+                    continue
+        print(f"已加载回复历史: {self._size}条")
+        
+        if lines > self.capacity * self.compact_factor:
+            self._compact(path)
+    
+    def _compact(self, path):
+        """把历史文件重写为内存中的记录，先写临时文件再替换"""
+        temp_path = path + ".tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for record in self.recent():
+                    f.write(json.dumps(self._to_dict(record), ensure_ascii=False) + "\n")
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"压缩回复历史文件失败: {str(e)}")
+
+class _TimestampView:
+    """按逻辑顺序访问记录时间的只读序列，供bisect使用，调用时需持有锁"""
+    
+    def __init__(self, history):
+        self._history = history
+    
+    def __len__(self):
+        return self._history._size
+    
+    def __getitem__(self, index):
+        return self._history._at(index).timestamp
+
+if __name__ == "__main__":
+    print("此模块不应直接运行，请通过main.py启动程序")
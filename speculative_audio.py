@@ -0,0 +1,298 @@
+"""
+预合成语音模块
+欢迎、礼物感谢和歌曲信息播报的内容基本是固定的，可以在空闲时提前合成:
+    模板: 固定的前后两段（如"欢迎" + 观众名 + "来到直播间，天天开心喔"）在空闲时合成为PCM，
+          播报时只合成观众名，再与前后两段拼接
+    观众名: 评论或礼物一到就在后台开始合成，轮到播报时通常已经合成好，常见观众名会被缓存
+    短语: 整句预合成（如下一首歌的歌曲信息），播报时直接使用
+
+所有音频都是16位单声道PCM，拼接前去掉每段首尾的静音，段与段之间插入固定长度的停顿
+"""
+
+import struct
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+def trim_silence(pcm, threshold=500, keep_ms=20, sample_rate=24000):
+    """
+    去掉PCM首尾的静音，两端各保留keep_ms毫秒，整段都是静音时原样返回
+    
+    Args:
+        pcm (bytes): 16位单声道PCM
+        threshold (int): 绝对值不超过该值的采样视为静音
+    """
+    samples = array("h")
+    samples.frombytes(pcm[:len(pcm) & ~1])
+    start = 0
+    while start < len(samples) and abs(samples[start]) <= threshold:
+        start += 1
+    if start == len(samples):
+        return pcm
+    end = len(samples)
+    while end > start and abs(samples[end - 1]) <= threshold:
+        end -= 1
+    keep = sample_rate * keep_ms // 1000
+    return samples[max(0, start - keep):min(len(samples), end + keep)].tobytes()
+
+def pcm_to_wav(pcm, sample_rate=24000, channels=1, bits_per_sample=16):
+    """为PCM加上WAV文件头"""
+    block_align = channels * bits_per_sample // 8
+    return (b"RIFF" + struct.pack("<I", 36 + len(pcm)) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, sample_rate * block_align,
+                                    block_align, bits_per_sample)
+            + b"data" + struct.pack("<I", len(pcm)) + pcm)
+
+class SpeculativeAudio:
+    """线程安全的预合成语音管理"""
+    
+    def __init__(self, synthesize, idle=None, sample_rate=24000, gap_ms=60, max_names=500,
+                 max_phrase_bytes=32 * 1024 * 1024, name_workers=2, max_idle_wait=10.0):
+        """
+        Args:
+            synthesize (callable): 合成函数 synthesize(text)，返回16位单声道PCM，失败时返回None，会在后台线程中调用
+            idle (callable, optional): 是否空闲 idle()，模板和短语只在空闲时合成，避免与正在进行的播报争抢语音合成
+            sample_rate (int): PCM采样率
+            gap_ms (int): 拼接时段与段之间的停顿（毫秒）
+            max_names (int): 最多缓存的观众名语音数
+            max_phrase_bytes (int): 缓存短语语音的总字节数上限，超出时淘汰最久未使用的短语
+            name_workers (int): 合成观众名的线程数
+            max_idle_wait (float): 一直不空闲时最多等待多久（秒），超时后照常合成，避免直播间持续繁忙时模板一直无法使用
+        """
+        self._synthesize = synthesize
+        self._idle = idle or (lambda: True)
+        self.max_idle_wait = max_idle_wait
+        self.sample_rate = sample_rate
+        self._gap = bytes(sample_rate * gap_ms // 1000 * 2)
+        self.max_names = max_names
+        self.max_phrase_bytes = max_phrase_bytes
+        self._templates = {}  # 模板名 -> (前段文本, 后段文本)
+        self._segments = {}  # 模板片段文本 -> PCM，常驻
+        self._phrases = OrderedDict()  # 短语 -> PCM，按最近使用排序
+        self._phrase_bytes = 0
+        self._names = OrderedDict()  # 观众名 -> PCM，按最近使用排序
+        self._pending_names = {}  # 观众名 -> Future
+        self._queued = set()  # 等待空闲时合成的文本
+        self._queue = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+        self._name_executor = ThreadPoolExecutor(max_workers=name_workers, thread_name_prefix="speculative-name")
+        self._worker = None
+        # 计数器: template_hits/template_misses/name_hits/name_waits/name_failures/phrase_hits/phrase_misses/rendered
+        self.counters = Counter()
+    
+    def add_template(self, key, prefix, suffix):
+        """
+        注册一个模板，前后两段会在空闲时合成
+        
+        Args:
+            key (str): 模板名
+            prefix (str): 观众名之前的文本，可以为空
+            suffix (str): 观众名之后的文本，可以为空
+        """
+        with self._lock:
+            self._templates[key] = (prefix, suffix)
+        self._enqueue([text for text in (prefix, suffix) if text])
+    
+    def has_template(self, key):
+        with self._lock:
+            return key in self._templates
+    
+    def ready(self, key):
+        """模板的前后两段是否都已合成好"""
+        with self._lock:
+            parts = self._templates.get(key)
+            return parts is not None and all(not text or text in self._segments for text in parts)
+    
+    def template_text(self, key, name):
+        """返回模板填入观众名后的完整文本"""
+        with self._lock:
+            prefix, suffix = self._templates[key]
+        return f"{prefix}{name}{suffix}"
+    
+    def prefetch_phrases(self, texts):
+        """在空闲时预合成整句短语"""
+        with self._lock:
+            texts = [text for text in texts if text and text not in self._phrases]
+        self._enqueue(texts)
+    
+    def prefetch_name(self, name):
+        """
+        在后台开始合成观众名，不等待空闲
+        
+        Returns:
+            Future: 结果为PCM或None；观众名已缓存时返回None
+        """
+        if not name:
+            return None
+        with self._lock:
+            if self._closed or name in self._names:
+                return None
+            future = self._pending_names.get(name)
+            if future is None:
+                future = self._name_executor.submit(self._render_name, name)
+                self._pending_names[name] = future
+            return future
+    
+    def render(self, key, name, timeout=5.0):
+        """
+        用模板拼接出完整的语音，阻塞等待观众名合成，应在线程中调用
+        
+        Returns:
+            bytes: 拼接好的PCM；模板尚未合成好或观众名合成失败时返回None，调用方应改为整句合成
+        """
+        with self._lock:
+            parts = self._templates.get(key, ())
+            missing = [text for text in parts if text and text not in self._segments]
+            if not parts or missing:
+                self.counters["template_misses"] += 1
+            else:
+                segments = [self._segments[text] if text else b"" for text in parts]
+                name_pcm = self._names.get(name)
+                if name_pcm is not None:
+                    self._names.move_to_end(name)
+                    self.counters["name_hits"] += 1
+        if not parts or missing:
+            # 之前合成失败的片段重新排队
+            self._enqueue(missing)
+            return None
+        
+        if name_pcm is None:
+            future = self.prefetch_name(name)
+            waited = future is not None
+            if future is None:
+                with self._lock:
+                    name_pcm = self._names.get(name)
+            else:
+                try:
+                    name_pcm = future.result(timeout=timeout)
+                except Exception:
+                    name_pcm = None
+            with self._lock:
+                self.counters["name_waits" if waited else "name_hits"] += 1
+                if not name_pcm:
+                    self.counters["name_failures"] += 1
+            if not name_pcm:
+                return None
+        
+        with self._lock:
+            self.counters["template_hits"] += 1
+        prefix, suffix = segments
+        pieces = [piece for piece in (prefix, name_pcm, suffix) if piece]
+        return self._gap.join(pieces)
+    
+    def phrase(self, text):
+        """
+        返回预合成的短语语音
+        
+        Returns:
+            bytes: PCM，没有预合成时返回None
+        """
+        with self._lock:
+            pcm = self._phrases.get(text)
+            if pcm is None:
+                self.counters["phrase_misses"] += 1
+                return None
+            self._phrases.move_to_end(text)
+            self.counters["phrase_hits"] += 1
+            return pcm
+    
+    def stats(self):
+        """返回计数器快照"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats["templates"] = len(self._templates)
+            stats["names"] = len(self._names)
+            stats["phrases"] = len(self._phrases)
+            stats["queued"] = len(self._queue)
+            return stats
+    
+    def close(self):
+        """停止后台合成"""
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify_all()
+        self._name_executor.shutdown(wait=False)
+    
+    def _render_name(self, name):
+        """合成观众名并缓存，在合成线程中运行"""
+        try:
+            pcm = self._synthesize(name)
+            if pcm:
+                pcm = trim_silence(pcm, sample_rate=self.sample_rate)
+            with self._lock:
+                if pcm:
+                    self._names[name] = pcm
+                    while len(self._names) > self.max_names:
+                        self._names.popitem(last=False)
+                return pcm
+        finally:
+            with self._lock:
+                self._pending_names.pop(name, None)
+    
+    def _enqueue(self, texts):
+        """把文本加入空闲合成队列，按需启动后台线程"""
+        with self._lock:
+            if self._closed:
+                return
+            for text in texts:
+                if text not in self._queued:
+                    self._queued.add(text)
+                    self._queue.append(text)
+            if self._queue and self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="speculative-audio", daemon=True)
+                self._worker.start()
+            self._wakeup.notify()
+    
+    def _run(self):
+        """后台线程：空闲时逐条合成队列中的模板片段和短语"""
+        waiting_since = None
+        while True:
+            with self._lock:
+                while not self._queue and not self._closed:
+                    self._wakeup.wait()
+                if self._closed:
+                    return
+                text = self._queue[0]
+            now = time.monotonic()
+            waiting_since = waiting_since or now
+            if not self._idle() and now - waiting_since < self.max_idle_wait:
+                time.sleep(0.2)
+                continue
+            waiting_since = None
+            
+            try:
+                pcm = self._synthesize(text)
+            except Exception as e:
+                print(f"预合成语音失败: {str(e)}")
+                pcm = None
+            if pcm:
+                pcm = trim_silence(pcm, sample_rate=self.sample_rate)
+            
+            with self._lock:
+                self._queue.pop(0)
+                self._queued.discard(text)
+                if not pcm:
+                    continue
+                self.counters["rendered"] += 1
+                if any(text in parts for parts in self._templates.values()):
+                    self._segments[text] = pcm
+                else:
+                    self._store_phrase(text, pcm)
+    
+    def _store_phrase(self, text, pcm):
+        """缓存短语语音，超出总字节数时淘汰最久未使用的短语，调用时需持有锁"""
+        old = self._phrases.pop(text, None)
+        if old is not None:
+            self._phrase_bytes -= len(old)
+        self._phrases[text] = pcm
+        self._phrase_bytes += len(pcm)
+        while self._phrase_bytes > self.max_phrase_bytes and len(self._phrases) > 1:
+            _, dropped = self._phrases.popitem(last=False)
+            self._phrase_bytes -= len(dropped)
+
+if __name__ == "__main__":
+    print("此模块不应直接运行，请通过main.py启动程序")
@@ -36,7 +36,7 @@ __STREAM_INPUT_TTS_REQUEST_NAME__ = {
     "task_failed": "TaskFailed",
 }
 
-__URL__ = "wss://nls-gateway-cn-beijing.aliyuncs.com/ws/v1"
+__URL__ = os.getenv("ALIYUN_NLS_URL", "wss://nls-gateway-cn-beijing.aliyuncs.com/ws/v1")
 
 
 __all__ = ["NlsStreamInputTtsSynthesizer"]
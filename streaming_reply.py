@@ -0,0 +1,177 @@
+"""
+流式回复模块
+千问以流式方式生成回复，按标点切成短句后立即送入已启动的流式语音合成会话，
+第一句的音频在模型还在生成后续内容时就可以开始播放。
+记录各阶段耗时：千问首字延迟（TTFT）、语音合成首包延迟（TTFB）和首次出声延迟
+"""
+
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from cosyVoiceTTS import start_stream_tts
+from getResponseFromQianwen import process_live_comment_stream
+
+# 短句切分标点
+CLAUSE_PUNCTUATION = set("，。！？；：、…,.!?;:\n")
+
+def split_clauses(deltas, min_chars=6, first_min_chars=2):
+    """
+    把流式文本片段切分为短句
+    
+    Args:
+        deltas (iterable): 增量文本片段
+        min_chars (int): 短句的最少字数，过短的短句会与后面的内容合并，避免语音断断续续
+        first_min_chars (int): 第一句的最少字数，尽量早地开始合成
+    
+    Yields:
+        str: 以标点结尾的短句，最后一段可能没有标点
+    """
+    buffer = ""
+    minimum = first_min_chars
+    for delta in deltas:
+        buffer += delta
+        start = 0
+        for index, char in enumerate(buffer):
+            if char in CLAUSE_PUNCTUATION and index + 1 - start >= minimum:
+                yield buffer[start:index + 1]
+                start = index + 1
+                minimum = min_chars
+        buffer = buffer[start:]
+    if buffer.strip():
+        yield buffer
+
+class ReplyTimings:
+    """一次流式回复各阶段的时间点（time.monotonic()）"""
+    
+    def __init__(self):
+        self.request_start = None  # 开始请求千问
+        self.llm_first_token = None  # 收到第一个文本片段
+        self.llm_done = None  # 千问生成完毕
+        self.first_clause = None  # 第一句送入语音合成
+        self.tts_first_byte = None  # 收到第一段音频
+        self.tts_done = None  # 语音合成完毕
+        self.first_audio = None  # 第一段音频开始播放
+    
+    def stages(self):
+        """
+        各阶段耗时（毫秒），尚未发生的阶段不包含在结果中
+        
+        Returns:
+            dict: llm_ttft（千问首字）、tts_ttfb（第一句送入到收到音频）、first_audio（请求开始到出声）、
+                  llm_total、tts_total
+        """
+        stages = {}
+        
+        def add(name, end, start):
+            if end is not None and start is not None:
+                stages[name] = (end - start) * 1000
+        
+        add("llm_ttft", self.llm_first_token, self.request_start)
+        add("tts_ttfb", self.tts_first_byte, self.first_clause)
+        add("first_audio", self.first_audio, self.request_start)
+        add("llm_total", self.llm_done, self.request_start)
+        add("tts_total", self.tts_done, self.request_start)
+        return stages
+    
+    def format(self):
+        names = {"llm_ttft": "千问首字", "tts_ttfb": "合成首包", "first_audio": "首次出声",
+                 "llm_total": "千问完成", "tts_total": "合成完成"}
+        return "，".join(f"{names[name]}{ms:.0f}ms" for name, ms in self.stages().items())
+
+class ReplyLatencyStats:
+    """最近若干次流式回复的阶段耗时统计"""
+    
+    def __init__(self, max_samples=200):
+        self._samples = deque(maxlen=max_samples)
+    
+    def record(self, timings):
+        self._samples.append(timings.stages())
+    
+    def summary(self):
+        """
+        Returns:
+            dict: {阶段: (p50, p95)}，单位毫秒
+        """
+        summary = {}
+        for name in ("llm_ttft", "tts_ttfb", "first_audio"):
+            values = sorted(stages[name] for stages in self._samples if name in stages)
+            if values:
+                summary[name] = (values[int(0.50 * (len(values) - 1))], values[int(0.95 * (len(values) - 1))])
+        return summary
+    
+    def format_summary(self):
+        """格式化为一行文本，用于打印"""
+        names = {"llm_ttft": "千问首字", "tts_ttfb": "合成首包", "first_audio": "首次出声"}
+        return "，".join(f"{names[name]} p50={p50:.0f}ms p95={p95:.0f}ms"
+                        for name, (p50, p95) in self.summary().items())
+
+def stream_reply(token, comment, system_prompt, on_audio, timings=None,
+                 llm_stream=process_live_comment_stream, tts_session=start_stream_tts, history=None, viewer=None,
+                 suffix=None):
+    """
+    流式生成回复并合成语音，阻塞直到合成完毕，应在线程中调用
+    
+    Args:
+        token (str): 语音合成Token
+        comment (str): 发给千问的评论文本
+        system_prompt (str): 系统提示词
+        on_audio (callable): PCM音频片段回调 on_audio(data)，在语音合成SDK的线程中调用
+        timings (ReplyTimings, optional): 记录各阶段时间点
+        llm_stream (callable): 返回增量文本的生成函数，默认调用千问
+        tts_session (callable): 启动流式合成会话的函数，默认使用cosyVoiceTTS.start_stream_tts
+        history (list, optional): 观众的对话上下文消息，传给llm_stream
+        viewer (str, optional): 提问的观众，传给llm_stream用于记录回复历史
+        suffix (str, optional): 评论后面的补充说明（互动类型、观众情况等），传给llm_stream
+    
+    Returns:
+        str: 完整回复文本
+    """
+    timings = timings or ReplyTimings()
+    timings.request_start = time.monotonic()
+    
+    def handle_audio(data):
+        if timings.tts_first_byte is None:
+            timings.tts_first_byte = time.monotonic()
+        on_audio(data)
+    
+    # 语音合成会话的建连与千问请求并行进行
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        session_future = executor.submit(tts_session, token, handle_audio)
+        session = None
+        parts = []
+        try:
+            deltas = llm_stream(comment, system_prompt, history=history, viewer=viewer, suffix=suffix)
+            for clause in split_clauses(_timed_deltas(deltas, timings)):
+                if session is None:
+                    session = session_future.result()
+                    timings.first_clause = time.monotonic()
+                parts.append(clause)
+                session.sendStreamInputTts(clause)
+            timings.llm_done = time.monotonic()
+            if session is None:
+                session = session_future.result()
+            # 等待剩余音频合成完毕，stopStreamInputTts会关闭连接
+            session.stopStreamInputTts()
+            timings.tts_done = time.monotonic()
+        except Exception:
+            # 千问或合成出错时关闭会话，建连尚未完成时等其结束后再关闭
+            if session is None and not session_future.cancel():
+                try:
+                    session = session_future.result()
+                except Exception:
+                    session = None
+            if session is not None:
+                session.shutdown()
+            raise
+    return "".join(parts)
+
+def _timed_deltas(deltas, timings):
+    """记录千问首字时间"""
+    for delta in deltas:
+        if timings.llm_first_token is None:
+            timings.llm_first_token = time.monotonic()
+        yield delta
+
+if __name__ == "__main__":
+    print("此模块不应直接运行，请通过main.py启动程序")
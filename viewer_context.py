@@ -0,0 +1,173 @@
+"""
+观众对话上下文
+为每位观众保留最近K轮问答和一段滚动摘要，让追问能接上之前的对话。
+上下文按本地估算的token数限制在预算内：超出轮数或预算的旧问答折叠进摘要，
+摘要本身也有预算，超出时丢弃最旧的内容，因此每次请求增加的提示词长度是有上限的。
+摘要是从旧问答中截取的片段，不额外调用千问
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+def estimate_tokens(text):
+    """
+    快速估算文本的token数，不加载分词器
+    中日韩文字和全角标点按每字1个token计算，其他字符按每4个1个token计算（向上取整）
+    
+    Returns:
+        int: 估算的token数
+    """
+    wide = 0
+    narrow = 0
+    for char in text:
+        if ord(char) >= 0x2E80:
+            wide += 1
+        elif not char.isspace():
+            narrow += 1
+    return wide + (narrow + 3) // 4
+
+def _clip(text, max_chars):
+    """截取文本，超出部分用省略号代替"""
+    return text if len(text) <= max_chars else text[:max_chars] + "…"
+
+def _clip_tokens(text, max_tokens):
+    """按估算的token数截取文本，估算方式与estimate_tokens一致"""
+    cost = 0.0
+    for index, char in enumerate(text):
+        if ord(char) >= 0x2E80:
+            cost += 1
+        elif not char.isspace():
+            cost += 0.25
+        if cost > max_tokens:
+            return text[:index] + "…"
+    return text
+
+class _ViewerContext:
+    """一位观众的上下文"""
+    
+    def __init__(self, now):
+        self.turns = deque()  # (评论, 回复, token数)
+        self.turn_tokens = 0
+        self.summary = deque()  # (摘要片段, token数)
+        self.summary_tokens = 0
+        self.updated = now
+
+class ViewerContextManager:
+    """线程安全的观众上下文管理，按最近互动时间淘汰观众"""
+    
+    def __init__(self, max_turns=3, token_budget=240, summary_budget=60, snippet_chars=16,
+                 max_viewers=2000, idle_ttl=3600.0, fold_to=None):
+        """
+        Args:
+            max_turns (int): 保留原文的最近问答轮数
+            token_budget (int): 每位观众上下文（摘要+问答）的token预算
+            summary_budget (int): 摘要的token预算，包含在token_budget中
+            snippet_chars (int): 折叠进摘要时评论和回复各保留的字数
+            max_viewers (int): 最多保留上下文的观众数
+            idle_ttl (float): 观众多久没有互动后丢弃上下文（秒）
+            fold_to (int, optional): 超出max_turns时一次折叠到只剩这么多轮，默认等于max_turns（每次折叠一轮）；
+                                     两次折叠之间历史问答只追加不变，请求开头可以命中千问的上下文缓存
+        """
+        self.max_turns = max_turns
+        self.fold_to = max_turns if fold_to is None else max(1, min(fold_to, max_turns))
+        self.token_budget = token_budget
+        self.summary_budget = min(summary_budget, token_budget)
+        self.snippet_chars = snippet_chars
+        self.max_viewers = max_viewers
+        self.idle_ttl = idle_ttl
+        self._viewers = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._viewers)
+    
+    def record_turn(self, viewer, comment, reply, now=None):
+        """
+        记录一轮问答，超出轮数或预算的旧问答折叠进摘要
+        
+        Args:
+            viewer (str): 观众用户名
+            comment (str): 观众的评论
+            reply (str): 回复内容
+        """
+        now = time.monotonic() if now is None else now
+        turn_budget = self.token_budget - self.summary_budget
+        tokens = estimate_tokens(comment) + estimate_tokens(reply)
+        if tokens > turn_budget:
+            # 单轮超过预算时截断评论和回复，保证上下文不超过预算
+            comment = _clip_tokens(comment, turn_budget // 2 - 1)
+            reply = _clip_tokens(reply, turn_budget // 2 - 1)
+            tokens = estimate_tokens(comment) + estimate_tokens(reply)
+        with self._lock:
+            context = self._viewers.get(viewer)
+            if context is None or now - context.updated > self.idle_ttl:
+                context = _ViewerContext(now)
+                self._viewers[viewer] = context
+                if len(self._viewers) > self.max_viewers:
+                    self._viewers.popitem(last=False)
+            self._viewers.move_to_end(viewer)
+            context.updated = now
+            context.turns.append((comment, reply, tokens))
+            context.turn_tokens += tokens
+            if len(context.turns) > self.max_turns:
+                while len(context.turns) > self.fold_to:
+                    self._fold(context, *context.turns.popleft())
+            while len(context.turns) > 1 and context.turn_tokens > turn_budget:
+                self._fold(context, *context.turns.popleft())
+    
+    def _fold(self, context, comment, reply, tokens):
+        """把一轮旧问答折叠进摘要，调用时需持有锁"""
+        context.turn_tokens -= tokens
+        snippet = f"问「{_clip(comment, self.snippet_chars)}」答「{_clip(reply, self.snippet_chars)}」"
+        snippet_tokens = estimate_tokens(snippet)
+        context.summary.append((snippet, snippet_tokens))
+        context.summary_tokens += snippet_tokens
+        while context.summary and context.summary_tokens > self.summary_budget:
+            _, dropped = context.summary.popleft()
+            context.summary_tokens -= dropped
+    
+    def build(self, viewer, now=None):
+        """
+        生成观众的对话上下文
+        
+        Returns:
+            tuple: (摘要文本, 历史消息列表)。摘要放在本次评论后面的补充说明中（见prompt_templates.py），
+                   不拼接到系统提示词，这样系统提示词和历史消息组成的请求开头在两次折叠之间保持不变，
+                   可以命中千问的上下文缓存；没有摘要时为空字符串。
+                   历史消息为[{"role": "user", ...}, {"role": "assistant", ...}, ...]，按时间排列，插在系统提示词之后
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            context = self._viewers.get(viewer)
+            if context is None:
+                return "", []
+            if now - context.updated > self.idle_ttl:
+                del self._viewers[viewer]
+                return "", []
+            summary = "；".join(snippet for snippet, _ in context.summary)
+            turns = list(context.turns)
+        
+        messages = []
+        for comment, reply, _ in turns:
+            messages.append({'role': 'user', 'content': f"{viewer}: {comment}"})
+            messages.append({'role': 'assistant', 'content': reply})
+        summary_text = f"之前和这位观众聊过：{summary}。" if summary else ""
+        return summary_text, messages
+    
+    def stats(self):
+        """
+        Returns:
+            dict: viewers（有上下文的观众数）、avg_tokens和max_tokens（每位观众上下文的估算token数）
+        """
+        with self._lock:
+            sizes = [c.turn_tokens + c.summary_tokens for c in self._viewers.values()]
+        return {
+            "viewers": len(sizes),
+            "avg_tokens": sum(sizes) / len(sizes) if sizes else 0.0,
+            "max_tokens": max(sizes) if sizes else 0
+        }
+
+if __name__ == "__main__":
+    print("此模块不应直接运行，请通过main.py启动程序")
@@ -0,0 +1,242 @@
+"""
+观众活跃度索引
+在内存中记录每位观众的发言、送礼、欢迎和回复情况，定期保存快照到磁盘，重启后自动加载。
+互动调度器据此跳过重复的欢迎、优先回复老观众和送礼观众、限制刷屏观众，所有查询均为O(1)
+
+快照为JSON文件:
+    {"version": 1, "saved_at": 1700000000.0, "viewers": {"小明": {"comments": 3, "gifts": 1, ...}}}
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from interaction_scheduler import TokenBucket
+
+SNAPSHOT_VERSION = 1
+
+class ViewerStats:
+    """单个观众的活跃度记录，时间均为time.time()时间戳"""
+    
+    FIELDS = ("comments", "gifts", "welcomes", "replies",
+              "first_seen", "last_seen", "last_welcome", "last_reply", "last_reply_time")
+    
+    def __init__(self, now):
+        self.comments = 0  # 发言次数
+        self.gifts = 0  # 送礼次数
+        self.welcomes = 0  # 被欢迎次数
+        self.replies = 0  # 被回复次数
+        self.first_seen = now
+        self.last_seen = now
+        self.last_welcome = 0.0  # 上次播报欢迎的时间
+        self.last_reply = None  # 上次回复内容
+        self.last_reply_time = 0.0
+        self.chat_bucket = None  # 发言限流令牌桶，不保存到快照
+    
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+    
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls(data.get("first_seen", 0.0))
+        for field in cls.FIELDS:
+            if field in data:
+                setattr(stats, field, data[field])
+        return stats
+
+class ViewerIndex:
+    """线程安全的观众索引，按最近出现时间淘汰最久未出现的观众"""
+    
+    def __init__(self, snapshot_path=None, snapshot_interval=60.0, max_viewers=50000,
+                 regular_threshold=5, welcome_cooldown=1800.0, chat_rate=(0.2, 3)):
+        """
+        Args:
+            snapshot_path (str, optional): 快照文件路径，为None时只保存在内存中
+            snapshot_interval (float): 自动保存快照的间隔（秒）
+            max_viewers (int): 最多记录的观众数
+            regular_threshold (int): 互动（发言+送礼）达到多少次视为老观众
+            welcome_cooldown (float): 同一观众两次欢迎播报的最短间隔（秒）
+            chat_rate (tuple): 单个观众发言的限流参数 (每秒令牌数, 桶容量)
+        """
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.max_viewers = max_viewers
+        self.regular_threshold = regular_threshold
+        self.welcome_cooldown = welcome_cooldown
+        self.chat_rate = chat_rate
+        self._viewers = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._stop_event = threading.Event()
+        self._snapshot_thread = None
+        if snapshot_path and os.path.exists(snapshot_path):
+            self.load(snapshot_path)
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._viewers)
+    
+    def get(self, username):
+        """返回观众记录，不存在时返回None"""
+        with self._lock:
+            return self._viewers.get(username)
+    
+    def _touch(self, username, now):
+        """获取或创建观众记录并更新最近出现时间，调用时需持有锁"""
+        stats = self._viewers.get(username)
+        if stats is None:
+            stats = ViewerStats(now)
+            self._viewers[username] = stats
+            if len(self._viewers) > self.max_viewers:
+                self._viewers.popitem(last=False)
+        else:
+            stats.last_seen = now
+            self._viewers.move_to_end(username)
+        self._dirty = True
+        return stats
+    
+    def record_comment(self, username, now=None):
+        """记录一次发言"""
+        with self._lock:
+            self._touch(username, time.time() if now is None else now).comments += 1
+    
+    def record_gift(self, username, count=1, now=None):
+        """记录送礼"""
+        with self._lock:
+            self._touch(username, time.time() if now is None else now).gifts += count
+    
+    def record_welcome(self, username, now=None):
+        """记录一次欢迎播报"""
+        now = time.time() if now is None else now
+        with self._lock:
+            stats = self._touch(username, now)
+            stats.welcomes += 1
+            stats.last_welcome = now
+    
+    def record_reply(self, username, reply, now=None):
+        """记录对观众的一次回复"""
+        now = time.time() if now is None else now
+        with self._lock:
+            stats = self._touch(username, now)
+            stats.replies += 1
+            stats.last_reply = reply
+            stats.last_reply_time = now
+    
+    def should_welcome(self, username, now=None):
+        """观众在冷却时间内已被欢迎过时返回False"""
+        now = time.time() if now is None else now
+        with self._lock:
+            stats = self._viewers.get(username)
+            return stats is None or now - stats.last_welcome >= self.welcome_cooldown
+    
+    def allow_chat(self, username, now=None):
+        """单个观众发言限流，超出速率时返回False，第一次发言的观众也会消耗额度"""
+        with self._lock:
+            stats = self._viewers.get(username)
+            if stats is None:
+                stats = self._touch(username, time.time())
+            if stats.chat_bucket is None:
+                stats.chat_bucket = TokenBucket(*self.chat_rate)
+            return stats.chat_bucket.consume(now)
+    
+    def priority_bonus(self, username):
+        """
+        同类互动内的优先级加成：送礼观众0.4，老观众0.2，其他0
+        小于1，不会改变不同类型互动之间的先后顺序
+        """
+        with self._lock:
+            stats = self._viewers.get(username)
+            if stats is None:
+                return 0.0
+            if stats.gifts > 0:
+                return 0.4
+            if stats.comments + stats.gifts >= self.regular_threshold:
+                return 0.2
+            return 0.0
+    
+    def describe(self, username, last_reply=True):
+        """
+        生成用于个性化回复的观众描述，新观众返回空字符串
+        
+        Args:
+            username (str): 观众用户名
+            last_reply (bool): 是否提到上次的回复，请求中已经带有对话历史时不需要
+        """
+        with self._lock:
+            stats = self._viewers.get(username)
+            if stats is None:
+                return ""
+            parts = []
+            if stats.comments + stats.gifts >= self.regular_threshold:
+                parts.append(f"这位观众是老朋友，已经发言{stats.comments}次")
+            if stats.gifts > 0:
+                parts.append(f"送过{stats.gifts}次礼物")
+            if last_reply and stats.last_reply:
+                parts.append(f"上次对这位观众的回复是「{stats.last_reply}」，不要重复")
+            return "，".join(parts) + "。" if parts else ""
+    
+    def save(self, path=None):
+        """把索引保存为快照，先写临时文件再替换，避免写入中途崩溃损坏快照"""
+        path = path or self.snapshot_path
+        if not path:
+            return
+        with self._lock:
+            viewers = {name: stats.to_dict() for name, stats in self._viewers.items()}
+            self._dirty = False
+        snapshot = {"version": SNAPSHOT_VERSION, "saved_at": time.time(), "viewers": viewers}
+        temp_path = path + ".tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"保存观众索引失败: {str(e)}")
+    
+    def load(self, path=None):
+        """从快照加载索引"""
+        path = path or self.snapshot_path
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"加载观众索引失败: {str(e)}")
+            return
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            print(f"观众索引版本不匹配，忽略快照: {path}")
+            return
+        
+        # 按最近出现时间排序，保持淘汰顺序
+        records = sorted(snapshot.get("viewers", {}).items(), key=lambda item: item[1].get("last_seen", 0))
+        with self._lock:
+            self._viewers = OrderedDict(
+                (name, ViewerStats.from_dict(data)) for name, data in records[-self.max_viewers:]
+            )
+        print(f"已加载观众索引: {len(self._viewers)}位观众")
+    
+    def start(self):
+        """启动定期保存快照的线程"""
+        if not self.snapshot_path or self._snapshot_thread:
+            return
+        self._stop_event.clear()
+        self._snapshot_thread = threading.Thread(target=self._snapshot_loop, name="viewer-index-snapshot")
+        self._snapshot_thread.daemon = True
+        self._snapshot_thread.start()
+    
+    def _snapshot_loop(self):
+        while not self._stop_event.wait(self.snapshot_interval):
+            if self._dirty:
+                self.save()
+    
+    def close(self):
+        """停止保存线程并保存最后一次快照"""
+        self._stop_event.set()
+        if self._snapshot_thread:
+            self._snapshot_thread.join(timeout=5)
+            self._snapshot_thread = None
+        if self._dirty:
+            self.save()
+
+if __name__ == "__main__":
+    print("此模块不应直接运行，请通过main.py启动程序")